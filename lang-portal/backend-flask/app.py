@@ -1,13 +1,29 @@
-from flask import Flask, g
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
 
+from lib import shards
+from lib.cache import ResponseCache
 from lib.db import Db
+from lib.events import EventBus, dashboard_stats
+from lib.pagination import CountCache
+from lib.profiling import QueryProfiler
+from lib.quiz import DistractorIndexer
+from lib.serialization import JSONProvider
+from lib.shards import ShardManager
+from lib.snapshot import Snapshotter
+from lib.upkeep import CacheUpkeep
+from lib.writebehind import JournalLocked, ReviewBuffer
 
 import routes.words
 import routes.groups
 import routes.study_sessions
 import routes.dashboard
 import routes.study_activities
+import routes.metrics
+import routes.export
+import routes.batch
+import routes.events
+import routes.sync
 
 def get_allowed_origins(app):
     try:
@@ -30,6 +46,49 @@ def get_allowed_origins(app):
 
 def create_app(test_config=None):
     app = Flask(__name__)
+
+    # Connection pool defaults, can be overridden by test_config
+    app.config.from_mapping(
+        DB_POOL_SIZE=8,
+        DB_POOL_MIN_SIZE=2,
+        DB_POOL_TIMEOUT=10.0,
+        DB_STATEMENT_CACHE_SIZE=256,
+        COUNT_CACHE_TTL=30.0,
+        AUTO_MIGRATE=True,
+        RESPONSE_CACHE_SIZE=1024,
+        SQL_PROFILING=True,
+        SLOW_QUERY_MS=100.0,
+        # Directory of per-learner databases; None serves everyone from DATABASE
+        LEARNER_SHARDS_DIR=None,
+        LEARNER_HEADER='X-Learner-Id',
+        MAX_OPEN_SHARDS=128,
+        SHARD_POOL_SIZE=2,
+        # Seconds between read-only snapshots for the heavy read endpoints;
+        # None serves them from DATABASE
+        SNAPSHOT_INTERVAL=None,
+        SNAPSHOT_MAX_STALENESS=120.0,
+        SNAPSHOT_PATH=None,
+        SNAPSHOT_POOL_SIZE=4,
+        # auto uses orjson when it is installed, orjson requires it, stdlib never uses it
+        JSON_BACKEND='auto',
+        # Queue review answers and group-commit them from a background thread,
+        # the review endpoints then answer 202 with a sequence number
+        WRITE_BEHIND=False,
+        WRITE_BEHIND_JOURNAL=None,
+        WRITE_BEHIND_SLOTS=16,
+        WRITE_BEHIND_INTERVAL_MS=50,
+        WRITE_BEHIND_MAX_ITEMS=500,
+        WRITE_BEHIND_FSYNC=False,
+        # GET /events: events kept for Last-Event-ID resumes, seconds between
+        # keep-alive comments and the most streams open at once
+        EVENTS_BUFFER_SIZE=1000,
+        EVENTS_HEARTBEAT=15.0,
+        EVENTS_MAX_SUBSCRIBERS=10000,
+        # Seconds between looks for words imported by other processes, on top
+        # of the one after each import; None leaves the quiz distractors of new
+        # words to `invoke index-distractors`
+        QUIZ_INDEX_INTERVAL=60.0
+    )
     
     if test_config is None:
         app.config.from_mapping(
@@ -38,8 +97,132 @@ def create_app(test_config=None):
     else:
         app.config.update(test_config)
     
+    # Serializes every jsonify() body and applies ?fields= to it
+    app.json = JSONProvider(app, backend=app.config['JSON_BACKEND'])
+
     # Initialize database first since we need it for CORS configuration
-    app.db = Db(database=app.config['DATABASE'])
+    app.db = Db(
+        database=app.config['DATABASE'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        pool_min_size=app.config['DB_POOL_MIN_SIZE'],
+        pool_timeout=app.config['DB_POOL_TIMEOUT'],
+        pragmas=app.config.get('DB_PRAGMAS'),
+        statement_cache_size=app.config['DB_STATEMENT_CACHE_SIZE']
+    )
+
+    # Bring the schema up to date before serving anything
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            app.db.migrate()
+            app.db.close()
+
+    # Requests with the learner header are served from that learner's shard,
+    # with DATABASE attached read-only as the shared vocabulary
+    learner_header = app.config['LEARNER_HEADER']
+    if app.config['LEARNER_SHARDS_DIR']:
+        app.db.shards = ShardManager(
+            app.config['LEARNER_SHARDS_DIR'],
+            shared_database=app.config['DATABASE'],
+            max_open=app.config['MAX_OPEN_SHARDS'],
+            pool_size=app.config['SHARD_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT'],
+            pragmas=app.config.get('DB_PRAGMAS')
+        )
+
+    # Dashboard, session history and exports read a periodic copy of DATABASE,
+    # or DATABASE itself while the copy is older than SNAPSHOT_MAX_STALENESS
+    if app.config['SNAPSHOT_INTERVAL'] and app.config['DATABASE'] != ':memory:':
+        app.db.snapshots = Snapshotter(
+            app.config['DATABASE'],
+            path=app.config['SNAPSHOT_PATH'],
+            interval=app.config['SNAPSHOT_INTERVAL'],
+            max_staleness=app.config['SNAPSHOT_MAX_STALENESS'],
+            pool_size=app.config['SNAPSHOT_POOL_SIZE'],
+            timeout=app.config['DB_POOL_TIMEOUT']
+        )
+        app.db.snapshots.start()
+
+    @app.before_request
+    def set_learner():
+        learner_id = request.headers.get(learner_header)
+        if learner_id is None:
+            return None
+        if app.db.shards is None:
+            return jsonify({"error": f"{learner_header} is not supported, LEARNER_SHARDS_DIR is not configured"}), 400
+        try:
+            g.learner_id = shards.validate_learner_id(learner_id)
+        except shards.InvalidLearner as e:
+            return jsonify({"error": str(e)}), 400
+
+    # Cache for read endpoints, invalidated by app.cache.bump() on every write
+    # and by commits from other processes, kept per learner
+    app.cache = ResponseCache(
+        max_entries=app.config['RESPONSE_CACHE_SIZE'],
+        scope_header=learner_header if app.config['LEARNER_SHARDS_DIR'] else None,
+        database=app.config['DATABASE']
+    )
+
+    # Live updates for GET /events, published by the study session write paths
+    app.events = EventBus(
+        buffer_size=app.config['EVENTS_BUFFER_SIZE'],
+        heartbeat=app.config['EVENTS_HEARTBEAT'],
+        max_subscribers=app.config['EVENTS_MAX_SUBSCRIBERS']
+    )
+
+    # After a write-behind flush: invalidate the cached reads of the learners it
+    # wrote to and push their new dashboard stats to their open streams
+    def reviews_flushed(scopes):
+        for scope in scopes:
+            app.cache.bump_scope(scope)
+            if not app.events.has_subscribers(scope):
+                continue
+            try:
+                with app.app_context():
+                    g.learner_id = scope
+                    data = dashboard_stats(app.db.cursor(), app.db.shared_schema())
+                app.events.publish('stats', data, scope)
+            except Exception as e:
+                print(f'Publishing stats after a review flush failed: {e}')
+
+    # Review answers go through a journal and a flusher thread instead of a
+    # commit per request, see lib/writebehind.py. Every worker process locks a
+    # journal slot of its own; when all slots are taken it writes directly.
+    app.reviews_buffer = None
+    if app.config['WRITE_BEHIND']:
+        buffer = ReviewBuffer(
+            app.db,
+            app.config['WRITE_BEHIND_JOURNAL'] or app.config['DATABASE'] + '.journal',
+            interval=app.config['WRITE_BEHIND_INTERVAL_MS'] / 1000,
+            max_items=app.config['WRITE_BEHIND_MAX_ITEMS'],
+            fsync=app.config['WRITE_BEHIND_FSYNC'],
+            on_flush=reviews_flushed,
+            slots=app.config['WRITE_BEHIND_SLOTS']
+        )
+        try:
+            buffer.start()
+            app.reviews_buffer = buffer
+        except JournalLocked as e:
+            print(f'Write-behind disabled in this process: {e}')
+
+    # Sort keys and group counters of learner shards (and of the shared
+    # database, when another process left them behind), caught up on a
+    # background thread so that GET handlers never write, see lib/upkeep.py
+    app.upkeep = CacheUpkeep(app.db)
+    app.upkeep.start()
+
+    # Quiz distractors of imported words, indexed on a background thread
+    # outside the import transaction, see lib/quiz.py
+    app.distractors = None
+    if app.config['QUIZ_INDEX_INTERVAL'] and app.config['DATABASE'] != ':memory:':
+        app.distractors = DistractorIndexer(
+            app.config['DATABASE'],
+            interval=app.config['QUIZ_INDEX_INTERVAL'],
+            timeout=app.config['DB_POOL_TIMEOUT']
+        )
+        app.distractors.start()
+
+    # Totals reported alongside cursor-paginated listings
+    app.counts = CountCache(ttl=app.config['COUNT_CACHE_TTL'])
     
     # Get allowed origins from study_activities table
     allowed_origins = get_allowed_origins(app)
@@ -53,11 +236,29 @@ def create_app(test_config=None):
         r"/*": {
             "origins": allowed_origins,
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
+            "allow_headers": ["Content-Type", "Authorization", learner_header],
+            "expose_headers": ["X-Snapshot-Age"]
         }
     })
 
-    # Close database connection
+    # Per-request SQL timings, aggregated per endpoint for /metrics
+    if app.config['SQL_PROFILING']:
+        app.db.profiler = QueryProfiler(slow_query_ms=app.config['SLOW_QUERY_MS'])
+
+        @app.before_request
+        def start_sql_profile():
+            app.db.profiler.start_request()
+
+        @app.after_request
+        def finish_sql_profile(response):
+            profile = app.db.profiler.finish_request(request.endpoint or 'not_found')
+            if profile is not None:
+                response.headers['Server-Timing'] = (
+                    f'sql;dur={profile.sql_seconds * 1000:.2f};desc="{profile.queries} queries"'
+                )
+            return response
+
+    # Return the database connection to the pool
     @app.teardown_appcontext
     def close_db(exception):
         app.db.close()
@@ -68,6 +269,11 @@ def create_app(test_config=None):
     routes.study_sessions.load(app)
     routes.dashboard.load(app)
     routes.study_activities.load(app)
+    routes.metrics.load(app)
+    routes.export.load(app)
+    routes.batch.load(app)
+    routes.events.load(app)
+    routes.sync.load(app)
     
     return app
 
@@ -0,0 +1,68 @@
+import argparse
+import json
+
+from bench import generate, importing, load
+
+def main():
+  parser = argparse.ArgumentParser(prog='python -m bench', description='lang-portal benchmark suite')
+  commands = parser.add_subparsers(dest='command', required=True)
+
+  gen = commands.add_parser('generate', help='fill a new database with deterministic synthetic data')
+  gen.add_argument('database')
+  gen.add_argument('--words', type=int, default=100_000)
+  gen.add_argument('--groups', type=int, default=50)
+  gen.add_argument('--sessions', type=int, default=20_000)
+  gen.add_argument('--review-items', type=int, default=1_000_000)
+  gen.add_argument('--activities', type=int, default=3)
+  gen.add_argument('--seed', type=int, default=42)
+
+  run = commands.add_parser('run', help='hit every route and report latency percentiles')
+  run.add_argument('database')
+  run.add_argument('--requests', type=int, default=200, help='requests per endpoint')
+  run.add_argument('--concurrency', type=int, default=4)
+  run.add_argument('--seed', type=int, default=42)
+  run.add_argument('--heavy', action='store_true', help='include the full table exports')
+  run.add_argument('--writes', action='store_true', help='include the review and session write routes')
+  run.add_argument('--cached', action='store_true', help='let the response cache serve repeated GETs')
+  run.add_argument('--only', nargs='*', help='endpoint names to run')
+  run.add_argument('--write-behind', action='store_true', help='queue reviews and group-commit them (WRITE_BEHIND)')
+  run.add_argument('--output', help='save the report as JSON')
+
+  imp = commands.add_parser('import', help='time large vocabulary imports and the quiz indexing that follows them')
+  imp.add_argument('database')
+  imp.add_argument('--words', type=int, default=20_000, help='words per import')
+  imp.add_argument('--rounds', type=int, default=2, help='imports in a row, each indexed with the index of the previous one')
+  imp.add_argument('--seed', type=int, default=7)
+  imp.add_argument('--output', help='save the report as JSON')
+
+  cmp = commands.add_parser('compare', help='compare two saved reports')
+  cmp.add_argument('baseline')
+  cmp.add_argument('candidate')
+
+  args = parser.parse_args()
+  if args.command == 'generate':
+    generate.generate(
+      args.database, words=args.words, groups=args.groups, sessions=args.sessions,
+      review_items=args.review_items, activities=args.activities, seed=args.seed
+    )
+  elif args.command == 'run':
+    from app import create_app
+    report = load.run(
+      create_app, args.database, requests=args.requests, concurrency=args.concurrency,
+      seed=args.seed, heavy=args.heavy, writes=args.writes, bust_cache=not args.cached, only=args.only,
+      write_behind=args.write_behind
+    )
+    if args.output:
+      load.save(report, args.output)
+      print(f'Saved {args.output}')
+  elif args.command == 'import':
+    report = importing.run(args.database, words=args.words, rounds=args.rounds, seed=args.seed)
+    if args.output:
+      load.save(report, args.output)
+      print(f'Saved {args.output}')
+  else:
+    with open(args.baseline) as baseline, open(args.candidate) as candidate:
+      load.compare(json.load(baseline), json.load(candidate))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,136 @@
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from lib import importer, migrations, partitions, sessions, sortkeys, srs, stats
+
+SYLLABLES = [
+  'ba', 'be', 'bi', 'bo', 'cha', 'che', 'de', 'di', 'do', 'é', 'fa', 'fe', 'fi', 'ga', 'gé',
+  'la', 'le', 'li', 'lo', 'ma', 'me', 'mi', 'mo', 'na', 'ne', 'ni', 'pa', 'pe', 'pi', 'po',
+  'ra', 're', 'ri', 'ro', 'sa', 'se', 'si', 'ta', 'te', 'ti', 'to', 'va', 've', 'vi', 'è', 'ê'
+]
+
+def fake_word(rng, index):
+  stem = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+  # The index keeps every generated word unique
+  return f'{stem}{index}', f'word {index}'
+
+def batched(rows, size):
+  batch = []
+  for row in rows:
+    batch.append(row)
+    if len(batch) >= size:
+      yield batch
+      batch = []
+  if batch:
+    yield batch
+
+# Fill a new database at path with a deterministic synthetic dataset.
+# The same arguments always produce the same rows.
+def generate(path, words=100_000, groups=50, sessions=20_000, review_items=1_000_000,
+             activities=3, seed=42, batch_size=50_000, log=print):
+  if os.path.exists(path):
+    raise FileExistsError(f'{path} already exists, generate into a new file')
+
+  rng = random.Random(seed)
+  start = time.perf_counter()
+  conn = sqlite3.connect(path)
+  conn.row_factory = sqlite3.Row
+  conn.execute('PRAGMA journal_mode = WAL')
+  # Nothing to lose if generation is interrupted, skip the fsyncs
+  conn.execute('PRAGMA synchronous = OFF')
+  migrations.migrate(conn)
+
+  conn.execute('BEGIN')
+  conn.executemany(
+    'INSERT INTO study_activities (name, url, preview_url) VALUES (?, ?, ?)',
+    [(f'Activity {i}', f'http://localhost:{8080 + i}', None) for i in range(1, activities + 1)]
+  )
+  conn.executemany('INSERT INTO groups (name) VALUES (?)', [(f'Group {i}',) for i in range(1, groups + 1)])
+  conn.commit()
+  log(f'{groups} groups, {activities} activities')
+
+  # Words, each in one group and 10% of them in a second one
+  group_words = {group_id: [] for group_id in range(1, groups + 1)}
+  def word_rows():
+    for word_id in range(1, words + 1):
+      french, english = fake_word(rng, word_id)
+      yield word_id, french, english, importer.norm_key(french, english)
+
+  def membership_rows():
+    for word_id in range(1, words + 1):
+      group_id = rng.randint(1, groups)
+      group_words[group_id].append(word_id)
+      yield word_id, group_id
+      if rng.random() < 0.1:
+        other = rng.randint(1, groups)
+        if other != group_id:
+          group_words[other].append(word_id)
+          yield word_id, other
+
+  conn.execute('BEGIN')
+  for batch in batched(word_rows(), batch_size):
+    conn.executemany('INSERT INTO words (id, french, english, norm_key) VALUES (?, ?, ?, ?)', batch)
+  for batch in batched(membership_rows(), batch_size):
+    conn.executemany('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)', batch)
+  conn.execute('UPDATE groups SET words_count = (SELECT COUNT(*) FROM word_groups WHERE group_id = groups.id)')
+  conn.commit()
+  log(f'{words} words ({time.perf_counter() - start:.1f}s)')
+
+  # Sessions spread over the last year in chronological order
+  now = datetime(2025, 3, 1)
+  first = now - timedelta(days=365)
+  starts = sorted(first + timedelta(seconds=rng.randint(0, 365 * 86400)) for _ in range(sessions))
+  session_groups = [rng.randint(1, groups) for _ in range(sessions)]
+  conn.execute('BEGIN')
+  conn.executemany(
+    'INSERT INTO study_sessions (id, group_id, study_activity_id, created_at) VALUES (?, ?, ?, ?)',
+    [(i + 1, session_groups[i], rng.randint(1, activities), starts[i].strftime('%Y-%m-%d %H:%M:%S'))
+     for i in range(sessions)]
+  )
+  conn.commit()
+  log(f'{sessions} study sessions ({time.perf_counter() - start:.1f}s)')
+
+  # Review items, evenly spread over the sessions, on words of the session's group
+  def review_rows():
+    per_session, extra = divmod(review_items, sessions) if sessions else (0, 0)
+    for index in range(sessions):
+      candidates = group_words[session_groups[index]] or [1]
+      count = per_session + (1 if index < extra else 0)
+      for item in range(count):
+        created_at = starts[index] + timedelta(seconds=10 * item)
+        yield (rng.choice(candidates), index + 1, 1 if rng.random() < 0.75 else 0,
+               created_at.strftime('%Y-%m-%d %H:%M:%S'))
+
+  written = 0
+  conn.execute('BEGIN')
+  for batch in batched(review_rows(), batch_size):
+    partitions.insert_reviews(conn.cursor(), batch)
+    written += len(batch)
+    if written % (batch_size * 20) == 0:
+      log(f'  {written} review items ({time.perf_counter() - start:.1f}s)')
+  conn.commit()
+  log(f'{written} review items ({time.perf_counter() - start:.1f}s)')
+
+  finalize(conn)
+  conn.close()
+  log(f'Generated {path} in {time.perf_counter() - start:.1f}s')
+
+# Derive every aggregate table from the raw history, as the write paths would have
+def finalize(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM word_reviews')
+  conn.execute('''
+    INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+    SELECT word_id, SUM(correct), SUM(1 - correct), MAX(created_at)
+    FROM word_review_items
+    GROUP BY word_id
+  ''')
+  sortkeys.rebuild(conn.cursor())
+  sessions.rebuild(conn.cursor())
+  srs.rebuild(conn.cursor())
+  stats.rebuild(conn.cursor())
+  conn.commit()
+  conn.execute('ANALYZE')
@@ -0,0 +1,50 @@
+import os
+import random
+import sqlite3
+import time
+
+from bench.generate import fake_word
+from lib import importer, migrations, quiz
+
+# Import `words` new synthetic words into the database at path (created when
+# missing) the way POST /words/import does, then index their quiz distractors
+# the way the app's background indexer does: a first import that loads the
+# index from the database, then `rounds - 1` more reusing it. Returns the
+# report; the import times are the write lock held by each import.
+def run(path, words=20_000, rounds=2, seed=7, log=print):
+  conn = sqlite3.connect(path)
+  conn.row_factory = sqlite3.Row
+  if not os.path.exists(path + '-wal'):
+    conn.execute('PRAGMA journal_mode = WAL')
+  migrations.migrate(conn)
+  rng = random.Random(seed)
+
+  index = None
+  imports = []
+  for round_number in range(1, rounds + 1):
+    first = conn.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM words').fetchone()[0]
+    rows = [dict(zip(('french', 'english'), fake_word(rng, first + i))) for i in range(words)]
+    result = importer.import_rows(conn, rows, group_name=f'Bench import {first}')
+
+    started = time.perf_counter()
+    indexed, index = quiz.index_pending(conn, index)
+    indexing = time.perf_counter() - started
+    imports.append({
+      'words_inserted': result['words_inserted'],
+      'import_seconds': result['seconds'],
+      'words_indexed': indexed,
+      'indexing_seconds': round(indexing, 3),
+      'indexed_words_per_sec': round(indexed / indexing) if indexing > 0 else indexed
+    })
+    log(f"import {round_number}: {result['words_inserted']} words in {result['seconds']:.2f}s, "
+        f"distractors of {indexed} words in {indexing:.2f}s ({imports[-1]['indexed_words_per_sec']} words/s, "
+        f"index of {index.size if index else 0} words)")
+
+  vocabulary = conn.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+  conn.close()
+  return {
+    'database': path,
+    'config': {'words': words, 'rounds': rounds, 'seed': seed},
+    'vocabulary': vocabulary,
+    'imports': imports
+  }
@@ -0,0 +1,213 @@
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Ids the request templates draw from
+def sample_ids(path, limit=1000):
+  conn = sqlite3.connect(path)
+  try:
+    def ids(table):
+      return [row[0] for row in conn.execute(f'SELECT id FROM {table} ORDER BY random() LIMIT ?', (limit,))] or [1]
+    return {
+      'word': ids('words'),
+      'group': ids('groups'),
+      'session': ids('study_sessions'),
+      'activity': ids('study_activities'),
+      'term': [row[0][:3] for row in conn.execute('SELECT french FROM words ORDER BY random() LIMIT ?', (limit,))] or ['ba']
+    }
+  finally:
+    conn.close()
+
+# (name, method, path template, body builder) for every route in routes/*.py;
+# the body builder is optional for reads.
+# Heavy routes (full exports) and writes only run when asked for.
+READ_ROUTES = [
+  ('get_words', 'GET', lambda r, ids: f'/words?page={r.randint(1, 20)}'),
+  ('get_words_sorted', 'GET', lambda r, ids: f'/words?page={r.randint(1, 20)}&sort_by=correct_count&order=desc'),
+  ('get_words_after', 'GET', lambda r, ids: '/words?after='),
+  ('get_word', 'GET', lambda r, ids: f'/words/{r.choice(ids["word"])}'),
+  ('get_words_by_ids', 'GET', lambda r, ids: '/words?ids=' + ','.join(map(str, r.sample(ids['word'], min(20, len(ids['word'])))))),
+  ('search_words', 'GET', lambda r, ids: f'/words/search?q={r.choice(ids["term"])}&mode=autocomplete&limit=10'),
+  ('get_groups', 'GET', lambda r, ids: '/groups'),
+  ('get_groups_by_mastered', 'GET', lambda r, ids: '/groups?sort_by=mastered_count&order=desc'),
+  ('get_group', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}'),
+  ('get_group_words', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}/words?page={r.randint(1, 5)}'),
+  ('get_group_words_raw', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}/words/raw'),
+  ('get_group_study_sessions', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}/study_sessions'),
+  ('get_group_due_words', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}/due?limit=20'),
+  ('get_group_quiz', 'GET', lambda r, ids: f'/groups/{r.choice(ids["group"])}/quiz?n=20'),
+  ('get_study_sessions', 'GET', lambda r, ids: f'/api/study-sessions?page={r.randint(1, 20)}'),
+  ('get_study_session', 'GET', lambda r, ids: f'/api/study-sessions/{r.choice(ids["session"])}'),
+  ('get_study_activities', 'GET', lambda r, ids: '/api/study-activities'),
+  ('get_study_activity', 'GET', lambda r, ids: f'/api/study-activities/{r.choice(ids["activity"])}'),
+  ('get_study_activity_sessions', 'GET', lambda r, ids: f'/api/study-activities/{r.choice(ids["activity"])}/sessions'),
+  ('get_study_activity_launch_data', 'GET', lambda r, ids: f'/api/study-activities/{r.choice(ids["activity"])}/launch'),
+  ('get_recent_session', 'GET', lambda r, ids: '/dashboard/recent-session'),
+  ('get_study_stats', 'GET', lambda r, ids: '/dashboard/stats'),
+  ('get_study_streak', 'GET', lambda r, ids: '/dashboard/streak'),
+  ('get_activity_heatmap', 'GET', lambda r, ids: '/dashboard/heatmap?from=2024-03-01&to=2025-03-01'),
+  ('get_sync_changes', 'GET', lambda r, ids: '/sync?limit=500'),
+  # What the study session page needs, in one round-trip
+  ('batch_session_page', 'POST', lambda r, ids: '/batch',
+   lambda r, ids: {'requests': [
+     {'id': 'session', 'path': f'/api/study-sessions/{r.choice(ids["session"])}'},
+     {'id': 'words', 'path': '/words?ids=' + ','.join(map(str, r.sample(ids['word'], min(10, len(ids['word'])))))},
+     {'id': 'group', 'path': f'/groups/{r.choice(ids["group"])}'}
+   ]}),
+]
+
+HEAVY_ROUTES = [
+  ('export_words', 'GET', lambda r, ids: '/export/words'),
+  ('export_group_words', 'GET', lambda r, ids: f'/export/groups/{r.choice(ids["group"])}/words'),
+  ('export_review_items', 'GET', lambda r, ids: '/export/review_items?since=2025-02-28'),
+]
+
+WRITE_ROUTES = [
+  ('create_study_session', 'POST', lambda r, ids: '/study_sessions',
+   lambda r, ids: {'group_id': r.choice(ids['group']), 'study_activity_id': r.choice(ids['activity'])}),
+  ('log_review', 'POST', lambda r, ids: f'/study_sessions/{r.choice(ids["session"])}/review',
+   lambda r, ids: {'word_id': r.choice(ids['word']), 'correct': r.random() < 0.75}),
+  ('log_reviews', 'POST', lambda r, ids: f'/study_sessions/{r.choice(ids["session"])}/reviews',
+   lambda r, ids: [{'word_id': r.choice(ids['word']), 'correct': r.random() < 0.75} for _ in range(50)]),
+  ('add_group_words', 'POST', lambda r, ids: f'/groups/{r.choice(ids["group"])}/words',
+   lambda r, ids: {'word_ids': r.sample(ids['word'], min(50, len(ids['word'])))}),
+  ('remove_group_words', 'DELETE', lambda r, ids: f'/groups/{r.choice(ids["group"])}/words',
+   lambda r, ids: {'word_ids': r.sample(ids['word'], min(50, len(ids['word'])))}),
+  # Fresh client ids every run, or the server would skip them as retries
+  ('sync_reviews', 'POST', lambda r, ids: '/sync',
+   lambda r, ids: {'reviews': [{'id': uuid.uuid4().hex, 'session_id': r.choice(ids['session']),
+                                'word_id': r.choice(ids['word']), 'correct': r.random() < 0.75} for _ in range(50)]}),
+]
+
+def percentile(sorted_values, fraction):
+  if not sorted_values:
+    return 0.0
+  index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+  return sorted_values[index]
+
+def summarize(latencies, statuses, elapsed):
+  values = sorted(latencies)
+  return {
+    'requests': len(values),
+    'throughput_rps': round(len(values) / elapsed, 2) if elapsed else 0.0,
+    'mean_ms': round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+    'p50_ms': round(percentile(values, 0.50) * 1000, 3),
+    'p95_ms': round(percentile(values, 0.95) * 1000, 3),
+    'p99_ms': round(percentile(values, 0.99) * 1000, 3),
+    'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+    'statuses': {str(status): count for status, count in sorted(statuses.items())}
+  }
+
+def git_revision():
+  try:
+    return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+  except Exception:
+    return None
+
+# Hit every selected route `requests` times from `concurrency` threads against
+# create_app(test_config) and return the per-endpoint report
+def run(create_app, database, requests=200, concurrency=4, seed=42, heavy=False,
+        writes=False, bust_cache=True, only=None, slow_query_ms=1000.0, write_behind=False, log=print):
+  app = create_app({
+    'DATABASE': database,
+    'DB_POOL_SIZE': max(concurrency, 2),
+    'SLOW_QUERY_MS': slow_query_ms,
+    'WRITE_BEHIND': write_behind,
+    # Indexing a generated vocabulary would compete with the requests measured
+    'QUIZ_INDEX_INTERVAL': None
+  })
+  ids = sample_ids(database)
+
+  routes = [tuple(route) + (None,) * (4 - len(route)) for route in READ_ROUTES]
+  if heavy:
+    routes += [tuple(route) + (None,) * (4 - len(route)) for route in HEAVY_ROUTES]
+  if writes:
+    routes += WRITE_ROUTES
+  if only:
+    routes = [route for route in routes if route[0] in only]
+
+  results = {}
+  counter = iter(range(10 ** 12))
+  counter_lock = threading.Lock()
+  for name, method, path, body in routes:
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def worker(worker_id, name=name, method=method, path=path, body=body,
+               latencies=latencies, statuses=statuses, lock=lock):
+      rng = random.Random(f'{seed}-{name}-{worker_id}')
+      client = app.test_client()
+      local = []
+      local_statuses = {}
+      for _ in range(requests // concurrency + (1 if worker_id < requests % concurrency else 0)):
+        url = path(rng, ids)
+        if bust_cache and method == 'GET':
+          # Unique args defeat the response cache so the database path is measured
+          with counter_lock:
+            url += ('&' if '?' in url else '?') + f'_={next(counter)}'
+        payload = body(rng, ids) if body else None
+        started = time.perf_counter()
+        response = client.open(url, method=method, json=payload)
+        response.get_data()
+        local.append(time.perf_counter() - started)
+        local_statuses[response.status_code] = local_statuses.get(response.status_code, 0) + 1
+      with lock:
+        latencies.extend(local)
+        for status, count in local_statuses.items():
+          statuses[status] = statuses.get(status, 0) + count
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+      list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+    results[name] = summarize(latencies, statuses, elapsed)
+    summary = results[name]
+    log(f"{name:32} {summary['requests']:6} req {summary['throughput_rps']:9.1f} req/s "
+        f"p50 {summary['p50_ms']:8.2f}ms p95 {summary['p95_ms']:8.2f}ms p99 {summary['p99_ms']:8.2f}ms "
+        f"{summary['statuses']}")
+
+  if app.reviews_buffer is not None:
+    app.reviews_buffer.close()
+  app.db.dispose()
+  return {
+    'created_at': datetime.now(timezone.utc).isoformat(),
+    'git_revision': git_revision(),
+    'python': platform.python_version(),
+    'sqlite': sqlite3.sqlite_version,
+    'database': database,
+    'config': {
+      'requests': requests,
+      'concurrency': concurrency,
+      'seed': seed,
+      'heavy': heavy,
+      'writes': writes,
+      'bust_cache': bust_cache,
+      'write_behind': write_behind
+    },
+    'endpoints': results
+  }
+
+def save(report, path):
+  with open(path, 'w', encoding='utf-8') as file:
+    json.dump(report, file, indent=2)
+
+# Per-endpoint change in p50/p95/p99 and throughput between two saved runs
+def compare(baseline, candidate, log=print):
+  log(f"{'endpoint':32} {'p50':>18} {'p95':>18} {'p99':>18} {'req/s':>18}")
+  for name, after in candidate['endpoints'].items():
+    before = baseline['endpoints'].get(name)
+    if before is None:
+      continue
+    cells = []
+    for key in ['p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps']:
+      change = (after[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+      cells.append(f'{after[key]:9.2f} ({change:+6.1f}%)')
+    log(f'{name:32} ' + ' '.join(cells))
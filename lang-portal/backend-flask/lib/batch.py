@@ -0,0 +1,59 @@
+from urllib.parse import urlsplit
+
+# Largest number of sub-requests in one POST /batch
+MAX_REQUESTS = 20
+
+# Largest number of ids in one GET /words?ids=
+MAX_IDS = 100
+
+class BatchError(ValueError):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.status = status
+
+# Validate a POST /batch body, {"requests": [{"id": "session", "path":
+# "/api/study-sessions/1"}, ...]} (or a bare array), into a list of (id, path).
+# Only reads can be batched: method is optional and must be GET.
+def parse_requests(data):
+  if isinstance(data, dict):
+    data = data.get('requests')
+  if not isinstance(data, list) or not data:
+    raise BatchError("A non-empty array of requests is required")
+  if len(data) > MAX_REQUESTS:
+    raise BatchError(f"At most {MAX_REQUESTS} requests can be batched", 413)
+
+  requests = []
+  seen = set()
+  for index, item in enumerate(data):
+    if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+      raise BatchError(f"Request {index}: a path is required")
+    request_id = str(item.get('id', index))
+    if request_id in seen:
+      raise BatchError(f"Request {index}: duplicate id {request_id}")
+    seen.add(request_id)
+    if str(item.get('method', 'GET')).upper() != 'GET':
+      raise BatchError(f"Request {request_id}: only GET requests can be batched")
+    path = item['path']
+    parts = urlsplit(path)
+    if not path.startswith('/') or parts.scheme or parts.netloc:
+      raise BatchError(f"Request {request_id}: path must be an absolute path like /words/1")
+    if parts.path.rstrip('/') == '/batch':
+      raise BatchError(f"Request {request_id}: batches cannot be nested")
+    requests.append((request_id, path))
+  return requests
+
+# Parse ?ids=1,2,3 into a list of distinct ids, in request order
+def parse_ids(value):
+  parts = [part.strip() for part in value.split(',') if part.strip()]
+  if not parts:
+    raise BatchError("ids must be a comma separated list of ids")
+  ids = []
+  for part in parts:
+    try:
+      ids.append(int(part))
+    except ValueError:
+      raise BatchError(f"Invalid id: {part}")
+  ids = list(dict.fromkeys(ids))
+  if len(ids) > MAX_IDS:
+    raise BatchError(f"At most {MAX_IDS} ids can be requested at once", 413)
+  return ids
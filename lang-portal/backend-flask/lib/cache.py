@@ -0,0 +1,194 @@
+import functools
+import sqlite3
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime, time as day_start, timezone
+
+from flask import g, request, make_response
+
+# In-process response cache for read endpoints.
+#
+# Every write path calls bump(), which increments the data version. Cached views
+# are keyed by route + query args + version, so a bump invalidates everything at
+# once, and the version doubles as the ETag: a client presenting the current ETag
+# gets a 304 before the view (and SQLite) is touched at all.
+#
+# The version lives in process memory. With database set, commits to it from
+# other processes (other workers, invoke tasks) are noticed too: each lookup
+# reads PRAGMA data_version on a connection of the cache's own, which changes
+# whenever another connection committed, and bumps the version when it did.
+# Writes to learner shards from other processes are not noticed.
+#
+# With scope_header set (the learner header), responses vary on that header and
+# each scope has a version of its own on top of the global one: a write with the
+# header only invalidates that scope, a write without it invalidates everything.
+# Key part for views that depend on today's date (the streak in lib/stats.py
+# and SQLite's date('now'), both UTC), and the time that day began
+def current_day():
+  today = datetime.now(timezone.utc).date()
+  return today.isoformat(), datetime.combine(today, day_start(), tzinfo=timezone.utc).timestamp()
+
+class ResponseCache:
+  def __init__(self, max_entries=1024, scope_header=None, database=None):
+    self.max_entries = max_entries
+    self.scope_header = scope_header
+    self._watch = None
+    self._data_version = None
+    if database is not None:
+      self._watch = sqlite3.connect(database, check_same_thread=False)
+      self._data_version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+    # Distinguishes ETags across restarts, when the version starts over
+    self.epoch = uuid.uuid4().hex[:8]
+    self.version = 1
+    self.last_modified = time.time()
+    # scope -> (version, last_modified)
+    self._scopes = {}
+    self._entries = OrderedDict()
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+    self._not_modified = 0
+    self._bumps = 0
+    self._external = 0
+
+  def _scope(self):
+    if self.scope_header is None:
+      return None
+    return request.headers.get(self.scope_header)
+
+  # Bump for commits made by other connections since the last check. Those of
+  # this process's own connections count too, after their bump(): one extra
+  # invalidation per local write. Call with the lock held.
+  def _check_database(self):
+    if self._watch is None:
+      return
+    data_version = self._watch.execute('PRAGMA data_version').fetchone()[0]
+    if data_version != self._data_version:
+      self._data_version = data_version
+      self._external += 1
+      self._bump(None)
+
+  # (version, last_modified) of the request's scope, call with the lock held
+  def _current(self, scope):
+    if scope is None:
+      return self.version, self.last_modified
+    scope_version, scope_modified = self._scopes.get(scope, (0, 0.0))
+    return f'{self.version}.{scope_version}', max(self.last_modified, scope_modified)
+
+  # Call after every committed write
+  def bump(self):
+    self.bump_scope(self._scope())
+
+  # bump() for writes committed outside a request (e.g. lib/writebehind.py);
+  # scope None invalidates every scope
+  def bump_scope(self, scope):
+    with self._lock:
+      self._bumps += 1
+      self._bump(scope)
+
+  # Call with the lock held
+  def _bump(self, scope):
+    if scope is None:
+      self.version += 1
+      self.last_modified = time.time()
+      self._scopes.clear()
+      self._entries.clear()
+    else:
+      # Entries of the old scope version are left to age out of the LRU
+      scope_version = self._scopes.get(scope, (0, 0.0))[0]
+      self._scopes[scope] = (scope_version + 1, time.time())
+
+  def etag(self, key, version):
+    return f'{self.epoch}-{version}-{zlib.crc32(repr(key).encode("utf-8")):08x}'
+
+  def _not_modified_since(self, etag, last_modified):
+    if request.if_none_match:
+      return request.if_none_match.contains(etag)
+    if request.if_modified_since:
+      return request.if_modified_since.timestamp() >= int(last_modified)
+    return False
+
+  def _finish(self, response, etag, last_modified):
+    response.set_etag(etag)
+    if self.scope_header is not None:
+      response.vary.add(self.scope_header)
+    response.last_modified = last_modified
+    # Let clients keep the body but always revalidate with If-None-Match
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+  # Decorator for GET views whose output only depends on the database
+  def cached(self, view, daily=False):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+      scope = self._scope()
+      with self._lock:
+        self._check_database()
+        version, last_modified = self._current(scope)
+      key = (scope, request.path, tuple(sorted(request.args.items(multi=True))))
+      if daily:
+        day, day_started = current_day()
+        key += (day,)
+        last_modified = max(last_modified, day_started)
+      etag = self.etag(key, version)
+
+      if self._not_modified_since(etag, last_modified):
+        with self._lock:
+          self._not_modified += 1
+        return self._finish(make_response('', 304), etag, last_modified)
+
+      with self._lock:
+        entry = self._entries.get((key, version))
+        if entry is not None:
+          self._entries.move_to_end((key, version))
+          self._hits += 1
+        else:
+          self._misses += 1
+
+      if entry is not None:
+        body, mimetype = entry
+        response = make_response(body, 200)
+        response.mimetype = mimetype
+        return self._finish(response, etag, last_modified)
+
+      response = make_response(view(*args, **kwargs))
+      if response.status_code != 200:
+        return response
+      # Read from a snapshot (lib/snapshot.py) older than the last write: the
+      # body doesn't match this version, so it gets neither an entry nor an ETag
+      if g.get('snapshot_taken_at', last_modified) < last_modified:
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+      with self._lock:
+        # Skip storing if a write landed while the view ran, the entry could be stale
+        if version == self._current(scope)[0]:
+          self._entries[(key, version)] = (response.get_data(), response.mimetype)
+          while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+      return self._finish(response, etag, last_modified)
+    return wrapper
+
+  # cached() for views that also depend on the current date (e.g. streaks),
+  # cached and ETagged per day as well as per data version
+  def cached_daily(self, view):
+    return self.cached(view, daily=True)
+
+  def stats(self):
+    with self._lock:
+      lookups = self._hits + self._misses
+      return {
+        "data_version": self.version,
+        "scopes": len(self._scopes),
+        "entries": len(self._entries),
+        "max_entries": self.max_entries,
+        "hits": self._hits,
+        "misses": self._misses,
+        "not_modified": self._not_modified,
+        "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+        "bumps": self._bumps,
+        "external_writes": self._external
+      }
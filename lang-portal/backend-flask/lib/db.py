@@ -1,30 +1,121 @@
 import sqlite3
+import functools
 import json
-from flask import g
+import threading
+import time
+from flask import current_app, g
+
+from lib import importer, migrations, shards
+from lib.pool import ConnectionPool
+from lib.profiling import ProfilingCursor
 
 class Db:
-  def __init__(self, database='words.db'):
+  def __init__(self, database='words.db', pool_size=8, pool_min_size=2,
+               pool_timeout=10.0, pragmas=None, statement_cache_size=256):
     self.database = database
     self.connection = None
-
+    self.pool_size = pool_size
+    self.pool_min_size = pool_min_size
+    self.pool_timeout = pool_timeout
+    self.pragmas = pragmas
+    self.statement_cache_size = statement_cache_size
+    self._pool = None
+    self._pool_lock = threading.Lock()
+    # Set to a lib.profiling.QueryProfiler to time every statement run through cursor()
+    self.profiler = None
+    # Set to a lib.shards.ShardManager to serve requests with g.learner_id from
+    # that learner's shard, with this database attached as the shared vocabulary
+    self.shards = None
+    # Set to a lib.snapshot.Snapshotter to serve views wrapped in from_snapshot()
+    # from its read-only copy while the copy is within its staleness bound
+    self.snapshots = None
+
+  # The pool is created on first use so that importing this module
+  # (e.g. the shared `db` instance below) never touches the filesystem
+  @property
+  def pool(self):
+    if self._pool is None:
+      with self._pool_lock:
+        if self._pool is None:
+          self._pool = ConnectionPool(
+            self.database,
+            max_size=self.pool_size,
+            min_size=self.pool_min_size,
+            timeout=self.pool_timeout,
+            pragmas=self.pragmas,
+            statement_cache_size=self.statement_cache_size
+          )
+    return self._pool
+
+  # Check a connection out of the pool for the current app context, from the
+  # learner's shard when the request has a learner
   def get(self):
     if 'db' not in g:
-      g.db = sqlite3.connect(self.database)
-      g.db.row_factory = sqlite3.Row  # Return rows as dictionaries
+      learner_id = g.get('learner_id')
+      if learner_id is not None and self.shards is not None:
+        g.db_pool, g.db = self.shards.acquire(learner_id)
+      elif g.get('db_snapshot') and self.snapshots is not None and learner_id is None:
+        snapshot = self.snapshots.acquire()
+        if snapshot is not None:
+          g.db_pool, g.db, g.snapshot_taken_at = snapshot
+        else:
+          g.db_pool, g.db = self.pool, self.pool.acquire()
+      else:
+        g.db_pool, g.db = self.pool, self.pool.acquire()
     return g.db
 
+  # Decorator for read-only views that can be served from the snapshot (heavy
+  # analytic reads). Responses read from it carry X-Snapshot-Age in seconds.
+  # Goes below @app.cache.cached so cache hits never touch a connection.
+  def from_snapshot(self, view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+      g.db_snapshot = True
+      response = current_app.make_response(view(*args, **kwargs))
+      taken_at = g.get('snapshot_taken_at')
+      if taken_at is not None:
+        response.headers['X-Snapshot-Age'] = f'{max(0.0, time.time() - taken_at):.1f}'
+      return response
+    return wrapper
+
+  # Schema holding the shared vocabulary tables on the current connection
+  def shared_schema(self):
+    if g.get('learner_id') is not None and self.shards is not None:
+      return shards.SHARED_SCHEMA
+    return 'main'
+
   def commit(self):
     self.get().commit()
 
   def cursor(self):
     # Ensure the connection is valid before getting a cursor
     connection = self.get()
-    return connection.cursor()
+    cursor = connection.cursor()
+    if self.profiler is not None:
+      return ProfilingCursor(cursor, self.profiler)
+    return cursor
 
+  # Return the app context's connection to the pool
   def close(self):
     db = g.pop('db', None)
+    pool = g.pop('db_pool', None)
+    g.pop('snapshot_taken_at', None)
     if db is not None:
-      db.close()
+      (pool or self.pool).release(db)
+
+  def pool_stats(self):
+    return self.pool.stats()
+
+  # Close every pooled connection (e.g. on shutdown)
+  def dispose(self):
+    with self._pool_lock:
+      pool, self._pool = self._pool, None
+    if pool is not None:
+      pool.close()
+    if self.shards is not None:
+      self.shards.close()
+    if self.snapshots is not None:
+      self.snapshots.close()
 
   # Function to load SQL from a file
   def sql(self, filepath):
@@ -36,28 +127,12 @@ class Db:
     with open(filepath, 'r', encoding='utf-8') as file:
       return json.load(file)
 
+  # Create or upgrade the schema by applying pending migrations from sql/migrations
   def setup_tables(self,cursor):
-    # Create the necessary tables
-    cursor.execute(self.sql('setup/create_table_words.sql'))
-    self.get().commit()
-
-    cursor.execute(self.sql('setup/create_table_word_reviews.sql'))
-    self.get().commit()
-
-    cursor.execute(self.sql('setup/create_table_word_review_items.sql'))
-    self.get().commit()
-
-    cursor.execute(self.sql('setup/create_table_groups.sql'))
-    self.get().commit()
+    migrations.migrate(cursor.connection, log=print)
 
-    cursor.execute(self.sql('setup/create_table_word_groups.sql'))
-    self.get().commit()
-
-    cursor.execute(self.sql('setup/create_table_study_activities.sql'))
-    self.get().commit()
-
-    cursor.execute(self.sql('setup/create_table_study_sessions.sql'))
-    self.get().commit()
+  def migrate(self):
+    return migrations.migrate(self.get())
 
   def import_study_activities_json(self,cursor,data_json_path):
     study_actvities = self.load_json(data_json_path)
@@ -67,47 +142,14 @@ class Db:
       ''', (activity['name'],activity['url'],activity['preview_url'],))
     self.get().commit()
 
+  # Import words from a JSON, NDJSON or CSV file into a group, see lib/importer.py
   def import_word_json(self,cursor,group_name,data_json_path):
-      # Insert a new group
-      cursor.execute('''
-        INSERT INTO groups (name) VALUES (?)
-      ''', (group_name,))
-      self.get().commit()
-
-      # Get the ID of the group
-      cursor.execute('SELECT id FROM groups WHERE name = ?', (group_name,))
-      core_verbs_group_id = cursor.fetchone()[0]
-
-      # Insert some sample words (verbs) from JSON file and associate with the group
-      words = self.load_json(data_json_path)
-
-      for word in words:
-        # Insert the word into the words table
-        cursor.execute('''
-          INSERT INTO words (french, english) VALUES (?, ?)
-        ''', (word['french'], word['english']))
-        
-        # Get the last inserted word's ID
-        word_id = cursor.lastrowid
-
-        # Insert the word-group relationship into word_groups table
-        cursor.execute('''
-          INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)
-        ''', (word_id, core_verbs_group_id))
-      self.get().commit()
-
-      # Update the words_count in the groups table by counting all words in the group
-      cursor.execute('''
-        UPDATE groups
-        SET words_count = (
-          SELECT COUNT(*) FROM word_groups WHERE group_id = ?
-        )
-        WHERE id = ?
-      ''', (core_verbs_group_id, core_verbs_group_id))
-
-      self.get().commit()
-
-      print(f"Successfully added {len(words)} verbs to the '{group_name}' group.")
+      result = importer.import_file(cursor.connection, data_json_path, group_name=group_name)
+      print(
+        f"Successfully added {result['words_inserted']} words to the '{group_name}' group "
+        f"({result['rows_read']} rows, {result['rows_per_sec']} rows/sec)."
+      )
+      return result
 
   # Initialize the database with sample data
   def init(self, app):
@@ -129,6 +171,7 @@ class Db:
         cursor=cursor,
         data_json_path='seed/study_activities.json'
       )
+      self.close()
 
 # Create an instance of the Db class
 db = Db()
@@ -0,0 +1,206 @@
+import threading
+import time
+from collections import deque
+
+from lib import stats
+from lib.serialization import dumps_line
+
+class TooManySubscribers(Exception):
+  pass
+
+class Event:
+  __slots__ = ('seq', 'scope', 'payload')
+
+  def __init__(self, seq, scope, payload):
+    self.seq = seq
+    self.scope = scope
+    self.payload = payload
+
+# In-process pub/sub for the server-sent events stream (GET /events).
+#
+# Published events go into one ring buffer of the last buffer_size events,
+# encoded once; a subscriber is only a position in that buffer, so publishing
+# costs the same however many streams are open and an idle stream holds no
+# queue or thread of its own. Streams of a scope wait on a condition of that
+# scope and wake when it gets an event, or after heartbeat seconds of silence
+# to send a keep-alive comment (which is also how a closed connection is noticed).
+#
+# Event ids are <epoch>-<seq>, the epoch changing with every process start. A
+# stream resumed with a Last-Event-ID still in the buffer replays what it
+# missed; anything else, or a stream too slow to keep up with the buffer, gets
+# a "resync" event telling the client to refetch.
+#
+# scope is the learner id (None for the shared database): a stream only sees
+# the events of its own scope.
+class EventBus:
+  def __init__(self, buffer_size=1000, heartbeat=15.0, max_subscribers=10000):
+    self.buffer_size = max(1, buffer_size)
+    self.heartbeat = heartbeat
+    self.max_subscribers = max_subscribers
+    self.epoch = format(int(time.time() * 1000), 'x')
+    self._lock = threading.Lock()
+    self._events = deque(maxlen=self.buffer_size)
+    self._seq = 0
+    # scope -> [open streams, condition they wait on]
+    self._scopes = {}
+    self._subscribers = 0
+    self._closed = False
+
+    # Counters reported by stats()
+    self._published = 0
+    self._resumed = 0
+    self._resyncs = 0
+
+  def event_id(self, seq):
+    return f'{self.epoch}-{seq}'
+
+  def has_subscribers(self, scope=None):
+    with self._lock:
+      return scope in self._scopes
+
+  # Publish an event of type with a JSON-serializable data payload.
+  # Returns its sequence number.
+  def publish(self, type, data, scope=None):
+    payload = f'event: {type}\n'.encode('utf-8') + b'data: ' + dumps_line(data) + b'\n'
+    with self._lock:
+      self._seq += 1
+      self._events.append(Event(self._seq, scope, f'id: {self.event_id(self._seq)}\n'.encode('utf-8') + payload))
+      self._published += 1
+      subscribed = self._scopes.get(scope)
+      if subscribed is not None:
+        subscribed[1].notify_all()
+      return self._seq
+
+  # Call with the lock held
+  def _resync(self):
+    self._resyncs += 1
+    return f'id: {self.event_id(self._seq)}\nevent: resync\ndata: {{}}\n\n'.encode('utf-8')
+
+  # Sequence number to resume after from a Last-Event-ID, or None when the
+  # events since then are no longer (or were never) in the buffer
+  def _resume_seq(self, last_event_id):
+    epoch, _, seq = last_event_id.partition('-')
+    if epoch != self.epoch or not seq.isdigit():
+      return None
+    seq = int(seq)
+    oldest = self._events[0].seq if self._events else self._seq + 1
+    if seq > self._seq or seq < oldest - 1:
+      return None
+    return seq
+
+  # Payloads of the events of scope after seq, or a resync when some of them
+  # already left the buffer. Call with the lock held.
+  def _events_after(self, seq, scope):
+    if seq >= self._seq:
+      return []
+    oldest = self._events[0].seq
+    if seq < oldest - 1:
+      return [self._resync()]
+    return [
+      self._events[index].payload for index in range(seq + 1 - oldest, len(self._events))
+      if self._events[index].scope == scope
+    ]
+
+  # Generator of the SSE byte chunks for one subscriber, to be returned as a
+  # streaming response body. Raises TooManySubscribers when the limit is reached.
+  def subscribe(self, scope=None, last_event_id=None):
+    with self._lock:
+      if self._closed:
+        raise TooManySubscribers('The event stream is shutting down')
+      if self._subscribers >= self.max_subscribers:
+        raise TooManySubscribers(f'{self.max_subscribers} streams are already open, try again later')
+      self._subscribers += 1
+      subscribed = self._scopes.setdefault(scope, [0, threading.Condition(self._lock)])
+      subscribed[0] += 1
+
+      if not last_event_id:
+        first = []
+      else:
+        seq = self._resume_seq(last_event_id)
+        if seq is None:
+          first = [self._resync()]
+        else:
+          self._resumed += 1
+          first = self._events_after(seq, scope)
+      stream = self._stream(scope, subscribed[1], self._seq, first)
+    # Run it up to its try block, so that closing the response unsubscribes
+    # even when it is closed before the first chunk is sent
+    next(stream)
+    return stream
+
+  def _stream(self, scope, cond, seq, first):
+    try:
+      yield
+      # Ask EventSource to reconnect after 3s, then replay what was missed
+      yield b'retry: 3000\n\n' + b''.join(first)
+      sent = time.monotonic()
+      while True:
+        with self._lock:
+          remaining = self.heartbeat - (time.monotonic() - sent)
+          if self._seq == seq and not self._closed and remaining > 0:
+            cond.wait(remaining)
+          if self._closed:
+            return
+          payloads = self._events_after(seq, scope)
+          seq = self._seq
+        if payloads:
+          yield b''.join(payloads)
+          sent = time.monotonic()
+        elif time.monotonic() - sent >= self.heartbeat:
+          yield b': keep-alive\n\n'
+          sent = time.monotonic()
+    finally:
+      with self._lock:
+        self._subscribers -= 1
+        subscribed = self._scopes[scope]
+        subscribed[0] -= 1
+        if not subscribed[0]:
+          del self._scopes[scope]
+
+  # End every open stream (e.g. on shutdown)
+  def close(self):
+    with self._lock:
+      self._closed = True
+      for _, cond in self._scopes.values():
+        cond.notify_all()
+
+  def stats(self):
+    with self._lock:
+      return {
+        "epoch": self.epoch,
+        "last_seq": self._seq,
+        "buffered": len(self._events),
+        "buffer_size": self.buffer_size,
+        "subscribers": self._subscribers,
+        "scopes": len(self._scopes),
+        "published": self._published,
+        "resumed": self._resumed,
+        "resyncs": self._resyncs
+      }
+
+# Counts of a round of answers for the "reviews" event
+def review_counts(session, items):
+  correct = sum(1 for _, is_correct, _ in items if is_correct)
+  return {
+    "session_id": session['id'],
+    "group_id": session['group_id'],
+    "count": len(items),
+    "correct": correct,
+    "wrong": len(items) - correct
+  }
+
+# Dashboard numbers pushed as a "stats" event after each write, the same
+# totals as GET /dashboard/stats without the 30 day active group count
+def dashboard_stats(cursor, shared_schema='main'):
+  totals = stats.read_totals(cursor, shared_schema)
+  success_rate = 0
+  if totals["total_attempts"]:
+    success_rate = totals["total_correct"] * 1.0 / totals["total_attempts"]
+  return {
+    "total_vocabulary": totals["total_vocabulary"],
+    "total_words_studied": totals["total_words_studied"],
+    "mastered_words": totals["mastered_words"],
+    "success_rate": success_rate,
+    "total_sessions": totals["total_sessions"],
+    "current_streak": stats.read_streak(cursor)["current_streak"]
+  }
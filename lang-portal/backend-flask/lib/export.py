@@ -0,0 +1,70 @@
+import csv
+import io
+import zlib
+from operator import itemgetter
+
+from lib.serialization import dumps_line
+
+FORMATS = {
+  'ndjson': 'application/x-ndjson',
+  'csv': 'text/csv'
+}
+
+# Rows are pulled from the cursor in batches, so memory stays constant no matter
+# how large the result set is; SQLite steps the statement lazily.
+def iter_batches(cursor, batch_size=1000):
+  while True:
+    rows = cursor.fetchmany(batch_size)
+    if not rows:
+      return
+    yield rows
+
+# Yields bytes, already encoded by dumps_line (orjson when installed)
+def ndjson_chunks(columns, batches):
+  for rows in batches:
+    yield b''.join(dumps_line(dict(zip(columns, row))) for row in rows)
+
+def csv_chunks(columns, batches):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for rows in batches:
+    writer.writerows(rows)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue()
+
+def encode_chunks(chunks):
+  for chunk in chunks:
+    if chunk:
+      yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+
+# gzip member framing around the stream, flushed per chunk so clients can decode incrementally
+def gzip_chunks(chunks, level=6):
+  compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+  for chunk in chunks:
+    data = compressor.compress(chunk)
+    if data:
+      yield data
+  yield compressor.flush()
+
+# Only the columns in fields (all when None), as tuples
+def select_columns(columns, batches, fields):
+  keep = [index for index, column in enumerate(columns) if column in fields]
+  if len(keep) == len(columns):
+    return columns, batches
+  # itemgetter only returns a tuple for two or more indexes
+  values = itemgetter(*keep) if len(keep) > 1 else lambda row: tuple(row[index] for index in keep)
+  return [columns[index] for index in keep], ([values(row) for row in rows] for rows in batches)
+
+# Body generator for an executed cursor: yields bytes in the requested format,
+# with only the columns named in fields when it is given
+def stream(cursor, format='ndjson', gzip=False, batch_size=1000, fields=None):
+  columns = [description[0] for description in cursor.description]
+  batches = iter_batches(cursor, batch_size)
+  if fields is not None:
+    columns, batches = select_columns(columns, batches, fields)
+  chunks = encode_chunks(csv_chunks(columns, batches) if format == 'csv' else ndjson_chunks(columns, batches))
+  return gzip_chunks(chunks) if gzip else chunks
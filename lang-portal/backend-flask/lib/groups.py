@@ -0,0 +1,46 @@
+import json
+
+# Largest number of word ids accepted by one membership request
+MAX_BATCH_SIZE = 1000
+
+class MembershipError(ValueError):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.status = status
+
+# Validate a membership request body ({"word_ids": [...]} or a bare array)
+# into a list of distinct word ids, in request order
+def parse_word_ids(data):
+  if isinstance(data, dict):
+    data = data.get('word_ids')
+  if not isinstance(data, list) or not data:
+    raise MembershipError("A non-empty array of word_ids is required")
+  if len(data) > MAX_BATCH_SIZE:
+    raise MembershipError(f"At most {MAX_BATCH_SIZE} word ids can be sent per request", 413)
+
+  word_ids = []
+  for index, value in enumerate(data):
+    if isinstance(value, bool) or not isinstance(value, int):
+      raise MembershipError(f"word_ids[{index}] must be an integer")
+    word_ids.append(value)
+  return list(dict.fromkeys(word_ids))
+
+# Link the words to the group, skipping those already in it; one statement for
+# the batch. groups.words_count and the due queue follow through triggers.
+# Returns the number of words added. Does not commit.
+def add_words(cursor, group_id, word_ids):
+  cursor.execute('''
+    INSERT INTO word_groups (word_id, group_id)
+    SELECT value, ? FROM json_each(?)
+    WHERE NOT EXISTS (SELECT 1 FROM word_groups wg WHERE wg.group_id = ? AND wg.word_id = value)
+  ''', (group_id, json.dumps(word_ids), group_id))
+  return cursor.rowcount
+
+# Unlink the words from the group, ignoring those not in it.
+# Returns the number of words removed. Does not commit.
+def remove_words(cursor, group_id, word_ids):
+  cursor.execute('''
+    DELETE FROM word_groups
+    WHERE group_id = ? AND word_id IN (SELECT value FROM json_each(?))
+  ''', (group_id, json.dumps(word_ids)))
+  return cursor.rowcount
@@ -0,0 +1,210 @@
+import csv
+import io
+import json
+import os
+import time
+import unicodedata
+
+from lib import sortkeys, stats
+
+BATCH_SIZE = 5000
+FORMATS = ['json', 'ndjson', 'csv']
+
+class ImportFormatError(ValueError):
+  pass
+
+# Accent, case and whitespace insensitive form of a word, e.g. "  Se Réveiller" -> "se reveiller"
+def normalize(text):
+  decomposed = unicodedata.normalize('NFKD', text)
+  stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+  return ' '.join(stripped.casefold().split())
+
+# Dedup key stored in words.norm_key
+def norm_key(french, english):
+  return normalize(french) + '|' + normalize(english)
+
+def detect_format(filename):
+  extension = os.path.splitext(filename or '')[1].lower()
+  if extension in ('.ndjson', '.jsonl'):
+    return 'ndjson'
+  if extension in ('.csv', '.tsv'):
+    return 'csv'
+  return 'json'
+
+# Yield the items of a top-level JSON array without loading the whole document
+def iter_json_array(file, chunk_size=65536):
+  decoder = json.JSONDecoder()
+  buffer = ''
+  position = 0
+  started = False
+  eof = False
+  while True:
+    # Skip whitespace and separators
+    while position < len(buffer) and buffer[position] in ' \t\r\n,':
+      position += 1
+    if position < len(buffer):
+      if not started:
+        if buffer[position] != '[':
+          raise ImportFormatError('Expected a JSON array')
+        started = True
+        position += 1
+        continue
+      if buffer[position] == ']':
+        return
+      try:
+        item, end = decoder.raw_decode(buffer, position)
+      except json.JSONDecodeError:
+        if eof:
+          raise ImportFormatError('Invalid JSON')
+        item = None
+      else:
+        yield item
+        position = end
+        continue
+    elif eof:
+      raise ImportFormatError('Unexpected end of JSON input')
+    chunk = file.read(chunk_size)
+    eof = not chunk
+    buffer = buffer[position:] + chunk
+    position = 0
+
+def iter_ndjson(file):
+  for number, line in enumerate(file, start=1):
+    line = line.strip()
+    if not line:
+      continue
+    try:
+      yield json.loads(line)
+    except json.JSONDecodeError:
+      raise ImportFormatError(f'Invalid JSON on line {number}')
+
+def iter_csv(file):
+  reader = csv.DictReader(file)
+  if not reader.fieldnames or 'french' not in reader.fieldnames or 'english' not in reader.fieldnames:
+    raise ImportFormatError('CSV input needs a header with french and english columns')
+  yield from reader
+
+def iter_rows(file, format):
+  if format == 'json':
+    return iter_json_array(file)
+  if format == 'ndjson':
+    return iter_ndjson(file)
+  if format == 'csv':
+    return iter_csv(file)
+  raise ImportFormatError(f'Unknown format {format}, expected one of {", ".join(FORMATS)}')
+
+def get_or_create_group(cursor, group_name):
+  cursor.execute('SELECT id FROM groups WHERE name = ?', (group_name,))
+  group = cursor.fetchone()
+  if group:
+    return group[0]
+  cursor.execute('INSERT INTO groups (name) VALUES (?)', (group_name,))
+  return cursor.lastrowid
+
+# Import an iterable of {french, english} rows in a single transaction.
+# Rows are staged in executemany batches, then moved into words with set-based
+# statements that skip anything already present under the same norm_key.
+# The quiz distractors of the new words are indexed afterwards, in transactions
+# of their own, see lib/quiz.py.
+def import_rows(conn, rows, group_name=None, batch_size=BATCH_SIZE):
+  start = time.perf_counter()
+  if conn.in_transaction:
+    conn.commit()
+
+  cursor = conn.cursor()
+  rows_read = 0
+  skipped = 0
+  cursor.execute('BEGIN')
+  try:
+    cursor.execute('''
+      CREATE TEMP TABLE IF NOT EXISTS import_stage (
+        norm_key TEXT PRIMARY KEY,
+        french TEXT NOT NULL,
+        english TEXT NOT NULL
+      )
+    ''')
+    cursor.execute('DELETE FROM import_stage')
+
+    batch = []
+    for row in rows:
+      rows_read += 1
+      french = row.get('french') if isinstance(row, dict) else None
+      english = row.get('english') if isinstance(row, dict) else None
+      if not isinstance(french, str) or not isinstance(english, str) or not french.strip() or not english.strip():
+        skipped += 1
+        continue
+      french, english = french.strip(), english.strip()
+      batch.append((norm_key(french, english), french, english))
+      if len(batch) >= batch_size:
+        cursor.executemany('INSERT OR IGNORE INTO import_stage (norm_key, french, english) VALUES (?, ?, ?)', batch)
+        batch = []
+    if batch:
+      cursor.executemany('INSERT OR IGNORE INTO import_stage (norm_key, french, english) VALUES (?, ?, ?)', batch)
+
+    cursor.execute('SELECT COUNT(*) FROM import_stage')
+    staged = cursor.fetchone()[0]
+
+    cursor.execute('''
+      INSERT INTO words (french, english, norm_key)
+      SELECT s.french, s.english, s.norm_key
+      FROM import_stage s
+      WHERE NOT EXISTS (SELECT 1 FROM words w WHERE w.norm_key = s.norm_key)
+      ORDER BY s.rowid
+    ''')
+    words_inserted = cursor.rowcount
+
+    group_id = None
+    linked = 0
+    if group_name:
+      group_id = get_or_create_group(cursor, group_name)
+      cursor.execute('''
+        INSERT INTO word_groups (word_id, group_id)
+        SELECT word_id, ? FROM (
+          SELECT (SELECT MIN(w.id) FROM words w WHERE w.norm_key = s.norm_key) AS word_id
+          FROM import_stage s
+          ORDER BY s.rowid
+        ) AS staged
+        WHERE NOT EXISTS (
+          SELECT 1 FROM word_groups wg WHERE wg.group_id = ? AND wg.word_id = staged.word_id
+        )
+      ''', (group_id, group_id))
+      # groups.words_count follows through the triggers on word_groups
+      linked = cursor.rowcount
+
+    # Keep the listing caches current in the same transaction, so readers
+    # of the shared database never have to catch them up
+    sortkeys.ensure_words(cursor)
+    if group_id is not None:
+      sortkeys.ensure_group(cursor, group_id)
+      stats.refresh_group_progress(cursor, [group_id])
+
+    cursor.execute('DELETE FROM import_stage')
+    conn.commit()
+  except Exception:
+    conn.rollback()
+    raise
+
+  seconds = time.perf_counter() - start
+  return {
+    "rows_read": rows_read,
+    "rows_skipped": skipped,
+    "duplicates": rows_read - skipped - words_inserted,
+    "words_inserted": words_inserted,
+    "group_id": group_id,
+    "words_linked": linked,
+    "seconds": round(seconds, 3),
+    "rows_per_sec": round(rows_read / seconds) if seconds > 0 else rows_read
+  }
+
+# Import from a text stream (an open file or an uploaded file)
+def import_stream(conn, stream, format='json', group_name=None, batch_size=BATCH_SIZE):
+  return import_rows(conn, iter_rows(stream, format), group_name=group_name, batch_size=batch_size)
+
+def import_file(conn, path, format=None, group_name=None, batch_size=BATCH_SIZE):
+  format = format or detect_format(path)
+  with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+    return import_stream(conn, file, format=format, group_name=group_name, batch_size=batch_size)
+
+# Wrap a binary upload stream for import_stream
+def text_stream(binary):
+  return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
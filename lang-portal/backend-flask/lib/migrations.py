@@ -0,0 +1,229 @@
+import importlib.util
+import os
+import re
+import sqlite3
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'migrations')
+
+# Migration files are named NNNN_description.sql or NNNN_description.py
+MIGRATION_FILE = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+CREATE_INDEX = re.compile(r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\b', re.IGNORECASE)
+
+class MigrationError(Exception):
+  pass
+
+def discover(migrations_dir=MIGRATIONS_DIR):
+  migrations = []
+  for filename in os.listdir(migrations_dir):
+    match = MIGRATION_FILE.match(filename)
+    if match:
+      migrations.append((int(match.group(1)), match.group(2), os.path.join(migrations_dir, filename)))
+  migrations.sort()
+  versions = [version for version, _, _ in migrations]
+  if len(versions) != len(set(versions)):
+    raise MigrationError('Duplicate migration version in ' + migrations_dir)
+  return migrations
+
+def ensure_version_table(conn):
+  conn.execute('''
+    CREATE TABLE IF NOT EXISTS schema_version (
+      version INTEGER PRIMARY KEY,
+      name TEXT NOT NULL,
+      applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+  ''')
+  conn.commit()
+
+def applied_versions(conn):
+  ensure_version_table(conn)
+  return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+def current_version(conn):
+  ensure_version_table(conn)
+  return conn.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version').fetchone()[0]
+
+# Split a SQL script into complete statements (trigger bodies stay in one piece)
+def split_statements(script):
+  statements = []
+  buffer = ''
+  for line in script.splitlines(keepends=True):
+    buffer += line
+    if sqlite3.complete_statement(buffer):
+      statement = strip_comments(buffer).strip()
+      if statement:
+        statements.append(statement)
+      buffer = ''
+  if strip_comments(buffer).strip():
+    raise MigrationError('Incomplete SQL statement: ' + buffer.strip())
+  return statements
+
+def strip_comments(sql):
+  return '\n'.join(line for line in sql.splitlines() if not line.strip().startswith('--'))
+
+# Group statements into transactions. Every CREATE INDEX gets a transaction of its own,
+# so a long index build only holds the write lock for that one index and other
+# writers (waiting on busy_timeout) get in between builds.
+def transaction_chunks(statements):
+  chunks = []
+  current = []
+  for statement in statements:
+    if CREATE_INDEX.match(statement):
+      if current:
+        chunks.append(current)
+        current = []
+      chunks.append([statement])
+    else:
+      current.append(statement)
+  if current:
+    chunks.append(current)
+  return chunks
+
+def run_in_transaction(conn, statements):
+  conn.execute('BEGIN')
+  try:
+    for statement in statements:
+      conn.execute(statement)
+    conn.execute('COMMIT')
+  except Exception:
+    conn.execute('ROLLBACK')
+    raise
+
+def apply_sql(conn, path):
+  with open(path, 'r', encoding='utf-8') as file:
+    statements = split_statements(file.read())
+  for chunk in transaction_chunks(statements):
+    run_in_transaction(conn, chunk)
+
+# Python migrations define up(conn) and are responsible for their own transactions
+def apply_python(conn, path):
+  spec = importlib.util.spec_from_file_location('migration_' + os.path.basename(path)[:-3], path)
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+  module.up(conn)
+  if conn.in_transaction:
+    conn.commit()
+
+# Apply every pending migration in order. Each up-step must be idempotent: a
+# migration interrupted half way is simply re-run from the start next time.
+# Returns the list of (version, name) applied.
+def migrate(conn, migrations_dir=MIGRATIONS_DIR, log=None):
+  if conn.in_transaction:
+    conn.commit()
+  done = applied_versions(conn)
+  applied = []
+  for version, name, path in discover(migrations_dir):
+    if version in done:
+      continue
+    if log:
+      log(f"Running migration: {os.path.basename(path)}")
+    try:
+      if path.endswith('.sql'):
+        apply_sql(conn, path)
+      else:
+        apply_python(conn, path)
+    except Exception as e:
+      raise MigrationError(f"Migration {os.path.basename(path)} failed: {e}") from e
+    conn.execute('INSERT OR IGNORE INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+    conn.commit()
+    applied.append((version, name))
+  return applied
+
+# Helpers for Python migrations, ALTER TABLE has no IF NOT EXISTS
+def column_exists(conn, table, column):
+  return any(row[1] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+def add_column(conn, table, column, definition):
+  if not column_exists(conn, table, column):
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+# Representative route queries and the index each one must be planned with
+INDEX_CHECKS = [
+  ('review items of a session (dashboard, session listings)',
+   'SELECT COUNT(*), SUM(correct) FROM word_review_items WHERE study_session_id = ?', (1,),
+   'idx_word_review_items_p*_session'),
+  ('words reviewed in a session (GET /api/study-sessions/:id)',
+   'SELECT w.id, wri.correct FROM words w JOIN word_review_items wri ON wri.word_id = w.id WHERE wri.study_session_id = ?', (1,),
+   'idx_word_review_items_p*_session'),
+  ('review items of a word',
+   'SELECT COUNT(*) FROM word_review_items WHERE word_id = ?', (1,),
+   'idx_word_review_items_p*_word'),
+  ('review items since a date (GET /export/review_items?since=)',
+   'SELECT id FROM word_review_items WHERE created_at >= ? ORDER BY created_at, id', ('2025-01-01',),
+   'idx_word_review_items_p*_created_at'),
+  ('words of a group (GET /groups/:id/words)',
+   'SELECT w.id FROM word_groups wg JOIN words w ON w.id = wg.word_id WHERE wg.group_id = ?', (1,),
+   'idx_word_groups_group_word'),
+  ('groups of a word (GET /words/:id)',
+   'SELECT group_id FROM word_groups WHERE word_id = ?', (1,),
+   'idx_word_groups_word'),
+  ('review aggregate of a word (review writes, GET /words)',
+   'SELECT correct_count, wrong_count FROM word_reviews WHERE word_id = ?', (1,),
+   'idx_word_reviews_word_id'),
+  ('words sorted by french (GET /words)',
+   'SELECT id FROM words ORDER BY french LIMIT 50', (),
+   'idx_words_french'),
+  ('words sorted by english (GET /words)',
+   'SELECT id FROM words ORDER BY english LIMIT 50', (),
+   'idx_words_english'),
+  ('words sorted by correct answers (GET /words?sort_by=correct_count)',
+   'SELECT k.word_id FROM word_sort_keys k JOIN words w ON w.id = k.word_id ORDER BY k.correct_count DESC, k.word_id DESC LIMIT 50', (),
+   'idx_word_sort_keys_correct_count'),
+  ('words sorted by accuracy (GET /words?sort_by=accuracy)',
+   'SELECT k.word_id FROM word_sort_keys k JOIN words w ON w.id = k.word_id ORDER BY k.accuracy, k.word_id LIMIT 50', (),
+   'idx_word_sort_keys_accuracy'),
+  ('words of a group by french (GET /groups/:id/words)',
+   'SELECT word_id FROM group_word_sort_keys WHERE group_id = ? ORDER BY french, word_id LIMIT 10', (1,),
+   'idx_group_word_sort_keys_french'),
+  ('words of a group by wrong answers (GET /groups/:id/words?sort_by=wrong_count)',
+   'SELECT word_id FROM group_word_sort_keys WHERE group_id = ? AND (wrong_count, word_id) < (?, ?) '
+   'ORDER BY wrong_count DESC, word_id DESC LIMIT 10', (1, 5, 100),
+   'idx_group_word_sort_keys_wrong_count'),
+  ('sessions newest first (GET /api/study-sessions)',
+   'SELECT id FROM study_sessions ORDER BY created_at DESC LIMIT 10', (),
+   'idx_study_sessions_created_at'),
+  ('sessions of a group (GET /groups/:id/study_sessions)',
+   'SELECT id FROM study_sessions WHERE group_id = ? ORDER BY created_at DESC LIMIT 10', (1,),
+   'idx_study_sessions_group_created_at'),
+  ('sessions of an activity (GET /api/study-activities/:id/sessions)',
+   'SELECT id FROM study_sessions WHERE study_activity_id = ? ORDER BY created_at DESC LIMIT 10', (1,),
+   'idx_study_sessions_activity_created_at'),
+  ('session summaries newest first (GET /api/study-sessions, /dashboard/recent-session)',
+   'SELECT study_session_id FROM study_session_summary ORDER BY created_at DESC, study_session_id DESC LIMIT 10', (),
+   'idx_session_summary_created_at'),
+  ('session summaries by review count (GET /api/study-sessions?sort_by=reviewItemsCount)',
+   'SELECT study_session_id FROM study_session_summary ORDER BY review_count DESC, study_session_id DESC LIMIT 10', (),
+   'idx_session_summary_review_count'),
+  ('session summaries of a group by end time (GET /groups/:id/study_sessions?sort_by=endTime)',
+   'SELECT study_session_id FROM study_session_summary WHERE group_id = ? ORDER BY end_time DESC, study_session_id DESC LIMIT 10', (1,),
+   'idx_session_summary_group_end_time'),
+  ('session summaries of a group by activity (GET /groups/:id/study_sessions?sort_by=activityName)',
+   'SELECT study_session_id FROM study_session_summary WHERE group_id = ? ORDER BY activity_name ASC, study_session_id ASC LIMIT 10', (1,),
+   'idx_session_summary_group_activity_name'),
+  ('session summaries of an activity by group (GET /api/study-activities/:id/sessions?sort_by=groupName)',
+   'SELECT study_session_id FROM study_session_summary WHERE study_activity_id = ? ORDER BY group_name ASC, study_session_id ASC LIMIT 10', (1,),
+   'idx_session_summary_activity_group_name'),
+  ('due words of a group (GET /groups/:id/due)',
+   'SELECT word_id FROM group_word_schedule WHERE group_id = ? AND due_at <= ? ORDER BY due_at, word_id LIMIT 20', (1, '2025-01-01 00:00:00'),
+   'idx_group_word_schedule_due'),
+  ('new words of a group (GET /groups/:id/due)',
+   'SELECT wg.word_id FROM word_groups wg WHERE wg.group_id = ? AND wg.word_id >= ? '
+   'AND NOT EXISTS (SELECT 1 FROM word_schedule s WHERE s.word_id = wg.word_id) ORDER BY wg.word_id LIMIT 20', (1, 0),
+   'idx_word_groups_group_word'),
+  ('changes since a sync token (GET /sync)',
+   'SELECT entity, entity_id, word_id, seq, deleted FROM change_log WHERE seq > ? ORDER BY seq LIMIT 500', (0,),
+   'idx_change_log_seq'),
+]
+
+def explain(conn, sql, params=()):
+  return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+# Returns [(description, index, ok, plan)] for every entry of INDEX_CHECKS.
+# A * in the index name matches any partition (e.g. idx_word_review_items_p*_word).
+def check_indexes(conn, checks=INDEX_CHECKS):
+  results = []
+  for description, sql, params, index in checks:
+    plan = explain(conn, sql, params)
+    pattern = r'\b' + re.escape(index).replace(r'\*', r'\w+') + r'\b'
+    ok = any(re.search(pattern, detail) for detail in plan)
+    results.append((description, index, ok, plan))
+  return results
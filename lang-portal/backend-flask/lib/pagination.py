@@ -0,0 +1,68 @@
+import base64
+import json
+import threading
+import time
+
+class InvalidCursor(ValueError):
+  pass
+
+# Cursors are opaque to clients: base64 of the sort column, direction and the
+# (sort value, id) of the last row served. Binding the sort to the cursor stops a
+# client from reusing a cursor after changing sort_by/order.
+def encode_cursor(sort_by, order, value, row_id):
+  payload = json.dumps({"s": sort_by, "o": order, "v": value, "id": row_id}, separators=(',', ':'))
+  return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+# Returns (value, id) to seek past, or None for an empty cursor (first page)
+def decode_cursor(cursor, sort_by, order):
+  if not cursor:
+    return None
+  try:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    value, row_id = payload['v'], int(payload['id'])
+  except Exception:
+    raise InvalidCursor('Invalid cursor')
+  if payload.get('s') != sort_by or payload.get('o') != order:
+    raise InvalidCursor('Cursor does not match sort_by/order')
+  return value, row_id
+
+# Row-value comparison so SQLite can seek directly into an index on (sort column, id)
+def seek_clause(sort_expr, id_expr, order):
+  operator = '>' if order == 'asc' else '<'
+  return f'({sort_expr}, {id_expr}) {operator} (?, ?)'
+
+# Split a fetched page of limit + 1 rows into (rows, next_cursor)
+def next_page(rows, limit, sort_by, order, sort_key='sort_value'):
+  if len(rows) <= limit:
+    return rows, None
+  rows = rows[:limit]
+  last = rows[-1]
+  return rows, encode_cursor(sort_by, order, last[sort_key], last['id'])
+
+# Small TTL cache for COUNT(*) totals so cursor pagination doesn't
+# rescan the table on every page
+class CountCache:
+  def __init__(self, ttl=30.0):
+    self.ttl = ttl
+    self._entries = {}
+    self._lock = threading.Lock()
+
+  def get(self, key, compute):
+    now = time.monotonic()
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry and now - entry[1] < self.ttl:
+        return entry[0]
+    value = compute()
+    with self._lock:
+      self._entries[key] = (value, now)
+    return value
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+# Whether the client asked for a total alongside a cursor page (?total=none skips it)
+def wants_total(args):
+  return args.get('total', 'cached') != 'none'
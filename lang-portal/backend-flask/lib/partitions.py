@@ -0,0 +1,291 @@
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+from itertools import groupby
+
+from lib import stats
+
+# Name of the view over the hot partitions, what every query reads from
+VIEW = 'word_review_items'
+COLUMNS = ('id', 'word_id', 'study_session_id', 'correct', 'created_at')
+
+# Month partitions a row falls into: 'YYYY-MM' of its created_at
+MONTH = re.compile(r'^\d{4}-\d{2}$')
+
+# Review items are stored in one table per calendar month (word_review_items_p<id>),
+# listed in review_partitions, and read through the word_review_items view, a
+# UNION ALL of the hot partitions. SQLite pushes WHERE clauses into each arm of
+# the view, so lookups by session or word use every partition's own index.
+#
+# A partition is hot (in the view), detached (taken out of the view by a reset,
+# the table is kept until the next archive run) or archived (copied into a
+# gzipped SQLite file and dropped). Ids stay unique across partitions through
+# review_item_sequence.
+
+def partition_table(partition_id):
+  return f'word_review_items_p{int(partition_id)}'
+
+def month_of(created_at):
+  month = str(created_at or '')[:7]
+  return month if MONTH.match(month) else '0000-00'
+
+def create_partition_table(cursor, table):
+  cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+      id INTEGER PRIMARY KEY,
+      word_id INTEGER NOT NULL,
+      study_session_id INTEGER NOT NULL,
+      correct BOOLEAN NOT NULL,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+  ''')
+  cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_session ON {table}(study_session_id, word_id, correct)')
+  cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_word ON {table}(word_id)')
+  cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)')
+
+# Hot partitions as [(id, month, table)], oldest month first, optionally only
+# those holding rows created at or after since
+def hot_partitions(cursor, since=None):
+  cursor.execute('''
+    SELECT id, month FROM review_partitions
+    WHERE state = 'hot' AND month >= ?
+    ORDER BY month
+  ''', (month_of(since) if since else '',))
+  return [(row[0], row[1], partition_table(row[0])) for row in cursor.fetchall()]
+
+# SELECT over the given partition tables, the body of the view
+def union_sql(tables):
+  columns = ', '.join(COLUMNS)
+  if not tables:
+    return (
+      'SELECT CAST(NULL AS INTEGER) AS id, CAST(NULL AS INTEGER) AS word_id, '
+      'CAST(NULL AS INTEGER) AS study_session_id, CAST(NULL AS BOOLEAN) AS correct, '
+      'CAST(NULL AS DATETIME) AS created_at WHERE 0'
+    )
+  return '\nUNION ALL\n'.join(f'SELECT {columns} FROM {table}' for table in tables)
+
+# Subquery over the partitions holding rows created at or after since, for
+# range reads that should not touch older months, e.g. FROM ({source_sql(...)}) wri
+def source_sql(cursor, since=None):
+  if not since:
+    return VIEW
+  return '(' + union_sql([table for _, _, table in hot_partitions(cursor, since)]) + ')'
+
+# Recreate the view over the hot partitions. Does not commit.
+# Qualified with main: a learner shard sees the shared database's view too.
+def refresh_view(cursor):
+  tables = [table for _, _, table in hot_partitions(cursor)]
+  cursor.execute(f'DROP VIEW IF EXISTS main.{VIEW}')
+  cursor.execute(f'CREATE VIEW main.{VIEW} AS {union_sql(tables)}')
+
+# Id of the hot partition of month, created (and added to the view) if missing.
+# Does not commit.
+def ensure_partition(cursor, month, refresh=True):
+  # The catalog row first: it opens the write transaction the table is created in
+  cursor.execute("INSERT OR IGNORE INTO review_partitions (month, state) VALUES (?, 'hot')", (month,))
+  created = cursor.rowcount > 0
+  cursor.execute("SELECT id FROM review_partitions WHERE month = ? AND state = 'hot'", (month,))
+  partition_id = cursor.fetchone()[0]
+  if created:
+    create_partition_table(cursor, partition_table(partition_id))
+    if refresh:
+      refresh_view(cursor)
+  return partition_id
+
+# Reserve count consecutive ids, returns the first one
+def allocate_ids(cursor, count):
+  cursor.execute('UPDATE review_item_sequence SET last_id = last_id + ? WHERE id = 1 RETURNING last_id', (count,))
+  return cursor.fetchone()[0] - count + 1
+
+# Insert review items, rows of (word_id, study_session_id, correct, created_at),
+# into the partitions of their months. Does not commit.
+def insert_reviews(cursor, rows):
+  if not rows:
+    return
+  by_month = sorted(rows, key=lambda row: month_of(row[3]))
+  cursor.execute('''
+    SELECT id, month FROM review_partitions
+    WHERE state = 'hot' AND month IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(sorted({month_of(row[3]) for row in rows})),))
+  tables = {row[1]: partition_table(row[0]) for row in cursor.fetchall()}
+
+  created = False
+  next_id = allocate_ids(cursor, len(rows))
+  for month, items in groupby(by_month, key=lambda row: month_of(row[3])):
+    if month not in tables:
+      tables[month] = partition_table(ensure_partition(cursor, month, refresh=False))
+      created = True
+    items = list(items)
+    cursor.executemany(
+      f'INSERT INTO {tables[month]} (id, word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?, ?)',
+      [(next_id + offset,) + tuple(row) for offset, row in enumerate(items)]
+    )
+    next_id += len(items)
+  if created:
+    refresh_view(cursor)
+
+# Take every hot partition out of the view, leaving an empty one for the
+# current month: clearing the history costs a catalog update however many rows
+# it holds. The tables stay on disk until archive() drops them. Does not commit.
+def detach_all(cursor):
+  cursor.execute("UPDATE review_partitions SET state = 'detached', detached_at = CURRENT_TIMESTAMP WHERE state = 'hot'")
+  detached = cursor.rowcount
+  ensure_partition(cursor, month_of(stats.utc_timestamp()), refresh=False)
+  refresh_view(cursor)
+  return detached
+
+# Copy a partition table into a new gzipped SQLite file at path + '.gz'
+def write_archive(conn, table, path, info):
+  if os.path.exists(path):
+    os.remove(path)
+  conn.execute('ATTACH DATABASE ? AS cold', (path,))
+  try:
+    conn.execute('BEGIN')
+    conn.execute(f'CREATE TABLE cold.word_review_items AS SELECT {", ".join(COLUMNS)} FROM main.{table} ORDER BY id')
+    conn.execute('CREATE TABLE cold.archive_info (key TEXT PRIMARY KEY, value)')
+    conn.executemany('INSERT INTO cold.archive_info (key, value) VALUES (?, ?)', list(info.items()))
+    conn.commit()
+  finally:
+    conn.execute('DETACH DATABASE cold')
+  with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb') as target:
+    shutil.copyfileobj(source, target)
+  os.remove(path)
+  return path + '.gz'
+
+# Move closed months to cold storage: every detached partition, and the hot
+# ones older than the last keep_months months (the current month counts as
+# one), are written to <directory>/<prefix>-<month>-p<id>.db.gz and dropped.
+# Archived rows leave the view and the rebuilds, the rollups keep counting them.
+# conn must not be in a transaction. Returns the list of archived partitions.
+def archive(conn, directory, keep_months=12, prefix='reviews'):
+  if conn.in_transaction:
+    conn.commit()
+  os.makedirs(directory, exist_ok=True)
+  cutoff = months_back(month_of(stats.utc_timestamp()), max(1, keep_months) - 1)
+  rows = conn.execute('''
+    SELECT id, month, state FROM review_partitions
+    WHERE state = 'detached' OR (state = 'hot' AND month < ?)
+    ORDER BY id
+  ''', (cutoff,)).fetchall()
+
+  archived = []
+  for partition_id, month, state in rows:
+    table = partition_table(partition_id)
+    count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    path = os.path.join(directory, f'{prefix}-{month}-p{partition_id}.db')
+    path = write_archive(conn, table, path, {
+      'month': month, 'state': state, 'partition_id': partition_id,
+      'row_count': count, 'archived_at': stats.utc_timestamp()
+    })
+    conn.execute('BEGIN')
+    conn.execute('''
+      UPDATE review_partitions
+      SET state = 'archived', row_count = ?, archive_path = ?, archived_at = CURRENT_TIMESTAMP
+      WHERE id = ?
+    ''', (count, os.path.abspath(path), partition_id))
+    if state == 'hot':
+      refresh_view(conn.cursor())
+    conn.execute(f'DROP TABLE IF EXISTS {table}')
+    conn.commit()
+    archived.append({'id': partition_id, 'month': month, 'state': state, 'rows': count, 'path': path})
+  return archived
+
+# Bring an archive file back as a hot partition. Rows already present in the
+# view (the same ids) are skipped. Returns the number of rows restored.
+def restore(conn, path):
+  if conn.in_transaction:
+    conn.commit()
+  unpacked = path[:-3] if path.endswith('.gz') else path + '.restore'
+  with gzip.open(path, 'rb') as source, open(unpacked, 'wb') as target:
+    shutil.copyfileobj(source, target)
+  try:
+    conn.execute('ATTACH DATABASE ? AS cold', (unpacked,))
+    try:
+      conn.execute('BEGIN')
+      cursor = conn.cursor()
+      month = cursor.execute("SELECT value FROM cold.archive_info WHERE key = 'month'").fetchone()[0]
+      table = partition_table(ensure_partition(cursor, month))
+      cursor.execute(f'''
+        INSERT OR IGNORE INTO {table} ({", ".join(COLUMNS)})
+        SELECT {", ".join(COLUMNS)} FROM cold.word_review_items
+        WHERE id NOT IN (SELECT id FROM {VIEW})
+      ''')
+      restored = cursor.rowcount
+      conn.commit()
+    finally:
+      conn.execute('DETACH DATABASE cold')
+  finally:
+    os.remove(unpacked)
+  return restored
+
+def months_back(month, count):
+  year, number = int(month[:4]), int(month[5:7]) - count
+  while number < 1:
+    year, number = year - 1, number + 12
+  return f'{year:04d}-{number:02d}'
+
+# Move the rows of a plain word_review_items table into month partitions and
+# replace it with the view. Used by the migrations; safe to re-run after an
+# interruption (ids are kept, so rows already copied are skipped).
+def convert_table(conn, log=None):
+  conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_partitions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      month TEXT NOT NULL,
+      state TEXT NOT NULL DEFAULT 'hot' CHECK (state IN ('hot', 'detached', 'archived')),
+      row_count INTEGER,
+      archive_path TEXT,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      detached_at DATETIME,
+      archived_at DATETIME
+    )
+  ''')
+  conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_review_partitions_hot_month ON review_partitions(month) WHERE state = 'hot'")
+  conn.execute('CREATE TABLE IF NOT EXISTS review_item_sequence (id INTEGER PRIMARY KEY CHECK (id = 1), last_id INTEGER NOT NULL)')
+  if conn.in_transaction:
+    conn.commit()
+
+  kind = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (VIEW,)).fetchone()
+  if kind is not None and kind[0] == 'view':
+    return
+  if kind is None:
+    conn.execute('BEGIN')
+    conn.execute('INSERT OR IGNORE INTO review_item_sequence (id, last_id) VALUES (1, 0)')
+    ensure_partition(conn.cursor(), month_of(stats.utc_timestamp()))
+    conn.commit()
+    return
+
+  months = [row[0] for row in conn.execute(f'''
+    SELECT DISTINCT substr(created_at, 1, 7) FROM {VIEW} ORDER BY 1
+  ''')]
+  for month in months:
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    cursor = conn.cursor()
+    table = partition_table(ensure_partition(cursor, month_of(month), refresh=False))
+    # Rows with a missing or malformed created_at go to the '0000-00' partition
+    condition = 'substr(created_at, 1, 7) = ?' if month_of(month) == month else 'substr(created_at, 1, 7) IS ?'
+    cursor.execute(f'''
+      INSERT OR IGNORE INTO {table} ({", ".join(COLUMNS)})
+      SELECT {", ".join(COLUMNS)} FROM {VIEW} WHERE {condition}
+    ''', (month,))
+    conn.commit()
+    if log:
+      log(f'  {month}: {cursor.rowcount} review items ({time.perf_counter() - started:.1f}s)')
+
+  conn.execute('BEGIN')
+  cursor = conn.cursor()
+  # Continue after the highest id ever handed out, deleted rows included
+  cursor.execute(f'''
+    INSERT OR REPLACE INTO review_item_sequence (id, last_id)
+    SELECT 1, MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = '{VIEW}'), 0),
+                  COALESCE((SELECT MAX(id) FROM {VIEW}), 0))
+  ''')
+  cursor.execute(f'DROP TABLE main.{VIEW}')
+  cursor.execute(f"DELETE FROM sqlite_sequence WHERE name = '{VIEW}'")
+  ensure_partition(cursor, month_of(stats.utc_timestamp()), refresh=False)
+  refresh_view(cursor)
+  conn.commit()
@@ -0,0 +1,199 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from urllib.parse import quote
+
+# Pragmas applied to every connection the pool opens.
+# WAL lets readers run alongside the single writer, NORMAL sync is safe in WAL mode
+# (only the last transactions can be lost on power failure, never corruption).
+DEFAULT_PRAGMAS = {
+  'journal_mode': 'WAL',
+  'synchronous': 'NORMAL',
+  'cache_size': -16000,      # negative value = KiB, so ~16MB of page cache per connection
+  'mmap_size': 268435456,    # 256MB of memory-mapped I/O for reads
+  'busy_timeout': 5000,      # wait up to 5s on a locked database instead of failing
+  'temp_store': 'MEMORY',
+}
+
+class PoolTimeout(Exception):
+  pass
+
+# URI opening a database file read-only, for ATTACH
+def read_only_uri(path):
+  return 'file:' + quote(os.path.abspath(path)) + '?mode=ro'
+
+class ConnectionPool:
+  def __init__(self, database, max_size=8, min_size=2, timeout=10.0,
+               pragmas=None, statement_cache_size=256, attach=None, uri=False):
+    # Every connection to an in-memory database is a separate database,
+    # so the pool can only ever hand out a single shared connection
+    if database == ':memory:':
+      max_size, min_size = 1, 1
+
+    self.database = database
+    self.max_size = max(1, max_size)
+    self.min_size = min(max(0, min_size), self.max_size)
+    self.timeout = timeout
+    self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+    # sqlite3 keeps an LRU of compiled statements per connection, keyed by SQL text
+    self.statement_cache_size = statement_cache_size
+    # {schema name: database path} attached read-only to every connection
+    self.attach = dict(attach or {})
+    # database is a file: URI (e.g. read-only or immutable)
+    self.uri = uri
+
+    self._idle = deque()
+    self._size = 0
+    self._closed = False
+    self._cond = threading.Condition()
+
+    # Counters reported by stats()
+    self._created = 0
+    self._checkouts = 0
+    self._waits = 0
+    self._timeouts = 0
+    self._total_wait = 0.0
+    self._max_wait = 0.0
+
+    self.warm()
+
+  def _connect(self):
+    conn = sqlite3.connect(
+      self.database,
+      check_same_thread=False,  # connections move between request threads
+      cached_statements=self.statement_cache_size,
+      uri=self.uri or bool(self.attach)  # lets ATTACH open read-only URIs
+    )
+    conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+    for name, value in self.pragmas.items():
+      conn.execute(f'PRAGMA {name} = {value}')
+    for schema, path in self.attach.items():
+      conn.execute(f'ATTACH DATABASE ? AS {schema}', (read_only_uri(path),))
+    return conn
+
+  # Open connections up to min_size so the first requests don't pay the connect cost
+  def warm(self):
+    with self._cond:
+      missing = max(0, self.min_size - self._size)
+      self._size += missing
+    for opened in range(missing):
+      try:
+        conn = self._connect()
+      except Exception:
+        # Give back the slots of the connections that were never opened
+        with self._cond:
+          self._size -= missing - opened
+          self._cond.notify_all()
+        raise
+      with self._cond:
+        self._created += 1
+        self._idle.append(conn)
+        self._cond.notify()
+
+  def acquire(self):
+    start = time.perf_counter()
+    deadline = start + self.timeout
+    waited = False
+    conn = None
+    with self._cond:
+      while True:
+        if self._closed:
+          raise PoolTimeout('connection pool is closed')
+        if self._idle:
+          # LIFO: the most recently used connection has the warmest caches
+          conn = self._idle.pop()
+          break
+        if self._size < self.max_size:
+          self._size += 1
+          break
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+          self._timeouts += 1
+          raise PoolTimeout(f'no database connection available after {self.timeout}s')
+        waited = True
+        self._cond.wait(remaining)
+
+    created = False
+    if conn is None:
+      try:
+        conn = self._connect()
+        created = True
+      except Exception:
+        with self._cond:
+          self._size -= 1
+          self._cond.notify()
+        raise
+
+    wait = time.perf_counter() - start
+    with self._cond:
+      self._checkouts += 1
+      self._total_wait += wait
+      self._max_wait = max(self._max_wait, wait)
+      if waited:
+        self._waits += 1
+      if created:
+        self._created += 1
+    return conn
+
+  def release(self, conn):
+    # Never hand the next request a connection with an open transaction
+    try:
+      if conn.in_transaction:
+        conn.rollback()
+    except sqlite3.Error:
+      self._discard(conn)
+      return
+
+    with self._cond:
+      if self._closed:
+        self._size -= 1
+        conn.close()
+        return
+      self._idle.append(conn)
+      self._cond.notify()
+
+  def _discard(self, conn):
+    try:
+      conn.close()
+    except sqlite3.Error:
+      pass
+    with self._cond:
+      self._size -= 1
+      self._cond.notify()
+
+  def close(self):
+    with self._cond:
+      self._closed = True
+      idle = list(self._idle)
+      self._idle.clear()
+      self._size -= len(idle)
+      self._cond.notify_all()
+    for conn in idle:
+      conn.close()
+
+  @property
+  def closed(self):
+    return self._closed
+
+  def stats(self):
+    with self._cond:
+      return {
+        "database": self.database,
+        "max_size": self.max_size,
+        "min_size": self.min_size,
+        "size": self._size,
+        "idle": len(self._idle),
+        "in_use": self._size - len(self._idle),
+        "connections_created": self._created,
+        "checkouts": self._checkouts,
+        "checkouts_waited": self._waits,
+        "timeouts": self._timeouts,
+        "wait_ms_total": round(self._total_wait * 1000, 3),
+        "wait_ms_avg": round(self._total_wait * 1000 / self._checkouts, 3) if self._checkouts else 0.0,
+        "wait_ms_max": round(self._max_wait * 1000, 3),
+        "statement_cache_size": self.statement_cache_size,
+        "pragmas": self.pragmas,
+        "attached": self.attach
+      }
@@ -0,0 +1,188 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_app_context
+
+logger = logging.getLogger('lang_portal.sql')
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+class Histogram:
+  __slots__ = ('counts', 'total', 'count')
+
+  def __init__(self):
+    self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+    self.total = 0.0
+    self.count = 0
+
+  def observe(self, seconds):
+    self.counts[bisect_left(BUCKETS, seconds)] += 1
+    self.total += seconds
+    self.count += 1
+
+  def merge(self, other):
+    for index, value in enumerate(other.counts):
+      self.counts[index] += value
+    self.total += other.total
+    self.count += other.count
+
+# Per-request numbers, kept in flask.g so recording needs no locking
+class RequestProfile:
+  __slots__ = ('queries', 'sql_seconds', 'statements', 'slow')
+
+  def __init__(self):
+    self.queries = 0
+    self.sql_seconds = 0.0
+    self.statements = Histogram()
+    self.slow = 0
+
+class EndpointStats:
+  def __init__(self):
+    self.requests = 0
+    self.queries = 0
+    self.slow = 0
+    self.request_sql = Histogram()
+    self.statements = Histogram()
+
+class QueryProfiler:
+  def __init__(self, slow_query_ms=100.0, explain_slow=True):
+    self.slow_query_seconds = slow_query_ms / 1000.0
+    self.explain_slow = explain_slow
+    self._endpoints = {}
+    self._lock = threading.Lock()
+
+  def start_request(self):
+    g.sql_profile = RequestProfile()
+
+  def record(self, cursor, sql, params, seconds, many=False):
+    profile = g.get('sql_profile') if has_app_context() else None
+    if profile is not None:
+      profile.queries += 1
+      profile.sql_seconds += seconds
+      profile.statements.observe(seconds)
+    if seconds >= self.slow_query_seconds:
+      if profile is not None:
+        profile.slow += 1
+      self.log_slow(cursor, sql, params, seconds, many)
+
+  # SQLite steps most of a SELECT lazily while rows are fetched, count that time too
+  def record_fetch(self, seconds):
+    profile = g.get('sql_profile') if has_app_context() else None
+    if profile is not None:
+      profile.sql_seconds += seconds
+
+  def log_slow(self, cursor, sql, params, seconds, many):
+    statement = ' '.join(sql.split())
+    plan = []
+    if self.explain_slow and not many:
+      try:
+        plan = [row[3] for row in cursor.connection.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+      except Exception as e:
+        plan = [f'(plan unavailable: {e})']
+    logger.warning(
+      'slow query %.1fms: %s params=%.200r%s',
+      seconds * 1000, statement, params,
+      ''.join('\n  plan: ' + detail for detail in plan)
+    )
+
+  # Fold the request into the per-endpoint aggregates; returns the request profile
+  def finish_request(self, endpoint):
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+      return None
+    with self._lock:
+      stats = self._endpoints.get(endpoint)
+      if stats is None:
+        stats = self._endpoints[endpoint] = EndpointStats()
+      stats.requests += 1
+      stats.queries += profile.queries
+      stats.slow += profile.slow
+      stats.request_sql.observe(profile.sql_seconds)
+      stats.statements.merge(profile.statements)
+    return profile
+
+  # Prometheus text exposition of the per-endpoint aggregates
+  def metrics_lines(self, prefix='lang_portal'):
+    with self._lock:
+      endpoints = sorted(self._endpoints.items())
+      lines = []
+      lines.append(f'# HELP {prefix}_requests_total Requests served, by endpoint')
+      lines.append(f'# TYPE {prefix}_requests_total counter')
+      for endpoint, stats in endpoints:
+        lines.append(f'{prefix}_requests_total{{endpoint="{endpoint}"}} {stats.requests}')
+      lines.append(f'# HELP {prefix}_sql_queries_total SQL statements executed, by endpoint')
+      lines.append(f'# TYPE {prefix}_sql_queries_total counter')
+      for endpoint, stats in endpoints:
+        lines.append(f'{prefix}_sql_queries_total{{endpoint="{endpoint}"}} {stats.queries}')
+      lines.append(f'# HELP {prefix}_sql_slow_queries_total SQL statements over the slow query threshold, by endpoint')
+      lines.append(f'# TYPE {prefix}_sql_slow_queries_total counter')
+      for endpoint, stats in endpoints:
+        lines.append(f'{prefix}_sql_slow_queries_total{{endpoint="{endpoint}"}} {stats.slow}')
+      self._histogram_lines(lines, f'{prefix}_sql_request_seconds', 'Total SQL time per request', endpoints, 'request_sql')
+      self._histogram_lines(lines, f'{prefix}_sql_statement_seconds', 'SQL time per statement', endpoints, 'statements')
+    return lines
+
+  def _histogram_lines(self, lines, name, help, endpoints, attribute):
+    lines.append(f'# HELP {name} {help}, by endpoint')
+    lines.append(f'# TYPE {name} histogram')
+    for endpoint, stats in endpoints:
+      histogram = getattr(stats, attribute)
+      cumulative = 0
+      for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+      lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.total:.6f}')
+      lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+
+# Wraps a sqlite3.Cursor and times every statement; everything else is delegated
+class ProfilingCursor:
+  __slots__ = ('_cursor', '_profiler')
+
+  def __init__(self, cursor, profiler):
+    self._cursor = cursor
+    self._profiler = profiler
+
+  def execute(self, sql, params=()):
+    start = time.perf_counter()
+    self._cursor.execute(sql, params)
+    self._profiler.record(self._cursor, sql, params, time.perf_counter() - start)
+    return self
+
+  def executemany(self, sql, seq_of_params):
+    start = time.perf_counter()
+    self._cursor.executemany(sql, seq_of_params)
+    self._profiler.record(self._cursor, sql, (), time.perf_counter() - start, many=True)
+    return self
+
+  def executescript(self, script):
+    start = time.perf_counter()
+    self._cursor.executescript(script)
+    self._profiler.record(self._cursor, script, (), time.perf_counter() - start, many=True)
+    return self
+
+  def fetchone(self):
+    start = time.perf_counter()
+    row = self._cursor.fetchone()
+    self._profiler.record_fetch(time.perf_counter() - start)
+    return row
+
+  def fetchmany(self, *args):
+    start = time.perf_counter()
+    rows = self._cursor.fetchmany(*args)
+    self._profiler.record_fetch(time.perf_counter() - start)
+    return rows
+
+  def fetchall(self):
+    start = time.perf_counter()
+    rows = self._cursor.fetchall()
+    self._profiler.record_fetch(time.perf_counter() - start)
+    return rows
+
+  def __iter__(self):
+    return iter(self._cursor)
+
+  def __getattr__(self, name):
+    return getattr(self._cursor, name)
@@ -0,0 +1,546 @@
+import bisect
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from lib import importer
+
+# Distractors kept per word in word_distractors
+DISTRACTORS_PER_WORD = 8
+
+# Shortest shared prefix that makes two words confusable
+MIN_PREFIX = 3
+
+# Words sharing a prefix scored per word, the closest in sorted order: with a
+# common prefix every word would otherwise be scored against every other one
+MAX_PREFIX_CANDIDATES = 32
+
+# New words indexed per transaction, so indexing a large import never holds
+# the write lock for long
+INDEX_BATCH_SIZE = 500
+
+# Largest GET /groups/:id/quiz
+MAX_QUESTIONS = 50
+MAX_CHOICES = 6
+
+# Prompt language - answer language
+DIRECTIONS = ('fr-en', 'en-fr')
+
+# Groups of at most this many times the words a quiz samples are read whole;
+# larger ones are sampled by seeking idx_word_groups_group_word, in at most
+# MAX_SAMPLE_ROUNDS queries
+SAMPLE_SCAN_FACTOR = 4
+MAX_SAMPLE_ROUNDS = 4
+
+class QuizError(ValueError):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.status = status
+
+# Bit masks of the positions of each character of pattern, for edit_distance()
+def char_masks(pattern):
+  masks = {}
+  for index, char in enumerate(pattern):
+    masks[char] = masks.get(char, 0) | (1 << index)
+  return masks
+
+# Levenshtein distance between pattern (given as its char_masks()) and text,
+# with Myers' bit-parallel algorithm: one pass over text, whatever the length
+# of pattern, about ten times faster than the dynamic programming table in Python
+def edit_distance(masks, length, text):
+  if not length:
+    return len(text)
+  all_bits = (1 << length) - 1
+  last_bit = 1 << (length - 1)
+  vp, vn, distance = all_bits, 0, length
+  for char in text:
+    eq = masks.get(char, 0)
+    xv = eq | vn
+    xh = (((eq & vp) + vp) ^ vp) | eq
+    hp = vn | ~(xh | vp)
+    hn = vp & xh
+    if hp & last_bit:
+      distance += 1
+    elif hn & last_bit:
+      distance -= 1
+    hp = (hp << 1) | 1
+    hn <<= 1
+    vp = (hn | ~(xv | hp)) & all_bits
+    vn = hp & xv
+  return distance
+
+# Spelling distance within which two words are confusable, by the length of
+# the shorter one
+def max_distance(length):
+  return 1 if length < 8 else 2
+
+# (piece number, start, end) of a key of length split into count pieces
+def pieces(length, count):
+  size, extra = divmod(length, count)
+  start = 0
+  for number in range(count):
+    end = start + size + (1 if number < extra else 0)
+    yield number, start, end
+    start = end
+
+# Keys by the max_distance() + 1 pieces they are split into. d edits can
+# change at most d pieces, so a key within max_distance() of another has a
+# piece left whole in it, shifted by at most d characters. A search looks up
+# the substrings of the key at those places and only measures the distance to
+# the keys found there: a few dozen lookups, where a BK-tree would compare the
+# key with a good part of a large vocabulary.
+class SpellingIndex:
+  def __init__(self):
+    self.pieces = {}
+
+  def add(self, key):
+    for number, start, end in pieces(len(key), max_distance(len(key)) + 1):
+      self.pieces.setdefault((len(key), number, key[start:end]), []).append(key)
+
+  # [(distance, other)] of the keys within max_distance() of key, of the
+  # shorter of the two, key itself included
+  def search(self, key):
+    radius = max_distance(len(key))
+    masks = char_masks(key)
+    seen = set()
+    found = []
+    for length in range(max(0, len(key) - radius), len(key) + radius + 1):
+      for number, start, end in pieces(length, max_distance(length) + 1):
+        for shift in range(-radius, radius + 1):
+          if start + shift < 0 or end + shift > len(key):
+            continue
+          for other in self.pieces.get((length, number, key[start + shift:end + shift]), ()):
+            if other in seen:
+              continue
+            seen.add(other)
+            distance = edit_distance(masks, len(key), other)
+            if distance <= max_distance(min(len(key), length)):
+              found.append((distance, other))
+    return found
+
+def shared_prefix(a, b):
+  length = min(len(a), len(b))
+  index = 0
+  while index < length and a[index] == b[index]:
+    index += 1
+  return index
+
+# Confusable words of the vocabulary by their normalized french: a
+# SpellingIndex for close spellings and the sorted keys for shared prefixes. Holds the words
+# with an id below next_word_id, size of them.
+class ConfusableIndex:
+  def __init__(self, words=()):
+    self.spellings = SpellingIndex()
+    self.sorted_keys = []
+    self.ids = {}
+    self.size = 0
+    self.next_word_id = 0
+    self.add_many(words)
+
+  # Add (word_id, french) pairs, returns their [(word_id, key)]
+  def add_many(self, words):
+    added = []
+    new_keys = []
+    for word_id, french in words:
+      key = importer.normalize(french)
+      if key not in self.ids:
+        self.ids[key] = []
+        self.spellings.add(key)
+        new_keys.append(key)
+      self.ids[key].append(word_id)
+      self.next_word_id = max(self.next_word_id, word_id + 1)
+      added.append((word_id, key))
+    self.size += len(added)
+    # Timsort merges the two sorted runs in one pass, where an insort per
+    # key would move the whole list every time
+    new_keys.sort()
+    self.sorted_keys.extend(new_keys)
+    self.sorted_keys.sort()
+    return added
+
+  # [(shared prefix length, key)] of the MAX_PREFIX_CANDIDATES keys sharing
+  # the longest prefixes with key, of at least MIN_PREFIX characters. Those
+  # are the keys next to it in sorted order, so they are found walking away
+  # from it in both directions.
+  def prefix_neighbours(self, key):
+    keys = self.sorted_keys
+    lower = bisect.bisect_left(keys, key) - 1
+    upper = bisect.bisect_right(keys, key)
+    found = []
+    while len(found) < MAX_PREFIX_CANDIDATES:
+      below = shared_prefix(key, keys[lower]) if lower >= 0 else 0
+      above = shared_prefix(key, keys[upper]) if upper < len(keys) else 0
+      if max(below, above) < MIN_PREFIX:
+        break
+      if below >= above:
+        found.append((below, keys[lower]))
+        lower -= 1
+      else:
+        found.append((above, keys[upper]))
+        upper += 1
+    return found
+
+  # {key: similarity in 0..1} of the keys confusable with key, key excluded:
+  # 1 - distance / length for close spellings, prefix / length for at least
+  # MIN_PREFIX shared leading characters, whichever is higher. Close spellings
+  # are symmetric, so that indexing new words can also update the existing
+  # ones; shared prefixes are only symmetric among the closest candidates.
+  def neighbours(self, key):
+    scores = {}
+    for distance, other in self.spellings.search(key):
+      if other != key:
+        scores[other] = 1 - distance / max(len(key), len(other))
+    for prefix, other in self.prefix_neighbours(key):
+      scores[other] = max(scores.get(other, 0), prefix / max(len(key), len(other)))
+    return scores
+
+  # [(score, word_id)] of the words confusable with key, best first
+  def distractors(self, key):
+    return sorted(
+      ((round(score, 4), word_id)
+       for other, score in self.neighbours(key).items()
+       for word_id in self.ids[other]),
+      key=lambda row: (-row[0], row[1])
+    )
+
+# The words already indexed, those with an id below next_word_id
+def load_index(cursor, next_word_id):
+  cursor.execute('SELECT id, french FROM words WHERE id < ?', (next_word_id,))
+  index = ConfusableIndex(cursor.fetchall())
+  index.next_word_id = next_word_id
+  return index
+
+# Keep only the best DISTRACTORS_PER_WORD rows of each of word_ids
+def trim(cursor, word_ids):
+  cursor.execute('''
+    DELETE FROM word_distractors
+    WHERE (word_id, distractor_id) IN (
+      SELECT word_id, distractor_id FROM (
+        SELECT word_id, distractor_id,
+          ROW_NUMBER() OVER (PARTITION BY word_id ORDER BY score DESC, distractor_id) AS rank
+        FROM word_distractors
+        WHERE word_id IN (SELECT value FROM json_each(?))
+      )
+      WHERE rank > ?
+    )
+  ''', (json.dumps(list(word_ids)), DISTRACTORS_PER_WORD))
+
+# Rows of word_distractors for new_words, [(word_id, key)] just added to index:
+# their own best distractors, and each of them as a candidate distractor of the
+# words below next_word_id it is confusable with. Most of those offers score
+# below the DISTRACTORS_PER_WORD the word already has; they are left out here
+# rather than written and trimmed. Returns (rows, {word_id: offered rows}).
+def distractor_rows(cursor, index, new_words, next_word_id):
+  rows = []
+  offered = {}
+  for word_id, key in new_words:
+    for rank, (score, distractor_id) in enumerate(index.distractors(key)):
+      if rank < DISTRACTORS_PER_WORD:
+        rows.append((word_id, distractor_id, score))
+      # The similarity is symmetric, so the new word may also rank among
+      # the best of a word indexed before
+      if distractor_id < next_word_id:
+        offered.setdefault(distractor_id, []).append((distractor_id, word_id, score))
+
+  if offered:
+    cursor.execute('''
+      SELECT word_id, MIN(score) FROM word_distractors
+      WHERE word_id IN (SELECT value FROM json_each(?))
+      GROUP BY word_id
+      HAVING COUNT(*) >= ?
+    ''', (json.dumps(list(offered)), DISTRACTORS_PER_WORD))
+    # A tie goes to the lower distractor id, never the new word's
+    floors = dict(cursor.fetchall())
+    offered = {word_id: [row for row in word_rows if row[2] > floors.get(word_id, -1)]
+               for word_id, word_rows in offered.items()}
+    offered = {word_id: word_rows for word_id, word_rows in offered.items() if word_rows}
+  return rows, offered
+
+# Write distractor_rows() and mark the words below next_word_id as indexed
+def write_rows(cursor, rows, offered, next_word_id):
+  cursor.executemany(
+    'INSERT OR REPLACE INTO word_distractors (word_id, distractor_id, score) VALUES (?, ?, ?)',
+    rows + [row for word_rows in offered.values() for row in word_rows]
+  )
+  if offered:
+    trim(cursor, offered)
+  cursor.execute('UPDATE distractor_coverage SET next_word_id = ? WHERE id = 1', (next_word_id,))
+
+# Index up to limit of the words created since the last call. index must hold
+# exactly the words indexed so far (see index_pending()), it is loaded from
+# words when not given; the new words are added to it. Returns the number of
+# words indexed. Does not commit.
+def update(cursor, index=None, limit=None):
+  cursor.execute('SELECT next_word_id FROM distractor_coverage WHERE id = 1')
+  next_word_id = cursor.fetchone()[0]
+  if index is None:
+    index = load_index(cursor, next_word_id)
+  cursor.execute('SELECT id, french FROM words WHERE id >= ? ORDER BY id LIMIT ?', (next_word_id, limit or -1))
+  new_words = index.add_many(cursor.fetchall())
+  if not new_words:
+    return 0
+  rows, offered = distractor_rows(cursor, index, new_words, next_word_id)
+  write_rows(cursor, rows, offered, index.next_word_id)
+  return len(new_words)
+
+# Whether index holds what distractor_coverage says is indexed, i.e. no other
+# connection indexed words (or words were deleted) since it was loaded
+def index_matches(cursor, index):
+  cursor.execute('SELECT next_word_id FROM distractor_coverage WHERE id = 1')
+  next_word_id = cursor.fetchone()[0]
+  if next_word_id != index.next_word_id:
+    return False
+  cursor.execute('SELECT COUNT(*) FROM words WHERE id < ?', (next_word_id,))
+  return cursor.fetchone()[0] == index.size
+
+# Index every word created since the last call on conn, batch_size words at a
+# time, until none is left or stop is set. Each batch is computed outside of
+# any transaction and written in one of its own, so the write lock is only
+# held for the writes; only indexing writes word_distractors, so a batch is
+# still valid unless another connection indexed first, and then dropped.
+# index is the one returned by the previous call, reloaded when it no longer
+# matches the database. Returns (words indexed, index); after an exception the
+# index passed in must not be used again.
+def index_pending(conn, index=None, batch_size=INDEX_BATCH_SIZE, stop=None):
+  indexed = 0
+  cursor = conn.cursor()
+  while stop is None or not stop.is_set():
+    cursor.execute('SELECT next_word_id FROM distractor_coverage WHERE id = 1')
+    next_word_id = cursor.fetchone()[0]
+    cursor.execute('SELECT MAX(id) FROM words')
+    last_word_id = cursor.fetchone()[0]
+    if last_word_id is None or last_word_id < next_word_id:
+      break
+    if index is None or not index_matches(cursor, index):
+      index = load_index(cursor, next_word_id)
+    cursor.execute('SELECT id, french FROM words WHERE id >= ? ORDER BY id LIMIT ?', (index.next_word_id, batch_size))
+    new_words = index.add_many(cursor.fetchall())
+    rows, offered = distractor_rows(cursor, index, new_words, next_word_id)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+      cursor.execute('SELECT next_word_id FROM distractor_coverage WHERE id = 1')
+      if cursor.fetchone()[0] != next_word_id:
+        conn.rollback()
+        index = None
+        continue
+      write_rows(cursor, rows, offered, index.next_word_id)
+      conn.commit()
+    except Exception:
+      conn.rollback()
+      raise
+    indexed += len(new_words)
+  return indexed, index
+
+def reset(cursor):
+  cursor.execute('DELETE FROM word_distractors')
+  cursor.execute('UPDATE distractor_coverage SET next_word_id = 0 WHERE id = 1')
+
+# Recompute word_distractors for the whole vocabulary, returns the number of words
+def rebuild(conn):
+  conn.execute('BEGIN')
+  reset(conn.cursor())
+  conn.commit()
+  return index_pending(conn)[0]
+
+# Indexes the words of each import on a daemon thread, in transactions of its
+# own rather than in the import's, and keeps the ConfusableIndex between runs so
+# an import costs the words it adds, not the vocabulary. notify() wakes it after
+# an import; it also looks every interval seconds, for words imported by other
+# processes or `invoke import-words`. Every process holds an index of its own;
+# one that finds the words indexed by another reloads it from the database.
+class DistractorIndexer:
+  def __init__(self, database, interval=60.0, batch_size=INDEX_BATCH_SIZE, timeout=10.0, log=print):
+    self.database = database
+    self.interval = interval
+    self.batch_size = batch_size
+    self.timeout = timeout
+    self.log = log
+    self._index = None
+    self._lock = threading.Lock()
+    # Serializes run() between the background thread and manual calls
+    self._run_lock = threading.Lock()
+    self._wake = threading.Event()
+    self._stop = threading.Event()
+    self._thread = None
+
+    # Counters reported by stats()
+    self._runs = 0
+    self._indexed = 0
+    self._failures = 0
+    self._last_error = None
+    self._last_duration = 0.0
+
+  # Index whatever is pending, returns the number of words indexed
+  def run(self):
+    with self._run_lock:
+      started = time.perf_counter()
+      index, self._index = self._index, None
+      conn = sqlite3.connect(self.database, timeout=self.timeout)
+      try:
+        indexed, self._index = index_pending(conn, index, self.batch_size, stop=self._stop)
+      finally:
+        conn.close()
+      with self._lock:
+        self._runs += 1
+        self._indexed += indexed
+        self._last_duration = time.perf_counter() - started
+      return indexed
+
+  def notify(self):
+    self._wake.set()
+
+  def _run(self):
+    while not self._stop.is_set():
+      try:
+        self.run()
+      except Exception as e:
+        with self._lock:
+          self._failures += 1
+          self._last_error = str(e)
+        self.log(f'Indexing quiz distractors of {self.database} failed: {e}')
+      self._wake.wait(self.interval)
+      self._wake.clear()
+
+  def start(self):
+    if self._thread is None:
+      self._stop.clear()
+      self._thread = threading.Thread(target=self._run, name='quiz-indexer', daemon=True)
+      self._thread.start()
+
+  def close(self):
+    self._stop.set()
+    self._wake.set()
+    if self._thread is not None:
+      self._thread.join(timeout=self.timeout)
+      self._thread = None
+
+  def stats(self):
+    index = self._index
+    with self._lock:
+      return {
+        "indexed_words": index.size if index is not None else 0,
+        "runs": self._runs,
+        "words_indexed": self._indexed,
+        "failures": self._failures,
+        "last_error": self._last_error,
+        "last_duration_seconds": round(self._last_duration, 3)
+      }
+
+def parse_options(args):
+  count = args.get('n', 10, type=int)
+  choices = args.get('choices', 4, type=int)
+  direction = args.get('direction', DIRECTIONS[0])
+  if count is None or not 1 <= count <= MAX_QUESTIONS:
+    raise QuizError(f"n must be between 1 and {MAX_QUESTIONS}")
+  if choices is None or not 2 <= choices <= MAX_CHOICES:
+    raise QuizError(f"choices must be between 2 and {MAX_CHOICES}")
+  if direction not in DIRECTIONS:
+    raise QuizError(f"direction must be one of {', '.join(DIRECTIONS)}")
+  return count, choices, direction
+
+# Up to size distinct random word ids of group_id, in random order. Small
+# groups are read whole; otherwise each id is the first member at or after a
+# random id between the group's smallest and largest, one index seek each, so
+# the cost does not grow with the group. A member is picked in proportion to
+# the gap in the ids before it, which is fine for quiz questions. Should the
+# seeks keep landing on the same members (clustered ids), the rest is a run of
+# members from a random id on.
+def sample_members(cursor, group_id, size, rng=random):
+  cursor.execute('SELECT words_count FROM groups WHERE id = ?', (group_id,))
+  row = cursor.fetchone()
+  if row is None or size <= 0:
+    return []
+  if row['words_count'] <= size * SAMPLE_SCAN_FACTOR:
+    cursor.execute('SELECT word_id FROM word_groups WHERE group_id = ?', (group_id,))
+    word_ids = [member['word_id'] for member in cursor.fetchall()]
+    return rng.sample(word_ids, min(size, len(word_ids)))
+
+  cursor.execute('''
+    SELECT
+      (SELECT MIN(word_id) FROM word_groups WHERE group_id = ?) AS low,
+      (SELECT MAX(word_id) FROM word_groups WHERE group_id = ?) AS high
+  ''', (group_id, group_id))
+  bounds = cursor.fetchone()
+  if bounds['low'] is None:
+    return []
+  picked = {}
+  for _ in range(MAX_SAMPLE_ROUNDS):
+    probes = [rng.randint(bounds['low'], bounds['high']) for _ in range(2 * (size - len(picked)))]
+    cursor.execute('''
+      SELECT (
+        SELECT word_id FROM word_groups
+        WHERE group_id = ? AND word_id >= probe.value
+        ORDER BY word_id LIMIT 1
+      ) AS word_id
+      FROM json_each(?) AS probe
+    ''', (group_id, json.dumps(probes)))
+    for member in cursor.fetchall():
+      if len(picked) < size:
+        picked.setdefault(member['word_id'], None)
+    if len(picked) == size:
+      break
+  if len(picked) < size:
+    start = rng.randint(bounds['low'], bounds['high'])
+    for condition in ('word_id >= ?', 'word_id < ?'):
+      cursor.execute(f'''
+        SELECT word_id FROM word_groups
+        WHERE group_id = ? AND {condition}
+        ORDER BY word_id LIMIT ?
+      ''', (group_id, start, size))
+      for member in cursor.fetchall():
+        if len(picked) < size:
+          picked.setdefault(member['word_id'], None)
+  return list(picked)
+
+# Multiple-choice questions on up to count random words of group_id. The wrong
+# answers are the question word's confusable words from word_distractors, best
+# first, then other words of the group. Only the sampled words are read, in a
+# few queries whatever the group and quiz size.
+def build_quiz(cursor, group_id, count, choices=4, direction='fr-en', rng=random):
+  prompt_column, answer_column = ('french', 'english') if direction == 'fr-en' else ('english', 'french')
+  # The question words, then other words of the group for the wrong answers
+  sampled = sample_members(cursor, group_id, count + 4 * choices, rng)
+  cursor.execute('''
+    SELECT id, french, english FROM words
+    WHERE id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(sampled),))
+  rows = {row['id']: row for row in cursor.fetchall()}
+  members = [rows[word_id] for word_id in sampled if word_id in rows]
+  picked = members[:count]
+
+  cursor.execute('''
+    SELECT d.word_id, w.french, w.english
+    FROM word_distractors d
+    JOIN words w ON w.id = d.distractor_id
+    WHERE d.word_id IN (SELECT value FROM json_each(?))
+    ORDER BY d.word_id, d.score DESC, d.distractor_id
+  ''', (json.dumps([word['id'] for word in picked]),))
+  confusables = {}
+  for row in cursor.fetchall():
+    confusables.setdefault(row['word_id'], []).append(row[answer_column])
+
+  questions = []
+  for word in picked:
+    answer = word[answer_column]
+    seen = {importer.normalize(answer)}
+    wrong = []
+    group_answers = [member[answer_column] for member in rng.sample(members, min(len(members), 4 * choices))]
+    for candidate in [*confusables.get(word['id'], []), *group_answers]:
+      if len(wrong) == choices - 1:
+        break
+      key = importer.normalize(candidate)
+      if key not in seen:
+        seen.add(key)
+        wrong.append(candidate)
+    options = [answer] + wrong
+    rng.shuffle(options)
+    questions.append({
+      "word_id": word['id'],
+      "prompt": word[prompt_column],
+      "choices": options,
+      "answer": options.index(answer)
+    })
+  return questions
@@ -0,0 +1,97 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+from lib import partitions, sessions, sortkeys, srs, stats
+
+# Largest number of answers accepted by one bulk request
+MAX_BATCH_SIZE = 1000
+
+# How old a client supplied answered_at may be, and how far ahead of the
+# server clock. Review items are partitioned by the month of answered_at, so
+# this also bounds the partitions (and view changes) a request can create.
+MAX_ANSWER_AGE = timedelta(days=90)
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+
+class ReviewError(ValueError):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.status = status
+
+# Normalize a client supplied answered_at to the CURRENT_TIMESTAMP format (UTC)
+def parse_answered_at(value):
+  if value is None:
+    return stats.utc_timestamp()
+  try:
+    answered_at = datetime.fromisoformat(str(value))
+  except ValueError:
+    raise ReviewError(f"Invalid answered_at: {value}")
+  if answered_at.tzinfo is not None:
+    answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+  now = datetime.now(timezone.utc).replace(tzinfo=None)
+  if not now - MAX_ANSWER_AGE <= answered_at <= now + MAX_CLOCK_SKEW:
+    raise ReviewError(f"answered_at must be within the last {MAX_ANSWER_AGE.days} days: {value}")
+  return answered_at.isoformat(' ', 'seconds')
+
+# A JSON boolean, so that "false" or 0 are not taken for a correct answer
+def parse_correct(value, label):
+  if not isinstance(value, bool):
+    raise ReviewError(f"{label}: correct must be true or false")
+  return value
+
+# Validate a bulk request body into a list of (word_id, correct, answered_at)
+def parse_reviews(data):
+  if isinstance(data, dict):
+    data = data.get('reviews')
+  if not isinstance(data, list) or not data:
+    raise ReviewError("A non-empty array of reviews is required")
+  if len(data) > MAX_BATCH_SIZE:
+    raise ReviewError(f"At most {MAX_BATCH_SIZE} reviews can be logged per request", 413)
+
+  reviews = []
+  for index, item in enumerate(data):
+    if not isinstance(item, dict) or item.get('word_id') is None or item.get('correct') is None:
+      raise ReviewError(f"Review {index}: word_id and correct fields are required")
+    try:
+      word_id = int(item['word_id'])
+    except (TypeError, ValueError):
+      raise ReviewError(f"Review {index}: word_id must be an integer")
+    reviews.append((word_id, parse_correct(item['correct'], f"Review {index}"), parse_answered_at(item.get('answered_at'))))
+  return reviews
+
+# Ids from word_ids that don't exist, checked with a single query
+def missing_word_ids(cursor, word_ids):
+  cursor.execute('''
+    SELECT DISTINCT value AS id FROM json_each(?)
+    WHERE value NOT IN (SELECT id FROM words)
+  ''', (json.dumps(list(set(word_ids))),))
+  return sorted(row['id'] for row in cursor.fetchall())
+
+# Write a batch of reviews for one study session: the raw attempts, the
+# per-word aggregates in word_reviews and the sort tables, the review schedules, the session summary
+# and the dashboard rollups.
+# Does not commit; the caller owns the transaction.
+def log_reviews(cursor, session, reviews):
+  partitions.insert_reviews(cursor, [
+    (word_id, session['id'], correct, answered_at) for word_id, correct, answered_at in reviews
+  ])
+
+  per_word = {}
+  for word_id, correct, _ in reviews:
+    counts = per_word.setdefault(word_id, [0, 0])
+    counts[0 if correct else 1] += 1
+
+  # Fold the aggregates in with one upsert per word (relies on the unique index on word_id)
+  last_reviewed = stats.utc_timestamp()
+  cursor.executemany('''
+    INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (word_id) DO UPDATE SET
+      correct_count = correct_count + excluded.correct_count,
+      wrong_count = wrong_count + excluded.wrong_count,
+      last_reviewed = excluded.last_reviewed
+  ''', [(word_id, correct, wrong, last_reviewed) for word_id, (correct, wrong) in per_word.items()])
+  sortkeys.record_reviews(cursor, per_word)
+
+  srs.record_reviews(cursor, reviews)
+  sessions.record_reviews(cursor, session['id'], reviews)
+  stats.record_reviews(cursor, session['group_id'], reviews)
@@ -0,0 +1,20 @@
+import re
+
+# Columns of words_fts a search can be restricted to
+COLUMNS = ['french', 'english']
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+# Turn free text into an FTS5 query: every term must match, the last one as a prefix
+# so partially typed words match ("se rev" -> "se" AND "rev*"). Terms are quoted,
+# so FTS5 operators in user input are treated as plain text.
+def fts_query(text, column=None):
+  tokens = TOKEN.findall(text or '')
+  if not tokens:
+    return None
+  terms = [f'"{token}"' for token in tokens]
+  terms[-1] += '*'
+  query = ' '.join(terms)
+  if column in COLUMNS:
+    query = f'{column} : ({query})'
+  return query
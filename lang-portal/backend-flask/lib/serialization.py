@@ -0,0 +1,126 @@
+import json
+from operator import itemgetter
+
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+# Longest ?fields= list accepted, anything past it is ignored
+MAX_FIELDS = 64
+
+# {column: value} dicts for sqlite3.Row rows. The values of a row
+# are taken in one C-level pass (zip over the row, or one itemgetter call when
+# only some columns are wanted) instead of a row[key] lookup per field.
+# names renames the columns in the output, position by position.
+def rows_to_dicts(rows, columns, names=None):
+  names = tuple(names or columns)
+  if not rows:
+    return []
+  if tuple(rows[0].keys()) == tuple(columns):
+    return [dict(zip(names, row)) for row in rows]
+  if len(columns) == 1:
+    return [{names[0]: row[columns[0]]} for row in rows]
+  values = itemgetter(*columns)
+  return [dict(zip(names, values(row))) for row in rows]
+
+# The set of keys requested with ?fields=id,french, or None for everything
+def requested_fields():
+  if not has_request_context():
+    return None
+  value = request.args.get('fields')
+  if not value:
+    return None
+  fields = [field.strip() for field in value.split(',')[:MAX_FIELDS]]
+  return frozenset(field for field in fields if field) or None
+
+def project_record(record, fields):
+  return {key: value for key, value in record.items() if key in fields}
+
+# Keep only the requested keys of the records in a response body. A list is a
+# list of records; a dict holding lists or dicts is an envelope whose list
+# items and nested dicts are records, its pagination keys are left alone; any
+# other dict is a record. Error bodies are passed through untouched.
+def project(obj, fields):
+  if isinstance(obj, list):
+    return [project_record(item, fields) if isinstance(item, dict) else item for item in obj]
+  if not isinstance(obj, dict) or 'error' in obj:
+    return obj
+  if not any(isinstance(value, (list, dict)) for value in obj.values()):
+    return project_record(obj, fields)
+  projected = {}
+  for key, value in obj.items():
+    if isinstance(value, dict):
+      value = project_record(value, fields)
+    elif isinstance(value, list):
+      value = [project_record(item, fields) if isinstance(item, dict) else item for item in value]
+    projected[key] = value
+  return projected
+
+# One ndjson line (bytes) for a record of an export
+if orjson is not None:
+  def dumps_line(obj):
+    return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+else:
+  def dumps_line(obj):
+    return (json.dumps(obj, ensure_ascii=False) + '\n').encode('utf-8')
+
+# Flask JSON provider that serializes with orjson when it is installed and the
+# stdlib otherwise, and applies ?fields= to every jsonify() body.
+# Output matches the default provider (sorted keys, compact unless debug, dates
+# through default()) except that non-ASCII text is sent as UTF-8, not \u escapes.
+class JSONProvider(DefaultJSONProvider):
+  def __init__(self, app, backend='auto'):
+    super().__init__(app)
+    if backend not in ('auto', 'orjson', 'stdlib'):
+      raise ValueError(f'Unknown JSON backend: {backend}')
+    if backend == 'orjson' and orjson is None:
+      raise RuntimeError('JSON_BACKEND is orjson but orjson is not installed')
+    self.fast = orjson is not None and backend != 'stdlib'
+    self.ensure_ascii = not self.fast
+
+  def _orjson_options(self):
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if self.sort_keys:
+      options |= orjson.OPT_SORT_KEYS
+    return options
+
+  def _dumps_bytes(self, obj):
+    try:
+      return orjson.dumps(obj, default=self.default, option=self._orjson_options())
+    except TypeError:
+      # e.g. integers beyond 64 bits, which the stdlib encoder handles
+      return None
+
+  def dumps(self, obj, **kwargs):
+    if self.fast and not kwargs:
+      data = self._dumps_bytes(obj)
+      if data is not None:
+        return data.decode('utf-8')
+    return super().dumps(obj, **kwargs)
+
+  def loads(self, s, **kwargs):
+    if self.fast and not kwargs:
+      return orjson.loads(s)
+    return super().loads(s, **kwargs)
+
+  def response(self, *args, **kwargs):
+    obj = self._prepare_response_obj(args, kwargs)
+    fields = requested_fields()
+    if fields is not None:
+      obj = project(obj, fields)
+
+    pretty = self.compact is False or (self.compact is None and self._app.debug)
+    data = None
+    if self.fast and not pretty:
+      data = self._dumps_bytes(obj)
+    if data is None:
+      indent = 2 if pretty else None
+      separators = None if pretty else (',', ':')
+      data = f'{self.dumps(obj, indent=indent, separators=separators)}\n'
+    else:
+      data += b'\n'
+    return self._app.response_class(data, mimetype=self.mimetype)
@@ -0,0 +1,105 @@
+# Frontend sort keys of the session listings -> study_session_summary columns.
+# Every column has an index per listing scope (see 0007_study_session_summary.sql).
+SORT_COLUMNS = {
+  'startTime': 'created_at',
+  'endTime': 'end_time',
+  'activityName': 'activity_name',
+  'groupName': 'group_name',
+  'reviewItemsCount': 'review_count'
+}
+
+# Sessions without reviews are shown as lasting this long
+DEFAULT_DURATION = '+30 minutes'
+
+# Summary column to sort by. A listing filtered on one group (or activity) passes
+# that column as constant; sorting on it would be a no-op, so it falls back to
+# created_at, which has an index in every scope.
+def sort_column(sort_by, constant=None):
+  column = SORT_COLUMNS.get(sort_by, 'created_at')
+  if column == constant:
+    return 'created_at'
+  return column
+
+def sort_order(order):
+  return 'asc' if str(order).lower() == 'asc' else 'desc'
+
+# Call in the same transaction as the INSERT INTO study_sessions
+def record_session(cursor, session_id):
+  cursor.execute('''
+    INSERT INTO study_session_summary (
+      study_session_id, group_id, study_activity_id, group_name, activity_name, created_at, end_time
+    )
+    SELECT ss.id, ss.group_id, ss.study_activity_id, g.name, sa.name, ss.created_at, datetime(ss.created_at, ?)
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    WHERE ss.id = ?
+  ''', (DEFAULT_DURATION, session_id))
+
+# Call in the same transaction as the INSERT INTO word_review_items.
+# reviews is a list of (word_id, correct, created_at) for one session.
+def record_reviews(cursor, session_id, reviews):
+  if not reviews:
+    return
+
+  count = len(reviews)
+  correct = sum(1 for _, is_correct, _ in reviews if is_correct)
+  timestamps = [str(created_at) for _, _, created_at in reviews]
+  first, last = min(timestamps), max(timestamps)
+
+  # min()/max() with a NULL argument are NULL in SQLite, hence the COALESCEs
+  cursor.execute('''
+    UPDATE study_session_summary SET
+      review_count = review_count + ?,
+      correct_count = correct_count + ?,
+      first_activity_time = COALESCE(MIN(first_activity_time, ?), ?),
+      last_activity_time = COALESCE(MAX(last_activity_time, ?), ?),
+      end_time = COALESCE(MAX(last_activity_time, ?), ?)
+    WHERE study_session_id = ?
+  ''', (count, correct, first, first, last, last, last, last, session_id))
+  if cursor.rowcount == 0:
+    # Session written without a summary (e.g. by another tool), derive it from
+    # the history, which already includes this batch
+    rebuild(cursor, session_id)
+
+# Call in the same transaction as deleting all study history
+def reset(cursor):
+  cursor.execute('DELETE FROM study_session_summary')
+
+# Recompute the summaries from study_sessions and word_review_items, for every
+# session or only session_id. Returns the number of summaries written.
+def rebuild(cursor, session_id=None):
+  where = ''
+  params = [DEFAULT_DURATION]
+  if session_id is None:
+    cursor.execute('DELETE FROM study_session_summary')
+  else:
+    cursor.execute('DELETE FROM study_session_summary WHERE study_session_id = ?', (session_id,))
+    where = 'WHERE ss.id = ?'
+    params.append(session_id)
+
+  cursor.execute(f'''
+    INSERT INTO study_session_summary (
+      study_session_id, group_id, study_activity_id, group_name, activity_name, created_at,
+      review_count, correct_count, first_activity_time, last_activity_time, end_time
+    )
+    SELECT
+      ss.id,
+      ss.group_id,
+      ss.study_activity_id,
+      g.name,
+      sa.name,
+      ss.created_at,
+      COUNT(wri.id),
+      COALESCE(SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END), 0),
+      MIN(wri.created_at),
+      MAX(wri.created_at),
+      COALESCE(MAX(wri.created_at), datetime(ss.created_at, ?))
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
+    {where}
+    GROUP BY ss.id
+  ''', params)
+  return cursor.rowcount
@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from lib import migrations
+from lib.pool import ConnectionPool, PoolTimeout
+
+LEARNER_MIGRATIONS_DIR = os.path.join(
+  os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'learner_migrations'
+)
+
+# Learner ids end up in file names, so only a safe alphabet is accepted
+LEARNER_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Schema name the shared vocabulary database is attached under
+SHARED_SCHEMA = 'vocab'
+
+class InvalidLearner(ValueError):
+  pass
+
+def validate_learner_id(learner_id):
+  if not isinstance(learner_id, str) or not LEARNER_ID.match(learner_id):
+    raise InvalidLearner('Learner id must be 1-64 letters, digits, - or _')
+  return learner_id
+
+# One SQLite file per learner under directory, holding that learner's sessions,
+# reviews and rollups (sql/learner_migrations), with the shared vocabulary
+# database attached read-only. Learners never share a write lock.
+#
+# Each learner gets a small ConnectionPool; at most max_open of them are kept,
+# least recently used first out. An evicted pool closes its idle connections
+# right away and the ones in use as they are released.
+class ShardManager:
+  def __init__(self, directory, shared_database, max_open=128, pool_size=2,
+               timeout=10.0, pragmas=None, statement_cache_size=64):
+    self.directory = directory
+    self.shared_database = shared_database
+    self.max_open = max(1, max_open)
+    self.pool_size = pool_size
+    self.timeout = timeout
+    self.pragmas = pragmas
+    self.statement_cache_size = statement_cache_size
+    self._pools = OrderedDict()
+    self._lock = threading.Lock()
+    # Learner ids whose shard was migrated by this process
+    self._migrated = set()
+    self._opened = 0
+    self._evictions = 0
+    os.makedirs(directory, exist_ok=True)
+
+  def path(self, learner_id):
+    return os.path.join(self.directory, validate_learner_id(learner_id) + '.db')
+
+  def pool(self, learner_id):
+    path = self.path(learner_id)
+    evicted = []
+    with self._lock:
+      pool = self._pools.get(learner_id)
+      if pool is not None:
+        self._pools.move_to_end(learner_id)
+        return pool
+      pool = ConnectionPool(
+        path,
+        max_size=self.pool_size,
+        min_size=0,
+        timeout=self.timeout,
+        pragmas=self.pragmas,
+        statement_cache_size=self.statement_cache_size,
+        attach={SHARED_SCHEMA: self.shared_database}
+      )
+      # Create or upgrade the shard the first time this process opens it
+      if learner_id not in self._migrated:
+        conn = pool.acquire()
+        try:
+          migrations.migrate(conn, LEARNER_MIGRATIONS_DIR)
+        finally:
+          pool.release(conn)
+        self._migrated.add(learner_id)
+      self._pools[learner_id] = pool
+      self._opened += 1
+      while len(self._pools) > self.max_open:
+        evicted.append(self._pools.popitem(last=False)[1])
+        self._evictions += 1
+    for old in evicted:
+      old.close()
+    return pool
+
+  # Check out a connection to the learner's shard, returns (pool, connection)
+  def acquire(self, learner_id):
+    while True:
+      pool = self.pool(learner_id)
+      try:
+        return pool, pool.acquire()
+      except PoolTimeout:
+        # Evicted between lookup and checkout, open it again
+        if not pool.closed:
+          raise
+
+  def close(self):
+    with self._lock:
+      pools = list(self._pools.values())
+      self._pools.clear()
+    for pool in pools:
+      pool.close()
+
+  def stats(self):
+    with self._lock:
+      pools = list(self._pools.values())
+      return {
+        "directory": self.directory,
+        "shared_database": self.shared_database,
+        "open_shards": len(pools),
+        "max_open": self.max_open,
+        "shards_opened": self._opened,
+        "evictions": self._evictions,
+        "connections": sum(pool.stats()["size"] for pool in pools)
+      }
@@ -0,0 +1,170 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import quote
+
+from lib.pool import ConnectionPool, PoolTimeout
+
+# Pragmas of the snapshot connections. The file is never written once published,
+# so there is no journal to configure, only read-side caches.
+SNAPSHOT_PRAGMAS = {
+  'cache_size': -16000,
+  'mmap_size': 268435456,
+  'temp_store': 'MEMORY',
+  'query_only': 1,
+}
+
+# immutable=1 tells SQLite the file cannot change: no locks, no -wal/-shm lookups
+def immutable_uri(path):
+  return 'file:' + quote(os.path.abspath(path)) + '?mode=ro&immutable=1'
+
+# Periodic read-only copy of the database for heavy read endpoints, so long
+# analytic queries never hold a read transaction on the file the writers use.
+#
+# refresh() copies the live database with the backup API (one consistent read
+# transaction) into a temporary file, switches it out of WAL mode and renames it
+# over the snapshot path. Each published file gets a pool of its own; the
+# previous pool is closed, its checked-out connections as they are released, and
+# they keep reading the old file (already unlinked) until then.
+#
+# A snapshot older than max_staleness is not handed out (acquire() returns None)
+# and callers fall back to the live database.
+class Snapshotter:
+  def __init__(self, database, path=None, interval=30.0, max_staleness=120.0,
+               pool_size=4, timeout=10.0, statement_cache_size=256, log=print):
+    self.database = database
+    self.path = path or database + '.snapshot'
+    self.interval = interval
+    self.max_staleness = max_staleness
+    self.pool_size = pool_size
+    self.timeout = timeout
+    self.statement_cache_size = statement_cache_size
+    self.log = log
+    self._pool = None
+    self._taken_at = None
+    self._lock = threading.Lock()
+    # Serializes refresh() between the background thread and manual calls
+    self._refresh_lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread = None
+
+    # Counters reported by stats()
+    self._refreshes = 0
+    self._failures = 0
+    self._last_error = None
+    self._last_duration = 0.0
+    self._served = 0
+    self._fallbacks = 0
+
+  # Copy the live database and publish the copy, returns the copy time in seconds
+  def refresh(self):
+    with self._refresh_lock:
+      started = time.perf_counter()
+      taken_at = time.time()
+      tmp_path = self.path + '.tmp'
+      if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+      source = sqlite3.connect(self.database, timeout=self.timeout)
+      try:
+        target = sqlite3.connect(tmp_path)
+        try:
+          # pages=-1 copies everything in one step, i.e. inside one read
+          # transaction, so concurrent commits never restart the copy
+          source.backup(target, pages=-1)
+          # A snapshot in WAL mode would need -shm next to it to be read
+          target.execute('PRAGMA journal_mode = DELETE')
+        finally:
+          target.close()
+      finally:
+        source.close()
+      os.replace(tmp_path, self.path)
+
+      pool = ConnectionPool(
+        immutable_uri(self.path),
+        max_size=self.pool_size,
+        min_size=0,
+        timeout=self.timeout,
+        pragmas=SNAPSHOT_PRAGMAS,
+        statement_cache_size=self.statement_cache_size,
+        uri=True
+      )
+      with self._lock:
+        old, self._pool = self._pool, pool
+        self._taken_at = taken_at
+        self._refreshes += 1
+        self._last_duration = time.perf_counter() - started
+      if old is not None:
+        old.close()
+      return self._last_duration
+
+  # Seconds since the published snapshot was taken, None before the first one
+  def age(self):
+    with self._lock:
+      if self._taken_at is None:
+        return None
+      return time.time() - self._taken_at
+
+  # Check out a snapshot connection, returns (pool, connection, taken_at) or
+  # None when there is no snapshot within max_staleness
+  def acquire(self):
+    with self._lock:
+      pool, taken_at = self._pool, self._taken_at
+      if pool is None or time.time() - taken_at > self.max_staleness:
+        self._fallbacks += 1
+        return None
+      self._served += 1
+    try:
+      return pool, pool.acquire(), taken_at
+    except PoolTimeout:
+      # Closed by a refresh in the meantime, or every snapshot connection busy
+      with self._lock:
+        self._served -= 1
+        self._fallbacks += 1
+      return None
+
+  def _run(self):
+    while not self._stop.is_set():
+      try:
+        self.refresh()
+      except Exception as e:
+        with self._lock:
+          self._failures += 1
+          self._last_error = str(e)
+        self.log(f'Snapshot of {self.database} failed: {e}')
+      self._stop.wait(self.interval)
+
+  # Take snapshots every interval seconds on a daemon thread
+  def start(self):
+    if self._thread is None:
+      self._stop.clear()
+      self._thread = threading.Thread(target=self._run, name='db-snapshotter', daemon=True)
+      self._thread.start()
+
+  def close(self):
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join(timeout=self.timeout)
+      self._thread = None
+    with self._lock:
+      pool, self._pool = self._pool, None
+    if pool is not None:
+      pool.close()
+
+  def stats(self):
+    age = self.age()
+    with self._lock:
+      return {
+        "path": self.path,
+        "interval_seconds": self.interval,
+        "max_staleness_seconds": self.max_staleness,
+        "age_seconds": round(age, 3) if age is not None else None,
+        "refreshes": self._refreshes,
+        "failures": self._failures,
+        "last_error": self._last_error,
+        "last_refresh_ms": round(self._last_duration * 1000, 3),
+        "checkouts": self._served,
+        "fallbacks": self._fallbacks,
+        "pool": self._pool.stats() if self._pool is not None else None
+      }
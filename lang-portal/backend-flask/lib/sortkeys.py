@@ -0,0 +1,134 @@
+import json
+
+# Review columns the word listings can sort by, beside french and english
+REVIEW_SORT_COLUMNS = ('correct_count', 'wrong_count', 'accuracy', 'last_reviewed')
+
+# Values of word_sort_keys computed from the word_reviews row r (NULL for a
+# word never reviewed)
+SORT_VALUES = '''
+  COALESCE(r.correct_count, 0) AS correct_count,
+  COALESCE(r.wrong_count, 0) AS wrong_count,
+  CASE WHEN COALESCE(r.correct_count, 0) + COALESCE(r.wrong_count, 0) > 0
+    THEN CAST(r.correct_count AS REAL) / (r.correct_count + r.wrong_count)
+    ELSE 0 END AS accuracy,
+  COALESCE(r.last_reviewed, '') AS last_reviewed
+'''
+
+# The rows of word_sort_keys and group_word_sort_keys computed on the fly, for
+# readers that find the tables behind the vocabulary: GETs never write, they
+# read these and leave the catching up to lib/upkeep.py
+LIVE_WORD_SORT_KEYS = f'''(
+  SELECT w.id AS word_id, {SORT_VALUES}
+  FROM words w
+  LEFT JOIN word_reviews r ON r.word_id = w.id
+)'''
+
+LIVE_GROUP_WORD_SORT_KEYS = f'''(
+  SELECT wg.group_id, w.id AS word_id, w.french, w.english, {SORT_VALUES}
+  FROM word_groups wg
+  JOIN words w ON w.id = wg.word_id
+  LEFT JOIN word_reviews r ON r.word_id = w.id
+)'''
+
+# Whether every word has a word_sort_keys row
+def words_covered(cursor):
+  cursor.execute('''
+    SELECT COALESCE((SELECT MAX(id) FROM words), -1) < (SELECT next_word_id FROM word_sort_coverage WHERE id = 1)
+  ''')
+  return bool(cursor.fetchone()[0])
+
+# Whether the group_word_sort_keys rows of group_id were built at its current
+# membership
+def group_current(cursor, group_id):
+  cursor.execute('''
+    SELECT g.members_version IS v.members_version
+    FROM groups g
+    LEFT JOIN group_sort_versions v ON v.group_id = g.id
+    WHERE g.id = ?
+  ''', (group_id,))
+  row = cursor.fetchone()
+  return row is None or bool(row[0])
+
+# Add the words created since the last call to word_sort_keys, so sorting by a
+# review column lists every word. Returns whether anything was written.
+def ensure_words(cursor):
+  cursor.execute('SELECT next_word_id FROM word_sort_coverage WHERE id = 1')
+  next_word_id = cursor.fetchone()[0]
+  cursor.execute('SELECT MAX(id) FROM words')
+  last_word_id = cursor.fetchone()[0]
+  if last_word_id is None or last_word_id < next_word_id:
+    return False
+  cursor.execute(f'''
+    INSERT OR IGNORE INTO word_sort_keys (word_id, correct_count, wrong_count, accuracy, last_reviewed)
+    SELECT w.id, {SORT_VALUES}
+    FROM words w
+    LEFT JOIN word_reviews r ON r.word_id = w.id
+    WHERE w.id >= ?
+  ''', (next_word_id,))
+  cursor.execute('UPDATE word_sort_coverage SET next_word_id = ? WHERE id = 1', (last_word_id + 1,))
+  return True
+
+# Rebuild the rows of group_id in group_word_sort_keys if its membership changed
+# since they were built. Returns whether anything was written.
+def ensure_group(cursor, group_id):
+  cursor.execute('''
+    SELECT g.members_version, v.members_version AS built
+    FROM groups g
+    LEFT JOIN group_sort_versions v ON v.group_id = g.id
+    WHERE g.id = ?
+  ''', (group_id,))
+  row = cursor.fetchone()
+  if row is None or row['members_version'] == row['built']:
+    return False
+  cursor.execute('DELETE FROM group_word_sort_keys WHERE group_id = ?', (group_id,))
+  cursor.execute(f'''
+    INSERT OR IGNORE INTO group_word_sort_keys
+      (group_id, word_id, french, english, correct_count, wrong_count, accuracy, last_reviewed)
+    SELECT wg.group_id, w.id, w.french, w.english, {SORT_VALUES}
+    FROM word_groups wg
+    JOIN words w ON w.id = wg.word_id
+    LEFT JOIN word_reviews r ON r.word_id = w.id
+    WHERE wg.group_id = ?
+  ''', (group_id,))
+  cursor.execute(
+    'INSERT OR REPLACE INTO group_sort_versions (group_id, members_version) VALUES (?, ?)',
+    (group_id, row['members_version'])
+  )
+  return True
+
+# Copy the word_reviews aggregates of word_ids into the sort tables.
+# Call in the same transaction as the word_reviews upsert.
+def record_reviews(cursor, word_ids):
+  if not word_ids:
+    return
+  ids = json.dumps(list(word_ids))
+  cursor.execute(f'''
+    INSERT INTO word_sort_keys (word_id, correct_count, wrong_count, accuracy, last_reviewed)
+    SELECT r.word_id, {SORT_VALUES}
+    FROM word_reviews r
+    WHERE r.word_id IN (SELECT value FROM json_each(?))
+    ON CONFLICT (word_id) DO UPDATE SET
+      correct_count = excluded.correct_count,
+      wrong_count = excluded.wrong_count,
+      accuracy = excluded.accuracy,
+      last_reviewed = excluded.last_reviewed
+  ''', (ids,))
+  cursor.execute('''
+    UPDATE group_word_sort_keys SET
+      correct_count = k.correct_count,
+      wrong_count = k.wrong_count,
+      accuracy = k.accuracy,
+      last_reviewed = k.last_reviewed
+    FROM word_sort_keys k
+    WHERE k.word_id = group_word_sort_keys.word_id
+      AND group_word_sort_keys.word_id IN (SELECT value FROM json_each(?))
+  ''', (ids,))
+
+# Recompute word_sort_keys from words and word_reviews. The group rows are
+# dropped and rebuilt by ensure_group(), see lib/upkeep.py.
+def rebuild(cursor):
+  cursor.execute('DELETE FROM word_sort_keys')
+  cursor.execute('DELETE FROM group_word_sort_keys')
+  cursor.execute('DELETE FROM group_sort_versions')
+  cursor.execute('UPDATE word_sort_coverage SET next_word_id = 0 WHERE id = 1')
+  ensure_words(cursor)
@@ -0,0 +1,243 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+# SM-2 scheduling with binary answers: a correct answer is graded 4 ("correct
+# after hesitation"), a wrong one 1, on SM-2's 0-5 scale.
+CORRECT_GRADE = 4
+WRONG_GRADE = 1
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+# Intervals grow geometrically; past ~100 years due_at would leave the datetime range
+MAX_INTERVAL_DAYS = 36500
+# A forgotten word comes back in the same sitting rather than tomorrow
+RELEARN_DELAY = timedelta(minutes=10)
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Largest page of GET /groups/:id/due
+MAX_DUE_LIMIT = 100
+
+def new_state():
+  return {
+    'repetitions': 0,
+    'lapses': 0,
+    'interval_days': 0.0,
+    'ease': INITIAL_EASE,
+    'due_at': None,
+    'last_reviewed_at': None
+  }
+
+def parse_timestamp(value):
+  if isinstance(value, datetime):
+    return value.replace(tzinfo=None)
+  return datetime.fromisoformat(str(value)).replace(tzinfo=None)
+
+def format_timestamp(value):
+  return value.strftime(TIMESTAMP_FORMAT)
+
+# The state after one answer given at reviewed_at (a UTC timestamp)
+def schedule(state, correct, reviewed_at):
+  grade = CORRECT_GRADE if correct else WRONG_GRADE
+  reviewed_at = parse_timestamp(reviewed_at)
+  ease = max(MIN_EASE, state['ease'] + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+
+  if correct:
+    repetitions = state['repetitions'] + 1
+    if repetitions == 1:
+      interval_days = FIRST_INTERVAL_DAYS
+    elif repetitions == 2:
+      interval_days = SECOND_INTERVAL_DAYS
+    else:
+      interval_days = min(MAX_INTERVAL_DAYS, round(state['interval_days'] * ease, 2))
+    due_at = reviewed_at + timedelta(days=interval_days)
+    lapses = state['lapses']
+  else:
+    repetitions = 0
+    interval_days = 0.0
+    due_at = reviewed_at + RELEARN_DELAY
+    lapses = state['lapses'] + (1 if state['repetitions'] > 0 else 0)
+
+  return {
+    'repetitions': repetitions,
+    'lapses': lapses,
+    'interval_days': interval_days,
+    'ease': round(ease, 4),
+    'due_at': format_timestamp(due_at),
+    'last_reviewed_at': format_timestamp(reviewed_at)
+  }
+
+# Upsert schedules and copy their due_at to every group the words are in
+def write_states(cursor, states):
+  if not states:
+    return
+  cursor.executemany('''
+    INSERT INTO word_schedule (word_id, repetitions, lapses, interval_days, ease, due_at, last_reviewed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (word_id) DO UPDATE SET
+      repetitions = excluded.repetitions,
+      lapses = excluded.lapses,
+      interval_days = excluded.interval_days,
+      ease = excluded.ease,
+      due_at = excluded.due_at,
+      last_reviewed_at = excluded.last_reviewed_at
+  ''', [(
+    word_id, state['repetitions'], state['lapses'], state['interval_days'],
+    state['ease'], state['due_at'], state['last_reviewed_at']
+  ) for word_id, state in states.items()])
+  cursor.execute('''
+    INSERT OR REPLACE INTO group_word_schedule (group_id, word_id, due_at)
+    SELECT wg.group_id, s.word_id, s.due_at
+    FROM word_schedule s
+    JOIN word_groups wg ON wg.word_id = s.word_id
+    WHERE s.word_id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(list(states)),))
+
+# Call in the same transaction as the INSERT INTO word_review_items.
+# reviews is a list of (word_id, correct, created_at); answers to the same
+# word are applied in created_at order.
+def record_reviews(cursor, reviews):
+  if not reviews:
+    return
+
+  word_ids = list({word_id for word_id, _, _ in reviews})
+  cursor.execute('''
+    SELECT word_id, repetitions, lapses, interval_days, ease, due_at, last_reviewed_at
+    FROM word_schedule
+    WHERE word_id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(word_ids),))
+  states = {row['word_id']: {
+    'repetitions': row['repetitions'],
+    'lapses': row['lapses'],
+    'interval_days': row['interval_days'],
+    'ease': row['ease'],
+    'due_at': row['due_at'],
+    'last_reviewed_at': row['last_reviewed_at']
+  } for row in cursor.fetchall()}
+
+  for word_id, correct, created_at in sorted(reviews, key=lambda review: str(review[2])):
+    states[word_id] = schedule(states.get(word_id) or new_state(), correct, created_at)
+  write_states(cursor, states)
+
+# Call in the same transaction as deleting all study history
+def reset(cursor):
+  cursor.execute('DELETE FROM word_schedule')
+  cursor.execute('DELETE FROM group_word_schedule')
+  cursor.execute('DELETE FROM group_new_words')
+
+# Replay the whole review history into word_schedule.
+# Returns the number of words with a schedule.
+def rebuild(cursor, batch_size=10000):
+  reset(cursor)
+  history = cursor.connection.execute('''
+    SELECT word_id, correct, created_at
+    FROM word_review_items
+    ORDER BY word_id, created_at, id
+  ''')
+
+  written = 0
+  states = {}
+  word_id = None
+  state = None
+  for row in history:
+    if row[0] != word_id:
+      if word_id is not None:
+        states[word_id] = state
+        if len(states) >= batch_size:
+          write_states(cursor, states)
+          written += len(states)
+          states = {}
+      word_id = row[0]
+      state = new_state()
+    state = schedule(state, row[1], row[2])
+  if word_id is not None:
+    states[word_id] = state
+  write_states(cursor, states)
+  return written + len(states)
+
+# Bring group_word_schedule and the watermark of group_id in line with its
+# members when groups.members_version changed since the last time: scheduled
+# members get their due_at copied, removed ones lose their rows and the new
+# word scan starts over. word_groups may live in the attached shared database
+# (learner shards), where no trigger of ours can see it change. Returns
+# whether anything was written.
+def sync_group(cursor, group_id):
+  cursor.execute('''
+    SELECT g.members_version, n.members_version AS synced
+    FROM groups g
+    LEFT JOIN group_new_words n ON n.group_id = g.id
+    WHERE g.id = ?
+  ''', (group_id,))
+  row = cursor.fetchone()
+  if row is None or row['members_version'] == row['synced']:
+    return False
+  cursor.execute('''
+    DELETE FROM group_word_schedule
+    WHERE group_id = ? AND word_id NOT IN (SELECT word_id FROM word_groups WHERE group_id = ?)
+  ''', (group_id, group_id))
+  cursor.execute('''
+    INSERT OR REPLACE INTO group_word_schedule (group_id, word_id, due_at)
+    SELECT wg.group_id, s.word_id, s.due_at
+    FROM word_groups wg
+    JOIN word_schedule s ON s.word_id = wg.word_id
+    WHERE wg.group_id = ?
+  ''', (group_id,))
+  cursor.execute('''
+    INSERT OR REPLACE INTO group_new_words (group_id, next_word_id, members_version) VALUES (?, 0, ?)
+  ''', (group_id, row['members_version']))
+  return True
+
+# Next words to study in a group: words whose due_at has passed, most overdue
+# first, then (if include_new) words never reviewed, in id order. Due words are a
+# range scan of idx_group_word_schedule_due; new words are scanned from the
+# group's watermark, so neither depends on the group size (except once after a
+# membership change, see sync_group). May write; the caller commits.
+def due_words(cursor, group_id, limit, now=None, include_new=True):
+  now = format_timestamp(parse_timestamp(now or datetime.now(timezone.utc)))
+  sync_group(cursor, group_id)
+  cursor.execute('''
+    SELECT w.id, w.french, w.english, s.due_at, s.interval_days, s.ease, s.repetitions, s.lapses, s.last_reviewed_at
+    FROM group_word_schedule gws
+    JOIN words w ON w.id = gws.word_id
+    JOIN word_schedule s ON s.word_id = gws.word_id
+    WHERE gws.group_id = ? AND gws.due_at <= ?
+    ORDER BY gws.due_at, gws.word_id
+    LIMIT ?
+  ''', (group_id, now, limit))
+  words = cursor.fetchall()
+
+  if include_new and len(words) < limit:
+    words += new_words(cursor, group_id, limit - len(words))
+  return words
+
+# Words of the group without a schedule, lowest id first
+def new_words(cursor, group_id, limit):
+  cursor.execute('SELECT next_word_id FROM group_new_words WHERE group_id = ?', (group_id,))
+  row = cursor.fetchone()
+  start = row['next_word_id'] if row else 0
+
+  cursor.execute('''
+    SELECT w.id, w.french, w.english, NULL AS due_at, 0 AS interval_days, ? AS ease,
+      0 AS repetitions, 0 AS lapses, NULL AS last_reviewed_at
+    FROM word_groups wg
+    JOIN words w ON w.id = wg.word_id
+    WHERE wg.group_id = ? AND wg.word_id >= ?
+      AND NOT EXISTS (SELECT 1 FROM word_schedule s WHERE s.word_id = wg.word_id)
+    ORDER BY wg.word_id
+    LIMIT ?
+  ''', (INITIAL_EASE, group_id, start, limit))
+  words = cursor.fetchall()
+
+  # Everything skipped on the way was scheduled, move the watermark past it
+  if words:
+    watermark = words[0]['id']
+  else:
+    cursor.execute('SELECT COALESCE(MAX(word_id), -1) + 1 FROM word_groups WHERE group_id = ?', (group_id,))
+    watermark = cursor.fetchone()[0]
+  if watermark > start:
+    cursor.execute('''
+      INSERT INTO group_new_words (group_id, next_word_id) VALUES (?, ?)
+      ON CONFLICT (group_id) DO UPDATE SET next_word_id = MAX(next_word_id, excluded.next_word_id)
+    ''', (group_id, watermark))
+  return words
@@ -0,0 +1,365 @@
+import json
+from datetime import date, datetime, timedelta, timezone
+
+# A word is mastered after at least 5 attempts with a success rate of 80% or more
+MASTERY_MIN_ATTEMPTS = 5
+MASTERY_MIN_SUCCESS_RATE = 0.8
+
+TOTAL_COLUMNS = [
+  'total_vocabulary',
+  'total_words_studied',
+  'mastered_words',
+  'total_attempts',
+  'total_correct',
+  'total_sessions'
+]
+
+def is_mastered(attempts, correct):
+  return attempts >= MASTERY_MIN_ATTEMPTS and correct >= MASTERY_MIN_SUCCESS_RATE * attempts
+
+# Timestamp in the same format (and UTC) as SQLite's CURRENT_TIMESTAMP
+def utc_timestamp():
+  return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+# Every daily_* row and the streak count UTC days, the days of SQLite's date()
+# that rebuild() groups by, since all timestamps are stored in UTC
+def utc_today():
+  return datetime.now(timezone.utc).date()
+
+def activity_date(timestamp):
+  if isinstance(timestamp, datetime):
+    if timestamp.tzinfo is not None:
+      timestamp = timestamp.astimezone(timezone.utc)
+    return timestamp.date().isoformat()
+  return str(timestamp)[:10]
+
+# Call in the same transaction as the INSERT INTO study_sessions
+def record_session(cursor, group_id, created_at):
+  day = activity_date(created_at)
+  cursor.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, sessions) VALUES (?, ?, 1)
+    ON CONFLICT (activity_date, group_id) DO UPDATE SET sessions = sessions + 1
+  ''', (day, group_id))
+  cursor.execute('''
+    INSERT INTO daily_totals (activity_date, sessions) VALUES (?, 1)
+    ON CONFLICT (activity_date) DO UPDATE SET sessions = sessions + 1
+  ''', (day,))
+  cursor.execute('UPDATE stats_totals SET total_sessions = total_sessions + 1 WHERE id = 1')
+  record_study_day(cursor, day)
+
+# Extend the streak when a session lands on a new day. Only the first session
+# of a day writes; a session dated before the last study day (backfilled
+# history) recomputes the streaks from daily_totals instead.
+def record_study_day(cursor, day):
+  cursor.execute('SELECT current_streak, longest_streak, last_study_date FROM study_streak WHERE id = 1')
+  streak = cursor.fetchone()
+  last = streak['last_study_date'] if streak else None
+  if last == day:
+    return
+  if streak is None or (last is not None and day < last):
+    rebuild_streak(cursor)
+    return
+
+  current = 1
+  start = day
+  if last is not None and date.fromisoformat(day) - date.fromisoformat(last) == timedelta(days=1):
+    current = streak['current_streak'] + 1
+    start = None
+  cursor.execute('''
+    UPDATE study_streak SET
+      current_streak = ?,
+      longest_streak = MAX(longest_streak, ?),
+      streak_start = COALESCE(?, streak_start),
+      last_study_date = ?
+    WHERE id = 1
+  ''', (current, current, start, day))
+
+# Call in the same transaction as the INSERT INTO word_review_items.
+# reviews is a list of (word_id, correct, created_at) for sessions of group_id.
+def record_reviews(cursor, group_id, reviews):
+  if not reviews:
+    return
+
+  per_word = {}
+  per_day = {}
+  for word_id, correct, created_at in reviews:
+    correct = 1 if correct else 0
+    attempts_correct = per_word.setdefault(word_id, [0, 0])
+    attempts_correct[0] += 1
+    attempts_correct[1] += correct
+    day = per_day.setdefault(activity_date(created_at), [0, 0])
+    day[0] += 1
+    day[1] += correct
+
+  # Current counters for every touched word in one query
+  cursor.execute('''
+    SELECT word_id, attempts, correct FROM word_stats
+    WHERE word_id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(list(per_word)),))
+  existing = {row['word_id']: (row['attempts'], row['correct']) for row in cursor.fetchall()}
+
+  newly_studied = 0
+  mastered_delta = 0
+  # [word_id, reviewed delta, mastered delta] for words whose status changed
+  changed = []
+  for word_id, (attempts, correct) in per_word.items():
+    old_attempts, old_correct = existing.get(word_id, (0, 0))
+    reviewed = 1 if old_attempts == 0 else 0
+    mastered = is_mastered(old_attempts + attempts, old_correct + correct) - is_mastered(old_attempts, old_correct)
+    newly_studied += reviewed
+    mastered_delta += mastered
+    if reviewed or mastered:
+      changed.append([word_id, reviewed, mastered])
+
+  cursor.executemany('''
+    INSERT INTO word_stats (word_id, attempts, correct) VALUES (?, ?, ?)
+    ON CONFLICT (word_id) DO UPDATE SET
+      attempts = attempts + excluded.attempts,
+      correct = correct + excluded.correct
+  ''', [(word_id, attempts, correct) for word_id, (attempts, correct) in per_word.items()])
+
+  cursor.executemany('''
+    INSERT INTO daily_activity (activity_date, group_id, reviews, correct) VALUES (?, ?, ?, ?)
+    ON CONFLICT (activity_date, group_id) DO UPDATE SET
+      reviews = reviews + excluded.reviews,
+      correct = correct + excluded.correct
+  ''', [(day, group_id, count, correct) for day, (count, correct) in per_day.items()])
+  cursor.executemany('''
+    INSERT INTO daily_totals (activity_date, reviews, correct) VALUES (?, ?, ?)
+    ON CONFLICT (activity_date) DO UPDATE SET
+      reviews = reviews + excluded.reviews,
+      correct = correct + excluded.correct
+  ''', [(day, count, correct) for day, (count, correct) in per_day.items()])
+
+  record_group_progress(cursor, changed)
+
+  total_attempts = sum(attempts for attempts, _ in per_word.values())
+  total_correct = sum(correct for _, correct in per_word.values())
+  cursor.execute('''
+    UPDATE stats_totals SET
+      total_words_studied = total_words_studied + ?,
+      mastered_words = mastered_words + ?,
+      total_attempts = total_attempts + ?,
+      total_correct = total_correct + ?
+    WHERE id = 1
+  ''', (newly_studied, mastered_delta, total_attempts, total_correct))
+
+# Fold per-word status changes into group_progress of every group the words
+# are in, one statement for the batch. Rows that don't exist yet are computed
+# whole by refresh_group_progress(), see lib/upkeep.py.
+def record_group_progress(cursor, changed):
+  if not changed:
+    return
+  cursor.execute('''
+    UPDATE group_progress SET
+      reviewed_count = reviewed_count + delta.reviewed,
+      mastered_count = mastered_count + delta.mastered
+    FROM (
+      SELECT wg.group_id, SUM(c.value ->> 1) AS reviewed, SUM(c.value ->> 2) AS mastered
+      FROM json_each(?) c
+      JOIN word_groups wg ON wg.word_id = c.value ->> 0
+      GROUP BY wg.group_id
+    ) AS delta
+    WHERE group_progress.group_id = delta.group_id
+  ''', (json.dumps(changed),))
+
+# reviewed_count and mastered_count of groups g LEFT JOIN group_progress p,
+# counted from word_stats for a group whose row is missing or older than its
+# membership, so readers never have to refresh_group_progress() first
+GROUP_PROGRESS_COLUMNS = f'''
+  CASE WHEN p.members_version = g.members_version THEN p.reviewed_count ELSE (
+    SELECT COUNT(ws.word_id)
+    FROM word_groups wg
+    JOIN word_stats ws ON ws.word_id = wg.word_id
+    WHERE wg.group_id = g.id
+  ) END AS reviewed_count,
+  CASE WHEN p.members_version = g.members_version THEN p.mastered_count ELSE (
+    SELECT COALESCE(SUM(ws.attempts >= {MASTERY_MIN_ATTEMPTS} AND ws.correct >= {MASTERY_MIN_SUCCESS_RATE} * ws.attempts), 0)
+    FROM word_groups wg
+    JOIN word_stats ws ON ws.word_id = wg.word_id
+    WHERE wg.group_id = g.id
+  ) END AS mastered_count
+'''
+
+# Whether the group_progress rows of the groups (all, or group_ids) are current
+def group_progress_current(cursor, group_ids=None):
+  where = ''
+  params = []
+  if group_ids is not None:
+    where = 'AND g.id IN (SELECT value FROM json_each(?))'
+    params.append(json.dumps(list(group_ids)))
+  cursor.execute(f'''
+    SELECT NOT EXISTS (
+      SELECT 1 FROM groups g
+      LEFT JOIN group_progress p ON p.group_id = g.id
+      WHERE p.members_version IS NOT g.members_version {where}
+    )
+  ''', params)
+  return bool(cursor.fetchone()[0])
+
+# Recompute group_progress for the groups (all, or group_ids) whose membership
+# changed since their row was computed, or that have no row yet. Checking is a
+# scan of groups; each stale group costs one pass over its words.
+# Returns the number of groups recomputed; the caller commits.
+def refresh_group_progress(cursor, group_ids=None):
+  where = ''
+  params = [MASTERY_MIN_ATTEMPTS, MASTERY_MIN_SUCCESS_RATE]
+  if group_ids is not None:
+    where = 'AND g.id IN (SELECT value FROM json_each(?))'
+    params.append(json.dumps(list(group_ids)))
+  cursor.execute(f'''
+    INSERT OR REPLACE INTO group_progress (group_id, members_version, reviewed_count, mastered_count)
+    SELECT g.id, g.members_version, COUNT(ws.word_id),
+      COALESCE(SUM(ws.attempts >= ? AND ws.correct >= ? * ws.attempts), 0)
+    FROM groups g
+    LEFT JOIN group_progress p ON p.group_id = g.id
+    LEFT JOIN word_groups wg ON wg.group_id = g.id
+    LEFT JOIN word_stats ws ON ws.word_id = wg.word_id
+    WHERE (p.members_version IS NULL OR p.members_version != g.members_version) {where}
+    GROUP BY g.id
+  ''', params)
+  return cursor.rowcount
+
+# Call in the same transaction as deleting all study history
+def reset(cursor):
+  cursor.execute('DELETE FROM word_stats')
+  cursor.execute('DELETE FROM daily_activity')
+  cursor.execute('DELETE FROM daily_totals')
+  cursor.execute('UPDATE group_progress SET reviewed_count = 0, mastered_count = 0')
+  cursor.execute('''
+    UPDATE study_streak SET current_streak = 0, longest_streak = 0, streak_start = NULL, last_study_date = NULL
+    WHERE id = 1
+  ''')
+  cursor.execute('''
+    UPDATE stats_totals SET
+      total_words_studied = 0,
+      mastered_words = 0,
+      total_attempts = 0,
+      total_correct = 0,
+      total_sessions = 0
+    WHERE id = 1
+  ''')
+
+# {current_streak, longest_streak, streak_start, last_study_date}; the current
+# streak is 0 once a whole (UTC) day has passed without a session
+def read_streak(cursor, today=None):
+  cursor.execute('SELECT current_streak, longest_streak, streak_start, last_study_date FROM study_streak WHERE id = 1')
+  row = cursor.fetchone()
+  if not row or row['last_study_date'] is None:
+    return {"current_streak": 0, "longest_streak": 0, "streak_start": None, "last_study_date": None}
+  today = today or utc_today()
+  current = row['current_streak']
+  if date.fromisoformat(row['last_study_date']) < today - timedelta(days=1):
+    current = 0
+  return {
+    "current_streak": current,
+    "longest_streak": row['longest_streak'],
+    "streak_start": row['streak_start'] if current else None,
+    "last_study_date": row['last_study_date']
+  }
+
+# [(activity_date, sessions, reviews, correct)] for the days with activity in
+# [start, end], a range scan of the daily_totals primary key
+def read_days(cursor, start, end):
+  cursor.execute('''
+    SELECT activity_date, sessions, reviews, correct
+    FROM daily_totals
+    WHERE activity_date BETWEEN ? AND ?
+    ORDER BY activity_date
+  ''', (start, end))
+  return cursor.fetchall()
+
+# Recompute study_streak from the days in daily_totals with a session
+def rebuild_streak(cursor):
+  cursor.execute('SELECT activity_date FROM daily_totals WHERE sessions > 0 ORDER BY activity_date')
+  current = longest = 0
+  start = previous = None
+  for row in cursor.fetchall():
+    day = date.fromisoformat(row['activity_date'])
+    if previous is not None and day - previous == timedelta(days=1):
+      current += 1
+    else:
+      current = 1
+      start = day
+    longest = max(longest, current)
+    previous = day
+  cursor.execute('''
+    INSERT OR REPLACE INTO study_streak (id, current_streak, longest_streak, streak_start, last_study_date)
+    VALUES (1, ?, ?, ?, ?)
+  ''', (current, longest, start.isoformat() if start else None, previous.isoformat() if previous else None))
+
+# shared_schema is where the vocabulary lives: total_vocabulary is kept by the
+# triggers on words, which only run in the shared database (see lib/shards.py)
+def read_totals(cursor, shared_schema='main'):
+  cursor.execute(f'''
+    SELECT {", ".join(column for column in TOTAL_COLUMNS if column != 'total_vocabulary')},
+      (SELECT total_vocabulary FROM {shared_schema}.stats_totals WHERE id = 1) AS total_vocabulary
+    FROM stats_totals WHERE id = 1
+  ''')
+  row = cursor.fetchone()
+  if not row:
+    return {column: 0 for column in TOTAL_COLUMNS}
+  return {column: row[column] or 0 for column in TOTAL_COLUMNS}
+
+# Recompute every rollup from the raw history tables.
+# Returns {column: (before, after)} for each total that had drifted.
+def rebuild(cursor):
+  before = read_totals(cursor)
+
+  cursor.execute('DELETE FROM word_stats')
+  cursor.execute('''
+    INSERT INTO word_stats (word_id, attempts, correct)
+    SELECT wri.word_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    GROUP BY wri.word_id
+  ''')
+
+  cursor.execute('DELETE FROM daily_activity')
+  cursor.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, sessions)
+    SELECT date(created_at), group_id, COUNT(*)
+    FROM study_sessions
+    GROUP BY date(created_at), group_id
+  ''')
+  cursor.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, reviews, correct)
+    SELECT date(wri.created_at), ss.group_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    WHERE true
+    GROUP BY date(wri.created_at), ss.group_id
+    ON CONFLICT (activity_date, group_id) DO UPDATE SET
+      reviews = excluded.reviews,
+      correct = excluded.correct
+  ''')
+
+  cursor.execute('DELETE FROM daily_totals')
+  cursor.execute('''
+    INSERT INTO daily_totals (activity_date, sessions, reviews, correct)
+    SELECT activity_date, SUM(sessions), SUM(reviews), SUM(correct)
+    FROM daily_activity
+    GROUP BY activity_date
+  ''')
+  rebuild_streak(cursor)
+
+  cursor.execute('DELETE FROM group_progress')
+  refresh_group_progress(cursor)
+
+  cursor.execute('''
+    INSERT OR REPLACE INTO stats_totals (
+      id, total_vocabulary, total_words_studied, mastered_words,
+      total_attempts, total_correct, total_sessions
+    )
+    SELECT
+      1,
+      (SELECT COUNT(*) FROM words),
+      (SELECT COUNT(*) FROM word_stats),
+      (SELECT COUNT(*) FROM word_stats WHERE attempts >= ? AND correct >= ? * attempts),
+      (SELECT COALESCE(SUM(attempts), 0) FROM word_stats),
+      (SELECT COALESCE(SUM(correct), 0) FROM word_stats),
+      (SELECT COUNT(*) FROM study_sessions)
+  ''', (MASTERY_MIN_ATTEMPTS, MASTERY_MIN_SUCCESS_RATE))
+
+  after = read_totals(cursor)
+  return {column: (before[column], after[column]) for column in TOTAL_COLUMNS if before[column] != after[column]}
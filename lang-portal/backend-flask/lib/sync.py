@@ -0,0 +1,209 @@
+import base64
+import json
+import re
+
+from lib import reviews, stats
+
+# Largest page of GET /sync
+MAX_CHANGES = 2000
+
+# Largest batch of POST /sync
+MAX_REVIEWS = reviews.MAX_BATCH_SIZE
+
+# Days a POST /sync client id is remembered; a batch retried later is logged again
+RECEIPT_DAYS = 30
+
+CLIENT_ID = re.compile(r'^[A-Za-z0-9_.:-]{1,64}$')
+
+class SyncError(ValueError):
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.status = status
+
+# The change logs to read, as (schema, token key): the shared database's, and
+# on a learner shard also the shard's, which only holds review aggregates
+def change_logs(shared_schema):
+  if shared_schema == 'main':
+    return [('main', 'v')]
+  return [(shared_schema, 'v'), ('main', 'l')]
+
+# Tokens are opaque to clients: base64 of {token key: [epoch, seq]} per change log
+def encode_token(positions):
+  payload = json.dumps(positions, separators=(',', ':'))
+  return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_token(token):
+  if not token:
+    return {}
+  try:
+    padded = token + '=' * (-len(token) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    return {key: (str(epoch), int(seq)) for key, (epoch, seq) in payload.items()}
+  except Exception:
+    raise SyncError('Invalid sync token')
+
+def rows_by_id(cursor, sql, ids):
+  if not ids:
+    return []
+  cursor.execute(sql, (json.dumps(sorted(ids)),))
+  return [dict(row) for row in cursor.fetchall()]
+
+# Everything changed since token: at most limit entries of each change log,
+# resolved to the current words, groups, group members and review aggregates,
+# plus the ones deleted. A token from another database (or none) starts from
+# the beginning of the log, which lists everything.
+def read_changes(cursor, shared_schema, token, limit):
+  since = decode_token(token)
+  positions = {}
+  entries = []
+  has_more = False
+  reset = False
+  for schema, key in change_logs(shared_schema):
+    cursor.execute(f'SELECT epoch FROM {schema}.sync_state WHERE id = 1')
+    epoch = cursor.fetchone()[0]
+    seq = 0
+    if key in since:
+      if since[key][0] == epoch:
+        seq = since[key][1]
+      else:
+        reset = True
+    cursor.execute(f'''
+      SELECT entity, entity_id, word_id, seq, deleted
+      FROM {schema}.change_log
+      WHERE seq > ?
+      ORDER BY seq
+      LIMIT ?
+    ''', (seq, limit + 1))
+    rows = cursor.fetchall()
+    if len(rows) > limit:
+      rows = rows[:limit]
+      has_more = True
+    if rows:
+      seq = rows[-1]['seq']
+    positions[key] = [epoch, seq]
+    entries.extend(rows)
+
+  changed = {'word': set(), 'group': set(), 'member': set(), 'review': set()}
+  deleted = {'word': set(), 'group': set(), 'member': set(), 'review': set()}
+  for entry in entries:
+    value = (entry['entity_id'], entry['word_id']) if entry['entity'] == 'member' else entry['entity_id']
+    (deleted if entry['deleted'] else changed)[entry['entity']].add(value)
+  # A membership change also changes the group's words_count
+  group_ids = changed['group'] | {group_id for group_id, _ in changed['member'] | deleted['member']}
+  group_ids -= deleted['group']
+
+  words = rows_by_id(cursor, f'''
+    SELECT id, french, english FROM {shared_schema}.words
+    WHERE id IN (SELECT value FROM json_each(?))
+    ORDER BY id
+  ''', changed['word'])
+  groups = rows_by_id(cursor, f'''
+    SELECT id, name, words_count FROM {shared_schema}.groups
+    WHERE id IN (SELECT value FROM json_each(?))
+    ORDER BY id
+  ''', group_ids)
+  review_rows = rows_by_id(cursor, '''
+    SELECT word_id, correct_count, wrong_count, last_reviewed FROM main.word_reviews
+    WHERE word_id IN (SELECT value FROM json_each(?))
+    ORDER BY word_id
+  ''', changed['review'])
+
+  return {
+    "token": encode_token(positions),
+    "has_more": has_more,
+    "reset": reset,
+    "words": words,
+    "groups": groups,
+    "members": [{"group_id": group_id, "word_id": word_id} for group_id, word_id in sorted(changed['member'])],
+    "reviews": review_rows,
+    "deleted": {
+      "words": sorted(deleted['word']),
+      "groups": sorted(deleted['group']),
+      "members": [{"group_id": group_id, "word_id": word_id} for group_id, word_id in sorted(deleted['member'])],
+      "reviews": sorted(deleted['review'])
+    }
+  }
+
+# Validate a POST /sync body, {"reviews": [{"id": "<client id>", "session_id":
+# 1, "word_id": 2, "correct": true, "answered_at": "..."}]} (or a bare array),
+# into a list of (client_id, session_id, word_id, correct, answered_at) with
+# the first of any repeated client id
+def parse_reviews(data):
+  if isinstance(data, dict):
+    data = data.get('reviews')
+  if not isinstance(data, list) or not data:
+    raise SyncError("A non-empty array of reviews is required")
+  if len(data) > MAX_REVIEWS:
+    raise SyncError(f"At most {MAX_REVIEWS} reviews can be synced per request", 413)
+
+  items = {}
+  for index, item in enumerate(data):
+    if not isinstance(item, dict):
+      raise SyncError(f"Review {index}: an object is required")
+    client_id = item.get('id')
+    if not isinstance(client_id, str) or not CLIENT_ID.match(client_id):
+      raise SyncError(f"Review {index}: id must be a client generated id of 1-64 letters, digits or -_.:")
+    if item.get('session_id') is None or item.get('word_id') is None or item.get('correct') is None:
+      raise SyncError(f"Review {client_id}: session_id, word_id and correct fields are required")
+    try:
+      session_id, word_id = int(item['session_id']), int(item['word_id'])
+    except (TypeError, ValueError):
+      raise SyncError(f"Review {client_id}: session_id and word_id must be integers")
+    if not isinstance(item['correct'], bool):
+      raise SyncError(f"Review {client_id}: correct must be true or false")
+    try:
+      answered_at = reviews.parse_answered_at(item.get('answered_at'))
+    except reviews.ReviewError as e:
+      raise SyncError(f"Review {client_id}: {e}")
+    items.setdefault(client_id, (client_id, session_id, word_id, item['correct'], answered_at))
+  return list(items.values())
+
+# Log the reviews not received before, one reviews.log_reviews() per session,
+# and remember their client ids in the same transaction. Reviews of unknown
+# sessions or words are rejected and not remembered. Returns (result,
+# {session row: [(word_id, correct, answered_at)]} of what was logged).
+# Does not commit.
+def log_reviews(cursor, items):
+  cursor.execute(
+    f"DELETE FROM sync_receipts WHERE received_at < datetime('now', '-{RECEIPT_DAYS} days')"
+  )
+  cursor.execute('''
+    SELECT client_id FROM sync_receipts
+    WHERE client_id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps([item[0] for item in items]),))
+  received = {row['client_id'] for row in cursor.fetchall()}
+  fresh = [item for item in items if item[0] not in received]
+
+  cursor.execute('''
+    SELECT id, group_id FROM study_sessions
+    WHERE id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(list({item[1] for item in fresh})),))
+  sessions = {row['id']: row for row in cursor.fetchall()}
+  missing_words = set(reviews.missing_word_ids(cursor, [item[2] for item in fresh]))
+
+  accepted = []
+  rejected = []
+  per_session = {}
+  for client_id, session_id, word_id, correct, answered_at in fresh:
+    if session_id not in sessions:
+      rejected.append({"id": client_id, "error": "Study session not found"})
+    elif word_id in missing_words:
+      rejected.append({"id": client_id, "error": "Word not found"})
+    else:
+      accepted.append(client_id)
+      per_session.setdefault(session_id, []).append((word_id, correct, answered_at))
+
+  logged = {}
+  for session_id, session_items in per_session.items():
+    reviews.log_reviews(cursor, sessions[session_id], session_items)
+    logged[sessions[session_id]] = session_items
+  received_at = stats.utc_timestamp()
+  cursor.executemany(
+    'INSERT INTO sync_receipts (client_id, received_at) VALUES (?, ?)',
+    [(client_id, received_at) for client_id in accepted]
+  )
+  return {
+    "accepted": accepted,
+    "duplicates": [item[0] for item in items if item[0] in received],
+    "rejected": rejected
+  }, logged
@@ -0,0 +1,106 @@
+import threading
+import time
+
+from lib import sortkeys, stats
+
+# Background upkeep of the caches each database derives from the shared
+# vocabulary: word_sort_keys rows of new words, and group_word_sort_keys and
+# group_progress of groups whose membership changed.
+#
+# The write paths of the shared database (imports, group membership changes)
+# keep its own caches current in their transaction, but a learner's shard
+# can't be reached from there. Readers that find a cache behind serve it
+# computed on the fly (sortkeys.LIVE_*, stats.GROUP_PROGRESS_COLUMNS) and
+# call notify(); this thread then brings that database up to date, so GET
+# handlers never write (nor take the write lock, nor clear the response cache).
+class CacheUpkeep:
+  def __init__(self, db, log=print):
+    self.db = db
+    self.log = log
+    self._lock = threading.Lock()
+    # learner id (None for the shared database) -> group ids to rebuild the sort keys of
+    self._pending = {}
+    self._wake = threading.Event()
+    self._stop = threading.Event()
+    self._thread = None
+
+    # Counters reported by stats()
+    self._runs = 0
+    self._refreshed = 0
+    self._failures = 0
+    self._last_error = None
+    self._last_duration = 0.0
+
+  # Ask for the caches of learner_id's database (and the sort keys of group_id) to be caught up
+  def notify(self, learner_id=None, group_id=None):
+    with self._lock:
+      group_ids = self._pending.setdefault(learner_id, set())
+      if group_id is not None:
+        group_ids.add(group_id)
+    self._wake.set()
+
+  # Bring one database up to date, returns whether anything was written
+  def refresh(self, learner_id, group_ids=()):
+    started = time.perf_counter()
+    if learner_id is None or self.db.shards is None:
+      pool, conn = self.db.pool, self.db.pool.acquire()
+    else:
+      pool, conn = self.db.shards.acquire(learner_id)
+    try:
+      cursor = conn.cursor()
+      changed = sortkeys.ensure_words(cursor)
+      for group_id in sorted(group_ids):
+        changed = sortkeys.ensure_group(cursor, group_id) or changed
+      changed = stats.refresh_group_progress(cursor) > 0 or changed
+      conn.commit()
+    except Exception:
+      conn.rollback()
+      raise
+    finally:
+      pool.release(conn)
+    with self._lock:
+      self._runs += 1
+      self._refreshed += 1 if changed else 0
+      self._last_duration = time.perf_counter() - started
+    return changed
+
+  def _run(self):
+    while not self._stop.is_set():
+      self._wake.wait()
+      self._wake.clear()
+      with self._lock:
+        pending, self._pending = self._pending, {}
+      for learner_id, group_ids in pending.items():
+        if self._stop.is_set():
+          return
+        try:
+          self.refresh(learner_id, group_ids)
+        except Exception as e:
+          with self._lock:
+            self._failures += 1
+            self._last_error = str(e)
+          self.log(f'Refreshing the caches of {learner_id or "the shared database"} failed: {e}')
+
+  def start(self):
+    if self._thread is None:
+      self._stop.clear()
+      self._thread = threading.Thread(target=self._run, name='cache-upkeep', daemon=True)
+      self._thread.start()
+
+  def close(self):
+    self._stop.set()
+    self._wake.set()
+    if self._thread is not None:
+      self._thread.join(timeout=self.db.pool_timeout)
+      self._thread = None
+
+  def stats(self):
+    with self._lock:
+      return {
+        "pending_databases": len(self._pending),
+        "runs": self._runs,
+        "databases_refreshed": self._refreshed,
+        "failures": self._failures,
+        "last_error": self._last_error,
+        "last_duration_seconds": round(self._last_duration, 3)
+      }
@@ -0,0 +1,453 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+
+try:
+  import fcntl
+except ImportError:
+  # No flock on Windows: journals are not locked there, see ReviewBuffer
+  fcntl = None
+
+from lib import reviews
+from lib.serialization import dumps_line
+
+# Times an entry may fail to flush on its own before it is set aside
+MAX_ATTEMPTS = 3
+
+class BufferFull(Exception):
+  pass
+
+class JournalLocked(Exception):
+  pass
+
+# Path of journal slot n: the configured journal for slot 1, then journal-2, journal-3...
+def slot_path(journal_path, slot):
+  return journal_path if slot == 1 else f'{journal_path}-{slot}'
+
+# Take the lock of a journal (an exclusive flock on path + '.lock', released
+# when the file is closed or the process exits). Returns the open lock file,
+# or None when another process holds it.
+def lock_journal(path):
+  file = open(path + '.lock', 'a')
+  if fcntl is None:
+    return file
+  try:
+    fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+  except OSError:
+    file.close()
+    return None
+  return file
+
+# Answers as the journal stores them, [word_id, correct, answered_at], checked
+# the way the review routes check them: whatever reaches the journal must be
+# writable, or it would be retried forever. Raises reviews.ReviewError.
+def check_items(items):
+  checked = []
+  for word_id, correct, answered_at in items:
+    try:
+      word_id = int(word_id)
+    except (TypeError, ValueError):
+      raise reviews.ReviewError(f"Invalid word_id: {word_id}")
+    checked.append([word_id, reviews.parse_correct(correct, f"Word {word_id}"), reviews.parse_answered_at(answered_at)])
+  return checked
+
+# Highest sequence number of journal slot committed to the shared database,
+# which every flush writes last. Lets any process answer a barrier for a slot
+# flushed by another one.
+def slot_flushed_seq(db, slot):
+  conn = db.pool.acquire()
+  try:
+    row = conn.execute('SELECT flushed_seq FROM write_behind_state WHERE id = ?', (slot,)).fetchone()
+    return row[0] if row else 0
+  finally:
+    db.pool.release(conn)
+
+# Poll slot_flushed_seq until it reaches seq or timeout seconds have passed.
+# Returns whether it did, and the flushed sequence number.
+def wait_for_slot(db, slot, seq, timeout, poll=0.05):
+  deadline = time.monotonic() + timeout
+  while True:
+    flushed_seq = slot_flushed_seq(db, slot)
+    if flushed_seq >= seq or time.monotonic() >= deadline:
+      return flushed_seq >= seq, flushed_seq
+    time.sleep(min(poll, max(0.0, deadline - time.monotonic())))
+
+# Write-behind buffer for review answers.
+#
+# enqueue() appends the answers to an append-only journal, gives them the next
+# sequence number and returns; a flusher thread group-commits whatever is
+# pending every interval seconds (or as soon as max_items answers are waiting)
+# with reviews.log_reviews, i.e. one transaction and one commit per database
+# for the whole batch instead of one per request.
+#
+# Crash safety: the journal line is written before enqueue() returns (and
+# fsynced with fsync=True, otherwise it survives a process crash but not a
+# power loss). Each flush rotates the journal into a numbered segment and
+# deletes the segments once committed. Every database records the highest
+# sequence number it committed in write_behind_state, in the same transaction
+# as the answers, so the segments left behind by a crash are replayed on start
+# without applying anything twice.
+#
+# A batch that fails to commit is retried entry by entry, in sequence order,
+# so one bad entry cannot hold up the others: an entry that fails on its own
+# MAX_ATTEMPTS times is appended to the dead-letter file (journal path +
+# '.dead') and recorded as flushed.
+#
+# One process per journal: start() locks the first of slots journal slots
+# (journal_path, journal_path-2, ...) no other process holds, so every worker
+# of a gunicorn deployment gets a journal and a write_behind_state row of its
+# own, and raises JournalLocked when all of them are taken. A slot left by a
+# worker that died is replayed by the next process to take it. Without fcntl
+# (Windows) nothing is locked and only slot 1 is used.
+class ReviewBuffer:
+  def __init__(self, db, journal_path, interval=0.05, max_items=500,
+               max_pending=100000, fsync=False, on_flush=None, log=print, slots=1):
+    self.db = db
+    self.base_journal_path = journal_path
+    self.slots = max(1, slots) if fcntl is not None else 1
+    # Set by start() to the slot taken
+    self.slot = None
+    self.journal_path = None
+    self.dead_letter_path = None
+    self.interval = interval
+    self.max_items = max(1, max_items)
+    self.max_pending = max_pending
+    self.fsync = fsync
+    # Called with the set of learner ids (None for the shared database) after each flush
+    self.on_flush = on_flush
+    self.log = log
+
+    self._cond = threading.Condition()
+    self._pending = []
+    self._pending_items = 0
+    self._seq = 0
+    self._flushed_seq = 0
+    self._journal = None
+    self._journal_lock = None
+    # Journal segments whose entries are taken by a flush but not yet deleted
+    self._segments = []
+    self._segment_number = 0
+    self._closing = False
+    self._thread = None
+    # seq -> failed attempts on its own, and the entries set aside
+    self._attempts = {}
+    self._dead = set()
+
+    # Counters reported by stats()
+    self._flushes = 0
+    self._flushed_items = 0
+    self._failures = 0
+    self._skipped = 0
+    self._replayed = 0
+    self._dead_letters = 0
+    self._last_error = None
+    self._flush_seconds = 0.0
+
+  def _segment_paths(self):
+    paths = glob.glob(glob.escape(self.journal_path) + '.*')
+    return sorted((path for path in paths if path.rsplit('.', 1)[1].isdigit()),
+                  key=lambda path: int(path.rsplit('.', 1)[1]))
+
+  # Entries left in the journal and its segments by a previous run
+  def _read_journal(self):
+    entries = []
+    for path in self._segment_paths() + [self.journal_path]:
+      if not os.path.exists(path):
+        continue
+      with open(path, 'rb') as file:
+        for line in file:
+          try:
+            entries.append(json.loads(line))
+          except ValueError:
+            # The last line of a crashed write, never acknowledged
+            continue
+    entries.sort(key=lambda entry: entry['seq'])
+    return entries
+
+  # Lock the first free journal slot. Raises JournalLocked.
+  def _claim_slot(self):
+    for slot in range(1, self.slots + 1):
+      path = slot_path(self.base_journal_path, slot)
+      lock = lock_journal(path)
+      if lock is not None:
+        self.slot, self.journal_path, self._journal_lock = slot, path, lock
+        self.dead_letter_path = path + '.dead'
+        return
+    raise JournalLocked(f'All {self.slots} journal slots of {self.base_journal_path} are locked by other processes')
+
+  # Replay what a previous run left behind in our journal slot and start the
+  # flusher thread. Raises JournalLocked.
+  def start(self):
+    if self._thread is not None:
+      return
+    self._claim_slot()
+    entries = self._read_journal()
+    with self._cond:
+      self._flushed_seq = slot_flushed_seq(self.db, self.slot)
+      self._seq = max([self._flushed_seq] + [entry['seq'] for entry in entries])
+      # Replayed entries are flushed like new ones; already committed ones are skipped
+      self._pending = entries
+      self._pending_items = sum(len(entry['reviews']) for entry in entries)
+      self._replayed = len(entries)
+      self._segments = self._segment_paths()
+      self._segment_number = int(self._segments[-1].rsplit('.', 1)[1]) if self._segments else 0
+      self._journal = open(self.journal_path, 'ab')
+    self._thread = threading.Thread(target=self._run, name='review-flusher', daemon=True)
+    self._thread.start()
+    atexit.register(self.close)
+
+  # Queue answers for session (a row with id and group_id) of learner_id (None
+  # for the shared database). reviews is a list of (word_id, correct, answered_at).
+  # Returns the sequence number to pass to wait(). Raises reviews.ReviewError
+  # for answers that could not be written.
+  def enqueue(self, session, items, learner_id=None):
+    items = check_items(items)
+    with self._cond:
+      if self._closing or self._journal is None:
+        raise BufferFull('The review buffer is not running')
+      if self._pending_items + len(items) > self.max_pending:
+        raise BufferFull(f'{self._pending_items} answers are waiting to be written, try again shortly')
+      self._seq += 1
+      entry = {
+        'seq': self._seq,
+        'learner': learner_id,
+        'session_id': session['id'],
+        'reviews': items
+      }
+      self._journal.write(dumps_line(entry))
+      self._journal.flush()
+      if self.fsync:
+        os.fsync(self._journal.fileno())
+      self._pending.append(entry)
+      self._pending_items += len(items)
+      if len(self._pending) == 1 or self._pending_items >= self.max_items:
+        self._cond.notify_all()
+      return self._seq
+
+  # Block until every entry up to seq is committed. Returns False on timeout.
+  def wait(self, seq, timeout=None):
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with self._cond:
+      while self._flushed_seq < seq:
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+          return False
+        self._cond.wait(remaining)
+      return True
+
+  # Wait for everything queued so far
+  def drain(self, timeout=None):
+    with self._cond:
+      seq = self._seq
+    return self.wait(seq, timeout)
+
+  @property
+  def last_seq(self):
+    with self._cond:
+      return self._seq
+
+  @property
+  def flushed_seq(self):
+    with self._cond:
+      return self._flushed_seq
+
+  # Take the pending entries and move the journal aside, call with the lock held
+  def _take(self):
+    batch, self._pending = self._pending, []
+    self._pending_items = 0
+    self._journal.close()
+    if os.path.exists(self.journal_path):
+      self._segment_number += 1
+      segment = f'{self.journal_path}.{self._segment_number}'
+      os.replace(self.journal_path, segment)
+      self._segments.append(segment)
+    self._journal = open(self.journal_path, 'ab')
+    return batch
+
+  def _run(self):
+    while True:
+      with self._cond:
+        while not self._pending and not self._closing:
+          self._cond.wait()
+        # Give concurrent requests until the deadline to join the batch
+        deadline = time.monotonic() + self.interval
+        while self._pending_items < self.max_items and not self._closing:
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            break
+          self._cond.wait(remaining)
+        if not self._pending and self._closing:
+          return
+        batch = self._take()
+
+      remaining = []
+      try:
+        scopes = self._flush(batch)
+      except Exception as e:
+        with self._cond:
+          self._failures += 1
+          self._last_error = str(e)
+        self.log(f'Flushing {len(batch)} queued reviews failed: {e}')
+        remaining, scopes = self._flush_each(batch)
+
+      with self._cond:
+        if remaining:
+          # Put the rest back in front and retry, the segments stay on disk
+          self._pending = remaining + self._pending
+          self._pending_items += sum(len(entry['reviews']) for entry in remaining)
+          segments = []
+        else:
+          segments, self._segments = self._segments, []
+          self._flushed_seq = max(self._flushed_seq, batch[-1]['seq'])
+        self._cond.notify_all()
+        closing = self._closing
+      for segment in segments:
+        os.remove(segment)
+      if scopes and self.on_flush is not None:
+        self.on_flush(scopes)
+      if remaining:
+        if closing:
+          return
+        time.sleep(max(self.interval, 1.0))
+
+  # After a failed flush, commit the entries of batch one at a time in sequence
+  # order (a database skips sequence numbers below the one it recorded), up to
+  # the first one that still fails. Returns (the entries left to retry, the
+  # scopes written).
+  def _flush_each(self, batch):
+    scopes = set()
+    for index, entry in enumerate(batch):
+      try:
+        scopes |= self._flush([entry])
+      except Exception as e:
+        attempts = self._attempts.get(entry['seq'], 0) + 1
+        self._attempts[entry['seq']] = attempts
+        if attempts < MAX_ATTEMPTS:
+          return batch[index:], scopes
+        try:
+          self._quarantine(entry, e)
+          # Recorded as flushed with no answers, so a replay skips it too
+          scopes |= self._flush([dict(entry, reviews=[])])
+        except Exception:
+          return batch[index:], scopes
+      self._attempts.pop(entry['seq'], None)
+      with self._cond:
+        self._flushed_seq = max(self._flushed_seq, entry['seq'])
+        self._cond.notify_all()
+    return [], scopes
+
+  # Append an entry that cannot be written to the dead-letter file
+  def _quarantine(self, entry, error):
+    if entry['seq'] in self._dead:
+      return
+    with open(self.dead_letter_path, 'ab') as file:
+      file.write(dumps_line(dict(entry, error=str(error))))
+      file.flush()
+      os.fsync(file.fileno())
+    self._dead.add(entry['seq'])
+    with self._cond:
+      self._dead_letters += 1
+    self.log(f'Queued reviews {entry["seq"]} failed {MAX_ATTEMPTS} times, moved to {self.dead_letter_path}: {error}')
+
+  # Commit a batch: learner shards first, the shared database last, with the
+  # batch's highest sequence number even when it holds none of the answers
+  def _flush(self, batch):
+    started = time.perf_counter()
+    per_learner = {}
+    for entry in batch:
+      per_learner.setdefault(entry['learner'], []).append(entry)
+    learners = [learner for learner in per_learner if learner is not None] + [None]
+
+    skipped = 0
+    for learner in learners:
+      entries = per_learner.get(learner, [])
+      seq = batch[-1]['seq'] if learner is None else entries[-1]['seq']
+      if learner is None:
+        pool, conn = self.db.pool, self.db.pool.acquire()
+      else:
+        pool, conn = self.db.shards.acquire(learner)
+      try:
+        skipped += self.apply(conn.cursor(), entries, seq)
+        conn.commit()
+      finally:
+        pool.release(conn)
+
+    with self._cond:
+      self._flushes += 1
+      self._flushed_items += sum(len(entry['reviews']) for entry in batch)
+      self._skipped += skipped
+      self._flush_seconds += time.perf_counter() - started
+    return set(per_learner)
+
+  # Write entries (in sequence order) not yet committed to the cursor's database
+  # and record seq as flushed. Answers for sessions deleted in the meantime are
+  # dropped. Returns the number of answers dropped. Does not commit.
+  def apply(self, cursor, entries, seq):
+    cursor.execute('INSERT OR IGNORE INTO write_behind_state (id, flushed_seq) VALUES (?, 0)', (self.slot,))
+    cursor.execute('SELECT flushed_seq FROM write_behind_state WHERE id = ?', (self.slot,))
+    applied = cursor.fetchone()[0]
+    per_session = {}
+    for entry in entries:
+      if entry['seq'] > applied:
+        per_session.setdefault(entry['session_id'], []).extend(
+          (word_id, correct, answered_at) for word_id, correct, answered_at in entry['reviews']
+        )
+
+    skipped = 0
+    if per_session:
+      cursor.execute('''
+        SELECT id, group_id FROM study_sessions
+        WHERE id IN (SELECT value FROM json_each(?))
+      ''', (json.dumps(list(per_session)),))
+      sessions = {row['id']: row for row in cursor.fetchall()}
+      for session_id, items in per_session.items():
+        session = sessions.get(session_id)
+        if session is None:
+          skipped += len(items)
+          continue
+        reviews.log_reviews(cursor, session, items)
+
+    cursor.execute('UPDATE write_behind_state SET flushed_seq = MAX(flushed_seq, ?) WHERE id = ?', (seq, self.slot))
+    return skipped
+
+  # Flush what is pending and stop the flusher
+  def close(self):
+    with self._cond:
+      if self._thread is None or self._closing:
+        return
+      self._closing = True
+      self._cond.notify_all()
+    self._thread.join()
+    with self._cond:
+      if self._journal is not None:
+        self._journal.close()
+        self._journal = None
+      if self._journal_lock is not None:
+        self._journal_lock.close()
+        self._journal_lock = None
+
+  def stats(self):
+    with self._cond:
+      return {
+        "journal": self.journal_path,
+        "slot": self.slot,
+        "interval_ms": round(self.interval * 1000, 3),
+        "max_items": self.max_items,
+        "pending_entries": len(self._pending),
+        "pending_items": self._pending_items,
+        "last_seq": self._seq,
+        "flushed_seq": self._flushed_seq,
+        "flushes": self._flushes,
+        "flushed_items": self._flushed_items,
+        "items_per_flush": round(self._flushed_items / self._flushes, 2) if self._flushes else 0.0,
+        "flush_ms_avg": round(self._flush_seconds * 1000 / self._flushes, 3) if self._flushes else 0.0,
+        "failures": self._failures,
+        "last_error": self._last_error,
+        "skipped_items": self._skipped,
+        "dead_letters": self._dead_letters,
+        "dead_letter_path": self.dead_letter_path,
+        "replayed_entries": self._replayed
+      }
@@ -1,31 +1,55 @@
+import argparse
 import sqlite3
 import os
 
-def run_migrations():
+from lib import migrations
+
+# Same database file as app.py
+DEFAULT_DATABASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'words.db')
+
+def run_migrations(db_path=DEFAULT_DATABASE):
     # Connect to the database
-    db_path = os.path.join(os.path.dirname(__file__), 'word_bank.db')
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA busy_timeout = 5000')
     
     try:
-        # Get list of migration files
-        migrations_dir = os.path.join(os.path.dirname(__file__), 'sql', 'migrations')
-        migration_files = sorted([f for f in os.listdir(migrations_dir) if f.endswith('.sql')])
-        
-        # Run each migration
-        for migration_file in migration_files:
-            print(f"Running migration: {migration_file}")
-            with open(os.path.join(migrations_dir, migration_file)) as f:
-                migration_sql = f.read()
-                conn.executescript(migration_sql)
-                conn.commit()
-        
-        print("Migrations completed successfully")
+        applied = migrations.migrate(conn, log=print)
+        if applied:
+            print(f"Migrations completed successfully, schema is at version {migrations.current_version(conn)}")
+        else:
+            print(f"Schema is up to date at version {migrations.current_version(conn)}")
+        return True
     except Exception as e:
         print(f"Error running migrations: {str(e)}")
-        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+# Verify the route queries are planned with the indexes the migrations ship
+def check_indexes(db_path=DEFAULT_DATABASE):
+    conn = sqlite3.connect(db_path)
+    try:
+        ok = True
+        try:
+            results = migrations.check_indexes(conn)
+        except sqlite3.Error as e:
+            print(f"Error checking indexes: {str(e)}")
+            return False
+        for description, index, used, plan in results:
+            print(f"[{'ok' if used else 'MISSING'}] {description}: {index}")
+            if not used:
+                ok = False
+                for detail in plan:
+                    print(f"    {detail}")
+        return ok
     finally:
         conn.close()
 
 if __name__ == '__main__':
-    run_migrations()
+    parser = argparse.ArgumentParser(description='Apply pending schema migrations')
+    parser.add_argument('--database', default=DEFAULT_DATABASE)
+    parser.add_argument('--check', action='store_true', help='verify index usage with EXPLAIN QUERY PLAN')
+    args = parser.parse_args()
+    ok = check_indexes(args.database) if args.check else run_migrations(args.database)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,59 @@
+from flask import request, jsonify, g
+from flask_cors import cross_origin
+
+from lib import batch
+
+# Per-request state a sub-request sets on g, which it shares with the batch
+SUB_REQUEST_STATE = ('db_snapshot', 'sql_profile')
+
+def load(app):
+  learner_header = app.config['LEARNER_HEADER']
+
+  # Run a GET sub-request through the normal dispatch (before/after request
+  # hooks, response cache, ?fields=). Its request context reuses the batch's app
+  # context, so its queries run on the connection the batch checked out.
+  def dispatch(path):
+    headers = {}
+    if learner_header in request.headers:
+      headers[learner_header] = request.headers[learner_header]
+    saved = {key: g.pop(key) for key in SUB_REQUEST_STATE if key in g}
+    try:
+      with app.test_request_context(path, method='GET', headers=headers):
+        response = app.full_dispatch_request()
+        if response.is_json:
+          return {"status": response.status_code, "body": response.get_json()}
+        # e.g. an export stream or an HTML error page
+        response.close()
+        if response.status_code < 400:
+          return {"status": 400, "body": {"error": f"{path} does not return JSON and cannot be batched"}}
+        return {"status": response.status_code, "body": {"error": response.status}}
+    except Exception as e:
+      return {"status": 500, "body": {"error": str(e)}}
+    finally:
+      for key in SUB_REQUEST_STATE:
+        g.pop(key, None)
+      for key, value in saved.items():
+        setattr(g, key, value)
+
+  # Endpoint: POST /batch runs several GET requests of the other endpoints in one
+  # round-trip and on one database connection, e.g.
+  # {"requests": [{"id": "session", "path": "/api/study-sessions/1"}, {"id": "words", "path": "/words?ids=1,2,3"}]}
+  # Returns {"responses": {"session": {"status": 200, "body": {...}}, "words": {...}}}
+  @app.route('/batch', methods=['POST'])
+  @cross_origin()
+  def run_batch():
+    try:
+      sub_requests = batch.parse_requests(request.get_json(silent=True))
+
+      # Checked out before the first sub-request so they all share it; this also
+      # keeps them on the live database rather than the read snapshot
+      app.db.get()
+
+      responses = {}
+      for request_id, path in sub_requests:
+        responses[request_id] = dispatch(path)
+      return jsonify({"responses": responses})
+    except batch.BatchError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
@@ -1,28 +1,33 @@
-from flask import jsonify
+from flask import jsonify, request
 from flask_cors import cross_origin
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+
+from lib import stats
+
+# Widest range GET /dashboard/heatmap serves
+MAX_HEATMAP_DAYS = 3660
 
 def load(app):
     @app.route('/dashboard/recent-session', methods=['GET'])
     @cross_origin()
+    @app.cache.cached
+    @app.db.from_snapshot
     def get_recent_session():
         try:
             cursor = app.db.cursor()
             
-            # Get the most recent study session with activity name and results
+            # Get the most recent study session with activity name and results,
+            # one index probe into the summaries maintained by lib/sessions.py
             cursor.execute('''
                 SELECT 
-                    ss.id,
-                    ss.group_id,
-                    sa.name as activity_name,
-                    ss.created_at,
-                    COUNT(CASE WHEN wri.correct = 1 THEN 1 END) as correct_count,
-                    COUNT(CASE WHEN wri.correct = 0 THEN 1 END) as wrong_count
-                FROM study_sessions ss
-                JOIN study_activities sa ON ss.study_activity_id = sa.id
-                LEFT JOIN word_review_items wri ON ss.id = wri.study_session_id
-                GROUP BY ss.id
-                ORDER BY ss.created_at DESC
+                    study_session_id as id,
+                    group_id,
+                    activity_name,
+                    created_at,
+                    correct_count,
+                    review_count - correct_count as wrong_count
+                FROM study_session_summary
+                ORDER BY created_at DESC, study_session_id DESC
                 LIMIT 1
             ''')
             
@@ -43,87 +48,38 @@ def load(app):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    # current_streak and active_groups depend on today's date
     @app.route('/dashboard/stats', methods=['GET'])
     @cross_origin()
+    @app.cache.cached_daily
+    @app.db.from_snapshot
     def get_study_stats():
         try:
             cursor = app.db.cursor()
             
-            # Get total vocabulary count
-            cursor.execute('SELECT COUNT(*) as total_vocabulary FROM words')
-            total_vocabulary = cursor.fetchone()["total_vocabulary"]
+            # Totals are maintained incrementally by lib/stats.py on every write
+            totals = stats.read_totals(cursor, app.db.shared_schema())
+            total_vocabulary = totals["total_vocabulary"]
+            total_words = totals["total_words_studied"]
+            mastered_words = totals["mastered_words"]
+            total_sessions = totals["total_sessions"]
 
-            # Get total unique words studied
-            cursor.execute('''
-                SELECT COUNT(DISTINCT word_id) as total_words
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
-            ''')
-            total_words = cursor.fetchone()["total_words"]
-            
-            # Get mastered words (words with >80% success rate and at least 5 attempts)
-            cursor.execute('''
-                WITH word_stats AS (
-                    SELECT 
-                        word_id,
-                        COUNT(*) as total_attempts,
-                        SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                    FROM word_review_items wri
-                    JOIN study_sessions ss ON wri.study_session_id = ss.id
-                    GROUP BY word_id
-                    HAVING total_attempts >= 5
-                )
-                SELECT COUNT(*) as mastered_words
-                FROM word_stats
-                WHERE success_rate >= 0.8
-            ''')
-            mastered_words = cursor.fetchone()["mastered_words"]
-            
             # Get overall success rate
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
-            ''')
-            success_rate = cursor.fetchone()["success_rate"] or 0
-            
-            # Get total number of study sessions
-            cursor.execute('SELECT COUNT(*) as total_sessions FROM study_sessions')
-            total_sessions = cursor.fetchone()["total_sessions"]
+            success_rate = 0
+            if totals["total_attempts"]:
+                success_rate = totals["total_correct"] * 1.0 / totals["total_attempts"]
             
             # Get number of groups with activity in the last 30 days
             cursor.execute('''
                 SELECT COUNT(DISTINCT group_id) as active_groups
-                FROM study_sessions
-                WHERE created_at >= date('now', '-30 days')
+                FROM daily_activity
+                WHERE activity_date >= date('now', '-30 days') AND sessions > 0
             ''')
             active_groups = cursor.fetchone()["active_groups"]
             
-            # Calculate current streak (consecutive days with at least one study session)
-            cursor.execute('''
-                WITH daily_sessions AS (
-                    SELECT 
-                        date(created_at) as study_date,
-                        COUNT(*) as session_count
-                    FROM study_sessions
-                    GROUP BY date(created_at)
-                ),
-                streak_calc AS (
-                    SELECT 
-                        study_date,
-                        julianday(study_date) - julianday(lag(study_date, 1) over (order by study_date)) as days_diff
-                    FROM daily_sessions
-                )
-                SELECT COUNT(*) as streak
-                FROM (
-                    SELECT study_date
-                    FROM streak_calc
-                    WHERE days_diff = 1 OR days_diff IS NULL
-                    ORDER BY study_date DESC
-                )
-            ''')
-            current_streak = cursor.fetchone()["streak"]
+            # Current streak (consecutive days with at least one study session,
+            # ending today or yesterday), maintained by lib/stats.py
+            current_streak = stats.read_streak(cursor)["current_streak"]
             
             return jsonify({
                 "total_vocabulary": total_vocabulary,
@@ -137,3 +93,43 @@ def load(app):
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
+
+    @app.route('/dashboard/streak', methods=['GET'])
+    @cross_origin()
+    @app.db.from_snapshot
+    def get_study_streak():
+        try:
+            cursor = app.db.cursor()
+            return jsonify(stats.read_streak(cursor))
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    # GET /dashboard/heatmap?days=N (or ?from=YYYY-MM-DD&to=YYYY-MM-DD): sessions,
+    # reviews and correct answers per day, only for days with activity
+    @app.route('/dashboard/heatmap', methods=['GET'])
+    @cross_origin()
+    @app.db.from_snapshot
+    def get_activity_heatmap():
+        try:
+            days = max(1, min(request.args.get('days', 365, type=int), MAX_HEATMAP_DAYS))
+            try:
+                end = date.fromisoformat(request.args['to']) if 'to' in request.args else stats.utc_today()
+                start = date.fromisoformat(request.args['from']) if 'from' in request.args else end - timedelta(days=days - 1)
+            except ValueError:
+                return jsonify({"error": "from and to must be dates (YYYY-MM-DD)"}), 400
+            if start > end or (end - start).days >= MAX_HEATMAP_DAYS:
+                return jsonify({"error": f"from must be before to and at most {MAX_HEATMAP_DAYS} days apart"}), 400
+
+            cursor = app.db.cursor()
+            return jsonify({
+                "from": start.isoformat(),
+                "to": end.isoformat(),
+                "days": [{
+                    "date": day["activity_date"],
+                    "sessions": day["sessions"],
+                    "reviews": day["reviews"],
+                    "correct": day["correct"]
+                } for day in stats.read_days(cursor, start.isoformat(), end.isoformat())]
+            })
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
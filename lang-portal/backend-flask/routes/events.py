@@ -0,0 +1,26 @@
+from flask import request, jsonify, g, Response
+from flask_cors import cross_origin
+
+from lib.events import TooManySubscribers
+
+def load(app):
+  # Endpoint: GET /events is a server-sent events stream of the current learner's
+  # writes: session_started, reviews, stats (the dashboard totals after a write)
+  # and history_reset. Reconnects resume after the Last-Event-ID header (or
+  # ?last_event_id= for clients that cannot set it); a "resync" event means
+  # events were missed and the client should refetch what it shows.
+  @app.route('/events', methods=['GET'])
+  @cross_origin()
+  def stream_events():
+    try:
+      last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+      stream = app.events.subscribe(g.get('learner_id'), last_event_id)
+    except TooManySubscribers as e:
+      return jsonify({"error": str(e)}), 503
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    return Response(stream, mimetype='text/event-stream', headers={
+      'Cache-Control': 'no-cache',
+      # Stop nginx from buffering the stream
+      'X-Accel-Buffering': 'no'
+    })
@@ -0,0 +1,103 @@
+from flask import request, jsonify, Response, stream_with_context
+from flask_cors import cross_origin
+
+from lib import export, partitions
+from lib.serialization import requested_fields
+
+def load(app):
+  # Build a streaming response for an executed cursor.
+  # Query parameters: format=ndjson|csv (default ndjson), gzip=1 to compress the stream,
+  # fields=id,french to export only those columns
+  def stream_response(cursor, filename):
+    format = request.args.get('format', 'ndjson')
+    gzip = request.args.get('gzip') in ('1', 'true')
+    body = export.stream(cursor, format=format, gzip=gzip, fields=requested_fields())
+    response = Response(stream_with_context(body), mimetype=export.FORMATS[format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{format}'
+    if gzip:
+      response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+  def invalid_format():
+    if request.args.get('format', 'ndjson') not in export.FORMATS:
+      return jsonify({"error": f"format must be one of {', '.join(export.FORMATS)}"}), 400
+    return None
+
+  # Endpoint: GET /export/words streams every word with its review counts
+  @app.route('/export/words', methods=['GET'])
+  @cross_origin()
+  @app.db.from_snapshot
+  def export_words():
+    try:
+      error = invalid_format()
+      if error:
+        return error
+      cursor = app.db.cursor()
+      cursor.execute('''
+        SELECT w.id, w.french, w.english,
+               COALESCE(r.correct_count, 0) AS correct_count,
+               COALESCE(r.wrong_count, 0) AS wrong_count
+        FROM words w
+        LEFT JOIN word_reviews r ON w.id = r.word_id
+        ORDER BY w.id
+      ''')
+      return stream_response(cursor, 'words')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /export/groups/:id/words streams the words of one group
+  @app.route('/export/groups/<int:id>/words', methods=['GET'])
+  @cross_origin()
+  @app.db.from_snapshot
+  def export_group_words(id):
+    try:
+      error = invalid_format()
+      if error:
+        return error
+      cursor = app.db.cursor()
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+      cursor.execute('''
+        SELECT w.id, w.french, w.english,
+               COALESCE(r.correct_count, 0) AS correct_count,
+               COALESCE(r.wrong_count, 0) AS wrong_count
+        FROM word_groups wg
+        JOIN words w ON w.id = wg.word_id
+        LEFT JOIN word_reviews r ON w.id = r.word_id
+        WHERE wg.group_id = ?
+        ORDER BY w.id
+      ''', (id,))
+      return stream_response(cursor, f'group-{id}-words')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /export/review_items?since=<timestamp> streams the review history,
+  # optionally only the items created at or after `since` (e.g. 2025-02-01 or 2025-02-01 12:00:00)
+  @app.route('/export/review_items', methods=['GET'])
+  @cross_origin()
+  @app.db.from_snapshot
+  def export_review_items():
+    try:
+      error = invalid_format()
+      if error:
+        return error
+      where = ''
+      params = []
+      since = request.args.get('since')
+      if since:
+        where = 'WHERE wri.created_at >= ?'
+        params.append(since)
+      cursor = app.db.cursor()
+      # Only the month partitions that can hold rows since `since` are read
+      source = partitions.source_sql(cursor, since)
+      cursor.execute(f'''
+        SELECT wri.id, wri.word_id, wri.study_session_id, ss.group_id, wri.correct, wri.created_at
+        FROM {source} wri
+        LEFT JOIN study_sessions ss ON ss.id = wri.study_session_id
+        {where}
+        ORDER BY wri.created_at, wri.id
+      ''', params)
+      return stream_response(cursor, 'review-items')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
@@ -1,10 +1,26 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
+import random
+
+from lib import groups, quiz, reviews, sessions, sortkeys, srs, stats
+from lib.pagination import InvalidCursor, decode_cursor, seek_clause, next_page, wants_total
+from routes.words import WORD_LIST_COLUMNS, WORD_SORT_EXPRESSIONS, format_words
+
+# The group listings read everything from group_word_sort_keys gk, indexed on
+# (group_id, sort column, word_id) for each sortable column, or from the same
+# rows computed on the fly while a group's are behind its membership
+GROUP_WORD_SORT_EXPRESSIONS = {sort_by: f'gk.{sort_by}' for sort_by in WORD_SORT_EXPRESSIONS}
+
+GROUP_WORD_SELECT = '''
+  gk.word_id AS id, gk.french, gk.english, gk.correct_count, gk.wrong_count, gk.accuracy,
+  NULLIF(gk.last_reviewed, '') AS last_reviewed
+'''
 
 def load(app):
   @app.route('/groups', methods=['GET'])
   @cross_origin()
+  @app.cache.cached
   def get_groups():
     try:
       cursor = app.db.cursor()
@@ -19,16 +35,22 @@ def load(app):
       order = request.args.get('order', 'asc')  # Default to ascending order
 
       # Validate sort_by and order
-      valid_columns = ['name', 'words_count']
+      valid_columns = ['name', 'words_count', 'reviewed_count', 'mastered_count']
       if sort_by not in valid_columns:
         sort_by = 'name'
       if order not in ['asc', 'desc']:
         order = 'asc'
 
-      # Query to fetch groups with sorting and the cached word count
+      # Groups whose membership changed since their progress was cached are
+      # counted on the fly until lib/upkeep.py has caught up
+      if not stats.group_progress_current(cursor):
+        app.upkeep.notify(g.get('learner_id'))
+
+      # Query to fetch groups with sorting and the cached counters
       cursor.execute(f'''
-        SELECT id, name, words_count
-        FROM groups
+        SELECT g.id, g.name, g.words_count, {stats.GROUP_PROGRESS_COLUMNS}
+        FROM groups g
+        LEFT JOIN group_progress p ON p.group_id = g.id
         ORDER BY {sort_by} {order}
         LIMIT ? OFFSET ?
       ''', (groups_per_page, offset))
@@ -46,7 +68,9 @@ def load(app):
         groups_data.append({
           "id": group["id"],
           "group_name": group["name"],
-          "word_count": group["words_count"]
+          "word_count": group["words_count"],
+          "reviewed_count": group["reviewed_count"],
+          "mastered_count": group["mastered_count"]
         })
 
       # Return groups and pagination metadata
@@ -60,15 +84,20 @@ def load(app):
 
   @app.route('/groups/<int:id>', methods=['GET'])
   @cross_origin()
+  @app.cache.cached
   def get_group(id):
     try:
       cursor = app.db.cursor()
 
+      if not stats.group_progress_current(cursor, [id]):
+        app.upkeep.notify(g.get('learner_id'))
+
       # Get group details
-      cursor.execute('''
-        SELECT id, name, words_count
-        FROM groups
-        WHERE id = ?
+      cursor.execute(f'''
+        SELECT g.id, g.name, g.words_count, {stats.GROUP_PROGRESS_COLUMNS}
+        FROM groups g
+        LEFT JOIN group_progress p ON p.group_id = g.id
+        WHERE g.id = ?
       ''', (id,))
       
       group = cursor.fetchone()
@@ -78,7 +107,9 @@ def load(app):
       return jsonify({
         "id": group["id"],
         "group_name": group["name"],
-        "word_count": group["words_count"]
+        "word_count": group["words_count"],
+        "reviewed_count": group["reviewed_count"],
+        "mastered_count": group["mastered_count"]
       })
     except Exception as e:
       return jsonify({"error": str(e)}), 500
@@ -99,7 +130,7 @@ def load(app):
       order = request.args.get('order', 'asc')
 
       # Validate sort parameters
-      valid_columns = ['french', 'english', 'correct_count', 'wrong_count']
+      valid_columns = ['french', 'english', 'correct_count', 'wrong_count', 'accuracy', 'last_reviewed']
       if sort_by not in valid_columns:
         sort_by = 'french'
       if order not in ['asc', 'desc']:
@@ -111,16 +142,23 @@ def load(app):
       if not group:
         return jsonify({"error": "Group not found"}), 404
 
+      # Sort keys built before the group's words changed are computed on the
+      # fly until lib/upkeep.py has rebuilt them
+      source = 'group_word_sort_keys gk'
+      if not sortkeys.group_current(cursor, id):
+        source = f'{sortkeys.LIVE_GROUP_WORD_SORT_KEYS} gk'
+        app.upkeep.notify(g.get('learner_id'), id)
+
+      after = request.args.get('after')
+      if after is not None:
+        return get_group_words_after(cursor, id, after, sort_by, order, words_per_page, source)
+
       # Query to fetch words with pagination and sorting
       cursor.execute(f'''
-        SELECT w.*, 
-               COALESCE(wr.correct_count, 0) as correct_count,
-               COALESCE(wr.wrong_count, 0) as wrong_count
-        FROM words w
-        JOIN word_groups wg ON w.id = wg.word_id
-        LEFT JOIN word_reviews wr ON w.id = wr.word_id
-        WHERE wg.group_id = ?
-        ORDER BY {sort_by} {order}
+        SELECT {GROUP_WORD_SELECT}
+        FROM {source}
+        WHERE gk.group_id = ?
+        ORDER BY {GROUP_WORD_SORT_EXPRESSIONS[sort_by]} {order}, gk.word_id {order}
         LIMIT ? OFFSET ?
       ''', (id, words_per_page, offset))
       
@@ -135,25 +173,47 @@ def load(app):
       total_words = cursor.fetchone()[0]
       total_pages = (total_words + words_per_page - 1) // words_per_page
 
-      # Format the response
-      words_data = []
-      for word in words:
-        words_data.append({
-          "id": word["id"],
-          "french": word["french"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"]
-        })
-
       return jsonify({
-        'words': words_data,
+        'words': format_words(words, WORD_LIST_COLUMNS),
         'total_pages': total_pages,
         'current_page': page
       })
+    except InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  # Keyset variant of GET /groups/:id/words
+  def get_group_words_after(cursor, id, after, sort_by, order, words_per_page, source='group_word_sort_keys gk'):
+    sort_expr = GROUP_WORD_SORT_EXPRESSIONS[sort_by]
+    seek = decode_cursor(after, sort_by, order)
+    where = 'gk.group_id = ?'
+    params = [id]
+    if seek is not None:
+      where += ' AND ' + seek_clause(sort_expr, 'gk.word_id', order)
+      params.extend(seek)
+
+    cursor.execute(f'''
+      SELECT {GROUP_WORD_SELECT}, {sort_expr} AS sort_value
+      FROM {source}
+      WHERE {where}
+      ORDER BY {sort_expr} {order}, gk.word_id {order}
+      LIMIT ?
+    ''', (*params, words_per_page + 1))
+    words, next_cursor = next_page(cursor.fetchall(), words_per_page, sort_by, order)
+
+    result = {
+      'words': format_words(words, WORD_LIST_COLUMNS),
+      'next_cursor': next_cursor,
+      'per_page': words_per_page
+    }
+    if wants_total(request.args):
+      result['total_words'] = app.counts.get(
+        ('group_words', id),
+        lambda: cursor.execute('SELECT COUNT(*) FROM word_groups WHERE group_id = ?', (id,)).fetchone()[0]
+      )
+    return jsonify(result)
+
   # todo GET /groups/:id/words/raw
   @app.route('/groups/<int:id>/words/raw', methods=['GET'])
   @cross_origin()
@@ -197,8 +257,52 @@ def load(app):
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  # Endpoint: POST /groups/:id/words adds words to the group, DELETE removes them.
+  # Body: {"word_ids": [1, 2, 3]} (or a bare array), at most groups.MAX_BATCH_SIZE ids.
+  # Words already in (or, on DELETE, not in) the group are skipped.
+  @app.route('/groups/<int:id>/words', methods=['POST', 'DELETE'])
+  @cross_origin()
+  def update_group_words(id):
+    try:
+      # Learner shards only attach the vocabulary read-only
+      if g.get('learner_id') is not None:
+        return jsonify({"error": f"The vocabulary is shared, edit groups without the {app.config['LEARNER_HEADER']} header"}), 403
+
+      word_ids = groups.parse_word_ids(request.get_json(silent=True))
+      cursor = app.db.cursor()
+
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+
+      if request.method == 'POST':
+        missing = reviews.missing_word_ids(cursor, word_ids)
+        if missing:
+          return jsonify({"error": "Unknown word ids", "word_ids": missing}), 400
+        changed = groups.add_words(cursor, id, word_ids)
+      else:
+        changed = groups.remove_words(cursor, id, word_ids)
+      stats.refresh_group_progress(cursor, [id])
+      sortkeys.ensure_group(cursor, id)
+
+      cursor.execute('SELECT words_count FROM groups WHERE id = ?', (id,))
+      words_count = cursor.fetchone()['words_count']
+      app.db.commit()
+      app.cache.bump()
+
+      return jsonify({
+        "group_id": id,
+        "added" if request.method == 'POST' else "removed": changed,
+        "word_count": words_count
+      })
+    except groups.MembershipError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
   @app.route('/groups/<int:id>/study_sessions', methods=['GET'])
   @cross_origin()
+  @app.db.from_snapshot
   def get_group_study_sessions(id):
     try:
       cursor = app.db.cursor()
@@ -208,77 +312,48 @@ def load(app):
       sessions_per_page = 10
       offset = (page - 1) * sessions_per_page
 
-      # Get sorting parameters
-      sort_by = request.args.get('sort_by', 'created_at')
-      order = request.args.get('order', 'desc')  # Default to newest first
-
-      # Map frontend sort keys to database columns
-      sort_mapping = {
-        'startTime': 'created_at',
-        'endTime': 'last_activity_time',
-        'activityName': 'a.name',
-        'groupName': 'g.name',
-        'reviewItemsCount': 'review_count'
-      }
-
-      # Use mapped sort column or default to created_at
-      sort_column = sort_mapping.get(sort_by, 'created_at')
+      # Get sorting parameters, newest first by default. Frontend sort keys map to
+      # study_session_summary columns (sessions.SORT_COLUMNS), each with a
+      # (group_id, column) index, so every sort is a range scan of one index.
+      sort_column = sessions.sort_column(request.args.get('sort_by'), constant='group_name')
+      order = sessions.sort_order(request.args.get('order', 'desc'))
 
       # Get total count for pagination
       cursor.execute('''
         SELECT COUNT(*)
-        FROM study_sessions
+        FROM study_session_summary
         WHERE group_id = ?
       ''', (id,))
       total_sessions = cursor.fetchone()[0]
       total_pages = (total_sessions + sessions_per_page - 1) // sessions_per_page
 
-      # Get study sessions for this group with dynamic calculations
+      # Review counts and end times are maintained by lib/sessions.py on every write
       cursor.execute(f'''
         SELECT 
-          s.id,
-          s.group_id,
-          s.study_activity_id,
-          s.created_at as start_time,
-          (
-            SELECT MAX(created_at)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as last_activity_time,
-          a.name as activity_name,
-          g.name as group_name,
-          (
-            SELECT COUNT(*)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as review_count
-        FROM study_sessions s
-        JOIN study_activities a ON s.study_activity_id = a.id
-        JOIN groups g ON s.group_id = g.id
-        WHERE s.group_id = ?
-        ORDER BY {sort_column} {order}
+          study_session_id as id,
+          group_id,
+          study_activity_id,
+          created_at as start_time,
+          end_time,
+          activity_name,
+          group_name,
+          review_count
+        FROM study_session_summary
+        WHERE group_id = ?
+        ORDER BY {sort_column} {order}, study_session_id {order}
         LIMIT ? OFFSET ?
       ''', (id, sessions_per_page, offset))
       
-      sessions = cursor.fetchall()
-      sessions_data = []
-      
-      for session in sessions:
-        # If there's no last_activity_time, use start_time + 30 minutes
-        end_time = session["last_activity_time"]
-        if not end_time:
-            end_time = cursor.execute('SELECT datetime(?, "+30 minutes")', (session["start_time"],)).fetchone()[0]
-        
-        sessions_data.append({
-          "id": session["id"],
-          "group_id": session["group_id"],
-          "group_name": session["group_name"],
-          "study_activity_id": session["study_activity_id"],
-          "activity_name": session["activity_name"],
-          "start_time": session["start_time"],
-          "end_time": end_time,
-          "review_items_count": session["review_count"]
-        })
+      sessions_data = [{
+        "id": session["id"],
+        "group_id": session["group_id"],
+        "group_name": session["group_name"],
+        "study_activity_id": session["study_activity_id"],
+        "activity_name": session["activity_name"],
+        "start_time": session["start_time"],
+        "end_time": session["end_time"],
+        "review_items_count": session["review_count"]
+      } for session in cursor.fetchall()]
 
       return jsonify({
         'study_sessions': sessions_data,
@@ -286,4 +361,74 @@ def load(app):
         'current_page': page
       })
     except Exception as e:
-      return jsonify({"error": str(e)}), 500
\ No newline at end of file
+      return jsonify({"error": str(e)}), 500
+
+  # GET /groups/:id/due?limit=N: the next words to review in this group, words
+  # due for review first (most overdue first), then words never reviewed (new=0 to skip)
+  @app.route('/groups/<int:id>/due', methods=['GET'])
+  @cross_origin()
+  def get_group_due_words(id):
+    try:
+      cursor = app.db.cursor()
+
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+
+      limit = max(1, min(request.args.get('limit', 20, type=int), srs.MAX_DUE_LIMIT))
+      include_new = request.args.get('new', '1') != '0'
+      words = srs.due_words(cursor, id, limit, include_new=include_new)
+      # due_words may have synced the group's schedule rows or moved its watermark
+      app.db.commit()
+
+      return jsonify({
+        'group_id': id,
+        'items': [{
+          "id": word["id"],
+          "french": word["french"],
+          "english": word["english"],
+          "due_at": word["due_at"],
+          "interval_days": word["interval_days"],
+          "ease": word["ease"],
+          "repetitions": word["repetitions"],
+          "lapses": word["lapses"],
+          "last_reviewed_at": word["last_reviewed_at"],
+          "new": word["due_at"] is None
+        } for word in words],
+        'limit': limit
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # GET /groups/:id/quiz?n=20&choices=4&direction=fr-en: n multiple-choice
+  # questions on random words of the group, the wrong answers picked from the
+  # precomputed confusable words (see lib/quiz.py). The prompt is in the first
+  # language of direction, the choices in the second; answer is the index of
+  # the right choice. Pass seed=N to get the same quiz again.
+  @app.route('/groups/<int:id>/quiz', methods=['GET'])
+  @cross_origin()
+  def get_group_quiz(id):
+    try:
+      count, choices, direction = quiz.parse_options(request.args)
+      seed = request.args.get('seed', type=int)
+      cursor = app.db.cursor()
+
+      cursor.execute('SELECT id FROM groups WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Group not found"}), 404
+
+      questions = quiz.build_quiz(
+        cursor, id, count,
+        choices=choices,
+        direction=direction,
+        rng=random.Random(seed) if seed is not None else random
+      )
+      return jsonify({
+        "group_id": id,
+        "direction": direction,
+        "questions": questions
+      })
+    except quiz.QuizError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
@@ -0,0 +1,124 @@
+from flask import jsonify, Response
+from flask_cors import cross_origin
+
+def load(app):
+  # Endpoint: GET /metrics in Prometheus text format: per-endpoint request and SQL
+  # counters and histograms, plus connection pool and response cache gauges
+  @app.route('/metrics', methods=['GET'])
+  @cross_origin()
+  def get_metrics():
+    try:
+      lines = []
+      if app.db.profiler is not None:
+        lines.extend(app.db.profiler.metrics_lines())
+      pool = app.db.pool_stats()
+      for name in ['size', 'idle', 'in_use', 'checkouts', 'checkouts_waited', 'timeouts']:
+        lines.append(f'lang_portal_db_pool_{name} {pool[name]}')
+      lines.append(f'lang_portal_db_pool_wait_seconds_total {pool["wait_ms_total"] / 1000:.6f}')
+      cache = app.cache.stats()
+      for name in ['hits', 'misses', 'not_modified', 'entries', 'data_version', 'external_writes']:
+        lines.append(f'lang_portal_response_cache_{name} {cache[name]}')
+      if app.db.shards is not None:
+        shards = app.db.shards.stats()
+        for name in ['open_shards', 'shards_opened', 'evictions', 'connections']:
+          lines.append(f'lang_portal_learner_{name} {shards[name]}')
+      if app.db.snapshots is not None:
+        snapshot = app.db.snapshots.stats()
+        if snapshot['age_seconds'] is not None:
+          lines.append(f'lang_portal_snapshot_age_seconds {snapshot["age_seconds"]}')
+        for name in ['refreshes', 'failures', 'checkouts', 'fallbacks']:
+          lines.append(f'lang_portal_snapshot_{name} {snapshot[name]}')
+      if app.reviews_buffer is not None:
+        buffer = app.reviews_buffer.stats()
+        for name in ['pending_items', 'last_seq', 'flushed_seq', 'flushes', 'flushed_items', 'failures', 'dead_letters']:
+          lines.append(f'lang_portal_review_buffer_{name} {buffer[name]}')
+      events = app.events.stats()
+      for name in ['subscribers', 'published', 'resumed', 'resyncs']:
+        lines.append(f'lang_portal_events_{name} {events[name]}')
+      if app.distractors is not None:
+        distractors = app.distractors.stats()
+        for name in ['indexed_words', 'runs', 'words_indexed', 'failures']:
+          lines.append(f'lang_portal_quiz_index_{name} {distractors[name]}')
+      return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/db-pool with connection pool usage and checkout wait times
+  @app.route('/metrics/db-pool', methods=['GET'])
+  @cross_origin()
+  def get_db_pool_stats():
+    try:
+      return jsonify(app.db.pool_stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/shards with open learner shards and LRU evictions
+  @app.route('/metrics/shards', methods=['GET'])
+  @cross_origin()
+  def get_shard_stats():
+    try:
+      if app.db.shards is None:
+        return jsonify({"error": "Learner shards are not enabled"}), 404
+      return jsonify(app.db.shards.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/snapshot with the read snapshot's age, refreshes and fallbacks
+  @app.route('/metrics/snapshot', methods=['GET'])
+  @cross_origin()
+  def get_snapshot_stats():
+    try:
+      if app.db.snapshots is None:
+        return jsonify({"error": "Read snapshots are not enabled"}), 404
+      return jsonify(app.db.snapshots.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/review-buffer with queued answers, flush sizes and the flushed sequence number
+  @app.route('/metrics/review-buffer', methods=['GET'])
+  @cross_origin()
+  def get_review_buffer_stats():
+    try:
+      if app.reviews_buffer is None:
+        return jsonify({"error": "Write-behind is not enabled"}), 404
+      return jsonify(app.reviews_buffer.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/quiz-index with the words held by the background distractor indexer and its runs
+  @app.route('/metrics/quiz-index', methods=['GET'])
+  @cross_origin()
+  def get_quiz_index_stats():
+    try:
+      if app.distractors is None:
+        return jsonify({"error": "Background quiz indexing is not enabled"}), 404
+      return jsonify(app.distractors.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/cache-upkeep with the background refreshes of sort keys and group counters
+  @app.route('/metrics/cache-upkeep', methods=['GET'])
+  @cross_origin()
+  def get_cache_upkeep_stats():
+    try:
+      return jsonify(app.upkeep.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/response-cache with hit/miss/304 counters and the current data version
+  @app.route('/metrics/response-cache', methods=['GET'])
+  @cross_origin()
+  def get_response_cache_stats():
+    try:
+      return jsonify(app.cache.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /metrics/events with open GET /events streams and the resume buffer
+  @app.route('/metrics/events', methods=['GET'])
+  @cross_origin()
+  def get_event_stats():
+    try:
+      return jsonify(app.events.stats())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
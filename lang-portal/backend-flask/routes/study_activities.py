@@ -1,10 +1,15 @@
-from flask import jsonify, request
+from flask import g, jsonify, request
 from flask_cors import cross_origin
 import math
 
+from lib import sessions
+from lib.pagination import InvalidCursor, decode_cursor, seek_clause, next_page, wants_total
+from routes.study_sessions import format_sessions
+
 def load(app):
     @app.route('/api/study-activities', methods=['GET'])
     @cross_origin()
+    @app.cache.cached
     def get_study_activities():
         cursor = app.db.cursor()
         cursor.execute('SELECT id, name, url, preview_url FROM study_activities')
@@ -19,6 +24,7 @@ def load(app):
 
     @app.route('/api/study-activities/<int:id>', methods=['GET'])
     @cross_origin()
+    @app.cache.cached
     def get_study_activity(id):
         cursor = app.db.cursor()
         cursor.execute('SELECT id, name, url, preview_url FROM study_activities WHERE id = ?', (id,))
@@ -36,6 +42,7 @@ def load(app):
 
     @app.route('/api/study-activities/<int:id>/sessions', methods=['GET'])
     @cross_origin()
+    @app.db.from_snapshot
     def get_study_activity_sessions(id):
         cursor = app.db.cursor()
         
@@ -49,53 +56,92 @@ def load(app):
         per_page = request.args.get('per_page', 10, type=int)
         offset = (page - 1) * per_page
 
+        # Newest first by default, any key of sessions.SORT_COLUMNS is index-backed
+        sort_column = sessions.sort_column(request.args.get('sort_by'), constant='activity_name')
+        order = sessions.sort_order(request.args.get('order', 'desc'))
+
+        after = request.args.get('after')
+        if after is not None:
+            try:
+                return get_study_activity_sessions_after(cursor, id, after, per_page, sort_column, order)
+            except InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+
         # Get total count
         cursor.execute('''
             SELECT COUNT(*) as count 
-            FROM study_sessions ss
-            JOIN groups g ON g.id = ss.group_id
-            WHERE ss.study_activity_id = ?
+            FROM study_session_summary
+            WHERE study_activity_id = ?
         ''', (id,))
         total_count = cursor.fetchone()['count']
 
-        # Get paginated sessions
-        cursor.execute('''
+        # Get paginated sessions, the summary already holds the review counts
+        cursor.execute(f'''
             SELECT 
-                ss.id,
-                ss.group_id,
-                g.name as group_name,
-                sa.name as activity_name,
-                ss.created_at,
-                ss.study_activity_id as activity_id,
-                COUNT(wri.id) as review_items_count
-            FROM study_sessions ss
-            JOIN groups g ON g.id = ss.group_id
-            JOIN study_activities sa ON sa.id = ss.study_activity_id
-            LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-            WHERE ss.study_activity_id = ?
-            GROUP BY ss.id, ss.group_id, g.name, sa.name, ss.created_at, ss.study_activity_id
-            ORDER BY ss.created_at DESC
+                study_session_id as id,
+                group_id,
+                group_name,
+                activity_name,
+                created_at,
+                end_time,
+                study_activity_id as activity_id,
+                review_count as review_items_count
+            FROM study_session_summary
+            WHERE study_activity_id = ?
+            ORDER BY {sort_column} {order}, study_session_id {order}
             LIMIT ? OFFSET ?
         ''', (id, per_page, offset))
-        sessions = cursor.fetchall()
+        rows = cursor.fetchall()
 
         return jsonify({
-            'items': [{
-                'id': session['id'],
-                'group_id': session['group_id'],
-                'group_name': session['group_name'],
-                'activity_id': session['activity_id'],
-                'activity_name': session['activity_name'],
-                'start_time': session['created_at'],
-                'end_time': session['created_at'],  # For now, just use the same time since we don't track end time
-                'review_items_count': session['review_items_count']
-            } for session in sessions],
+            'items': format_sessions(rows),
             'total': total_count,
             'page': page,
             'per_page': per_page,
             'total_pages': math.ceil(total_count / per_page)
         })
 
+    # Keyset variant of GET /api/study-activities/:id/sessions
+    def get_study_activity_sessions_after(cursor, id, after, per_page, sort_column, order):
+        seek = decode_cursor(after, sort_column, order)
+        where = 'study_activity_id = ?'
+        params = [id]
+        if seek is not None:
+            where += ' AND ' + seek_clause(sort_column, 'study_session_id', order)
+            params.extend(seek)
+
+        cursor.execute(f'''
+            SELECT 
+                study_session_id as id,
+                group_id,
+                group_name,
+                activity_name,
+                created_at,
+                end_time,
+                study_activity_id as activity_id,
+                review_count as review_items_count,
+                {sort_column} as sort_value
+            FROM study_session_summary
+            WHERE {where}
+            ORDER BY {sort_column} {order}, study_session_id {order}
+            LIMIT ?
+        ''', (*params, per_page + 1))
+        rows, next_cursor = next_page(cursor.fetchall(), per_page, sort_column, order)
+
+        result = {
+            'items': format_sessions(rows),
+            'next_cursor': next_cursor,
+            'per_page': per_page
+        }
+        if wants_total(request.args):
+            result['total'] = app.counts.get(
+                ('activity_sessions', g.get('learner_id'), id),
+                lambda: cursor.execute(
+                    'SELECT COUNT(*) FROM study_session_summary WHERE study_activity_id = ?', (id,)
+                ).fetchone()[0]
+            )
+        return jsonify(result)
+
     @app.route('/api/study-activities/<int:id>/launch', methods=['GET'])
     @cross_origin()
     def get_study_activity_launch_data(id):
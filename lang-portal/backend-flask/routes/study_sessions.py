@@ -1,9 +1,36 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
-from datetime import datetime
 import math
 
+from lib import events, partitions, reviews, sessions, srs, stats
+from lib.writebehind import BufferFull, wait_for_slot
+from lib.pagination import InvalidCursor, decode_cursor, seek_clause, next_page, wants_total
+from lib.serialization import rows_to_dicts
+
+SESSION_COLUMNS = (
+  'id', 'group_id', 'group_name', 'activity_id', 'activity_name',
+  'created_at', 'end_time', 'review_items_count'
+)
+SESSION_FIELDS = (
+  'id', 'group_id', 'group_name', 'activity_id', 'activity_name',
+  'start_time', 'end_time', 'review_items_count'
+)
+
+# Longest wait GET /study_sessions/barrier accepts, in seconds
+MAX_BARRIER_TIMEOUT = 30.0
+
+def format_sessions(sessions):
+  return rows_to_dicts(sessions, SESSION_COLUMNS, SESSION_FIELDS)
+
 def load(app):
+  # Push a committed write to the learner's GET /events streams, followed by
+  # the dashboard stats it changed when anyone is listening
+  def publish(type, data, with_stats=True):
+    scope = g.get('learner_id')
+    app.events.publish(type, data, scope)
+    if with_stats and app.events.has_subscribers(scope):
+      app.events.publish('stats', events.dashboard_stats(app.db.cursor(), app.db.shared_schema()), scope)
+
   # todo /study_sessions POST
   @app.route('/study_sessions', methods=['POST'])
   @cross_origin()
@@ -31,22 +58,33 @@ def load(app):
       study_activity = cursor.fetchone()
       if not study_activity:
         return jsonify({"error": "Study activity not found"}), 404
-      # Insert the study session
+      # Insert the study session, in UTC like the review times
+      created_at = stats.utc_timestamp()
       cursor.execute('''
         INSERT INTO study_sessions (group_id, study_activity_id, created_at)
         VALUES (?, ?, ?)
-      ''', (group_id, study_activity_id, datetime.now()))
-      
-      app.db.commit()
+      ''', (group_id, study_activity_id, created_at))
       
       # Get the id of the newly created session
       session_id = cursor.lastrowid
+
+      sessions.record_session(cursor, session_id)
+      stats.record_session(cursor, group_id, created_at)
+      app.db.commit()
+      app.cache.bump()
+      publish('session_started', {
+        "id": session_id,
+        "group_id": group_id,
+        "study_activity_id": study_activity_id,
+        "created_at": created_at
+      })
       return jsonify({"session_id": session_id}), 201
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
   @app.route('/api/study-sessions', methods=['GET'])
   @cross_origin()
+  @app.db.from_snapshot
   def get_study_sessions():
     try:
       cursor = app.db.cursor()
@@ -56,56 +94,89 @@ def load(app):
       per_page = request.args.get('per_page', 10, type=int)
       offset = (page - 1) * per_page
 
+      # Newest first by default, any key of sessions.SORT_COLUMNS is index-backed
+      sort_column = sessions.sort_column(request.args.get('sort_by'))
+      order = sessions.sort_order(request.args.get('order', 'desc'))
+
+      after = request.args.get('after')
+      if after is not None:
+        return get_study_sessions_after(cursor, after, per_page, sort_column, order)
+
       # Get total count
-      cursor.execute('''
-        SELECT COUNT(*) as count 
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
-      ''')
+      cursor.execute('SELECT COUNT(*) as count FROM study_session_summary')
       total_count = cursor.fetchone()['count']
 
-      # Get paginated sessions
-      cursor.execute('''
+      # Get paginated sessions, the summary already holds the review counts
+      cursor.execute(f'''
         SELECT 
-          ss.id,
-          ss.group_id,
-          g.name as group_name,
-          sa.id as activity_id,
-          sa.name as activity_name,
-          ss.created_at,
-          COUNT(wri.id) as review_items_count
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-        GROUP BY ss.id
-        ORDER BY ss.created_at DESC
+          study_session_id as id,
+          group_id,
+          group_name,
+          study_activity_id as activity_id,
+          activity_name,
+          created_at,
+          end_time,
+          review_count as review_items_count
+        FROM study_session_summary
+        ORDER BY {sort_column} {order}, study_session_id {order}
         LIMIT ? OFFSET ?
       ''', (per_page, offset))
-      sessions = cursor.fetchall()
+      rows = cursor.fetchall()
 
       return jsonify({
-        'items': [{
-          'id': session['id'],
-          'group_id': session['group_id'],
-          'group_name': session['group_name'],
-          'activity_id': session['activity_id'],
-          'activity_name': session['activity_name'],
-          'start_time': session['created_at'],
-          'end_time': session['created_at'],  # For now, just use the same time since we don't track end time
-          'review_items_count': session['review_items_count']
-        } for session in sessions],
+        'items': format_sessions(rows),
         'total': total_count,
         'page': page,
         'per_page': per_page,
         'total_pages': math.ceil(total_count / per_page)
       })
+    except InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  # Keyset variant of GET /api/study-sessions
+  def get_study_sessions_after(cursor, after, per_page, sort_column, order):
+    seek = decode_cursor(after, sort_column, order)
+    where = ''
+    params = []
+    if seek is not None:
+      where = 'WHERE ' + seek_clause(sort_column, 'study_session_id', order)
+      params.extend(seek)
+
+    cursor.execute(f'''
+      SELECT 
+        study_session_id as id,
+        group_id,
+        group_name,
+        study_activity_id as activity_id,
+        activity_name,
+        created_at,
+        end_time,
+        review_count as review_items_count,
+        {sort_column} as sort_value
+      FROM study_session_summary
+      {where}
+      ORDER BY {sort_column} {order}, study_session_id {order}
+      LIMIT ?
+    ''', (*params, per_page + 1))
+    rows, next_cursor = next_page(cursor.fetchall(), per_page, sort_column, order)
+
+    result = {
+      'items': format_sessions(rows),
+      'next_cursor': next_cursor,
+      'per_page': per_page
+    }
+    if wants_total(request.args):
+      result['total'] = app.counts.get(
+        (g.get('learner_id'), 'study_sessions'),
+        lambda: cursor.execute('SELECT COUNT(*) FROM study_session_summary').fetchone()[0]
+      )
+    return jsonify(result)
+
   @app.route('/api/study-sessions/<id>', methods=['GET'])
   @cross_origin()
+  @app.db.from_snapshot
   def get_study_session(id):
     try:
       cursor = app.db.cursor()
@@ -113,19 +184,16 @@ def load(app):
       # Get session details
       cursor.execute('''
         SELECT 
-          ss.id,
-          ss.group_id,
-          g.name as group_name,
-          sa.id as activity_id,
-          sa.name as activity_name,
-          ss.created_at,
-          COUNT(wri.id) as review_items_count
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-        WHERE ss.id = ?
-        GROUP BY ss.id
+          study_session_id as id,
+          group_id,
+          group_name,
+          study_activity_id as activity_id,
+          activity_name,
+          created_at,
+          end_time,
+          review_count as review_items_count
+        FROM study_session_summary
+        WHERE study_session_id = ?
       ''', (id,))
       
       session = cursor.fetchone()
@@ -171,7 +239,7 @@ def load(app):
           'activity_id': session['activity_id'],
           'activity_name': session['activity_name'],
           'start_time': session['created_at'],
-          'end_time': session['created_at'],  # For now, just use the same time
+          'end_time': session['end_time'],
           'review_items_count': session['review_items_count']
         },
         'words': [{
@@ -204,51 +272,126 @@ def load(app):
     if not cursor.fetchone():
         return jsonify({"error": "Word not found"}), 404
     # Check if study session exists
-    cursor.execute('SELECT id FROM study_sessions WHERE id = ?', (id,))
-    if not cursor.fetchone():
+    cursor.execute('SELECT id, group_id FROM study_sessions WHERE id = ?', (id,))
+    session = cursor.fetchone()
+    if not session:
         return jsonify({"error": "Study session not found"}), 404
-    # Insert the individual review attempt into word_review_items
-    cursor.execute('''
-        INSERT INTO word_review_items (word_id, correct, study_session_id) VALUES (?, ?, ?)
-    ''', (word_id, correct, id))
-    
-    # Update or insert aggregate review record in word_reviews
-    cursor.execute('''
-        SELECT * FROM word_reviews WHERE word_id = ?
-    ''', (word_id,))
-    review = cursor.fetchone()
-    if review:
-        # Update existing record
-        if correct:
-            cursor.execute('''
-           UPDATE word_reviews SET correct_count = correct_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-        else:
-            cursor.execute('''
-                UPDATE word_reviews SET wrong_count = wrong_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
-            VALUES (?, ?, ?, ?)
-        ''', (word_id, 1 if correct else 0, 0 if correct else 1, datetime.now()))
+    items = [(word_id, bool(correct), stats.utc_timestamp())]
+    if app.reviews_buffer is not None:
+        return queue_reviews(session, items)
+    # Insert the review attempt, update the word_reviews aggregate and the rollups
+    reviews.log_reviews(cursor, session, items)
     app.db.commit()
+    app.cache.bump()
+    publish('reviews', events.review_counts(session, items))
     return jsonify({"message": "Review logged successfully"})
 
+  # Write-behind mode: journal the answers and return before they are committed
+  def queue_reviews(session, items):
+    try:
+      seq = app.reviews_buffer.enqueue(session, items, g.get('learner_id'))
+    except BufferFull as e:
+      return jsonify({"error": str(e)}), 503
+    except reviews.ReviewError as e:
+      return jsonify({"error": str(e)}), e.status
+    # Stats follow from the flusher, see app.py
+    publish('reviews', dict(events.review_counts(session, items), seq=seq), with_stats=False)
+    return jsonify({
+      "message": "Reviews queued",
+      "count": len(items),
+      "seq": seq,
+      "slot": app.reviews_buffer.slot
+    }), 202
+
+  # GET /study_sessions/barrier?seq=N&slot=K&timeout=S waits (at most S seconds,
+  # default 5) until the queued answers up to sequence number N of journal slot
+  # K are committed, so a client can read its own writes. 200 once they are, 202
+  # if still queued at the timeout. Slots of other worker processes are polled
+  # in the database.
+  @app.route('/study_sessions/barrier', methods=['GET'])
+  @cross_origin()
+  def wait_for_reviews():
+    try:
+      buffer = app.reviews_buffer
+      timeout = max(0.0, min(request.args.get('timeout', 5.0, type=float), MAX_BARRIER_TIMEOUT))
+      slot = request.args.get('slot', buffer.slot if buffer is not None else None, type=int)
+      if slot is None:
+        return jsonify({"seq": 0, "flushed_seq": 0, "flushed": True})
+      if buffer is not None and slot == buffer.slot:
+        seq = request.args.get('seq', buffer.last_seq, type=int)
+        flushed = buffer.wait(seq, timeout)
+        flushed_seq = buffer.flushed_seq
+      else:
+        seq = request.args.get('seq', 0, type=int)
+        flushed, flushed_seq = wait_for_slot(app.db, slot, seq, timeout)
+      return jsonify({
+        "seq": seq,
+        "slot": slot,
+        "flushed_seq": flushed_seq,
+        "flushed": flushed
+      }), 200 if flushed else 202
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # POST /study_sessions/:id/reviews with an array of {word_id, correct, answered_at}
+  # logs a whole round of answers in a single transaction. correct must be a
+  # boolean and answered_at (optional, ISO 8601) within the last 90 days.
+  @app.route('/study_sessions/<id>/reviews', methods=['POST'])
+  @cross_origin()
+  def log_reviews(id):
+    try:
+      items = reviews.parse_reviews(request.get_json(silent=True))
+
+      cursor = app.db.cursor()
+      # Check if study session exists
+      cursor.execute('SELECT id, group_id FROM study_sessions WHERE id = ?', (id,))
+      session = cursor.fetchone()
+      if not session:
+        return jsonify({"error": "Study session not found"}), 404
+      # Check all words exist with one query
+      missing = reviews.missing_word_ids(cursor, [word_id for word_id, _, _ in items])
+      if missing:
+        return jsonify({"error": "Word not found", "word_ids": missing}), 404
+
+      if app.reviews_buffer is not None:
+        return queue_reviews(session, items)
+      reviews.log_reviews(cursor, session, items)
+      app.db.commit()
+      app.cache.bump()
+      publish('reviews', events.review_counts(session, items))
+      return jsonify({"message": "Reviews logged successfully", "count": len(items)}), 201
+    except reviews.ReviewError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
   @app.route('/api/study-sessions/reset', methods=['POST'])
   @cross_origin()
   def reset_study_sessions():
     try:
+      # Queued answers belong to the history being cleared, commit them first
+      if app.reviews_buffer is not None and not app.reviews_buffer.drain(MAX_BARRIER_TIMEOUT):
+        return jsonify({"error": "Queued reviews are still being written, try again shortly"}), 503
+
       cursor = app.db.cursor()
       
-      # First delete all word review items since they have foreign key constraints
-      cursor.execute('DELETE FROM word_review_items')
+      # Take the review item partitions out of word_review_items instead of
+      # deleting their rows, archive-reviews drops them later
+      partitions.detach_all(cursor)
       
-      # Then delete all study sessions
+      # Then delete all study sessions, and the summaries, schedules and rollups
+      # derived from them. Unlike the review items these are still deleted, so
+      # the reset grows with the number of sessions, studied words and days
+      # (not answers); the tables have no triggers, so SQLite truncates them
+      # page by page rather than row by row.
       cursor.execute('DELETE FROM study_sessions')
+      sessions.reset(cursor)
+      srs.reset(cursor)
+      stats.reset(cursor)
       
       app.db.commit()
+      app.cache.bump()
+      publish('history_reset', {})
       
       return jsonify({"message": "Study history cleared successfully"}), 200
     except Exception as e:
@@ -0,0 +1,51 @@
+from flask import request, jsonify, g
+from flask_cors import cross_origin
+
+from lib import events, sync
+
+def load(app):
+  # Endpoint: GET /sync?since=<token> returns what changed since token: the
+  # created or edited words and groups, group memberships and the learner's
+  # review aggregates, each at its current value, plus the ids of the ones
+  # deleted. Without since it returns everything. Keep calling with the
+  # returned token while has_more is true; reset means the token was from
+  # another database and the client should drop what it kept before applying.
+  # Optional: limit (change log entries per page, default 500, max 2000).
+  @app.route('/sync', methods=['GET'])
+  @cross_origin()
+  def get_changes():
+    try:
+      limit = min(max(request.args.get('limit', 500, type=int), 1), sync.MAX_CHANGES)
+      return jsonify(sync.read_changes(app.db.cursor(), app.db.shared_schema(), request.args.get('since'), limit))
+    except sync.SyncError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: POST /sync uploads the reviews answered offline, e.g.
+  # {"reviews": [{"id": "3f2c...", "session_id": 1, "word_id": 2, "correct": true, "answered_at": "2025-03-01T10:00:00Z"}]}
+  # id is generated by the client, so a batch can be retried after a lost
+  # response without counting its reviews twice (for RECEIPT_DAYS). Sessions
+  # are created online with POST /study_sessions.
+  @app.route('/sync', methods=['POST'])
+  @cross_origin()
+  def upload_reviews():
+    try:
+      items = sync.parse_reviews(request.get_json(silent=True))
+      cursor = app.db.cursor()
+      # Logged directly even with WRITE_BEHIND, so that the receipts are
+      # committed with the reviews they stand for
+      result, logged = sync.log_reviews(cursor, items)
+      app.db.commit()
+      if logged:
+        app.cache.bump()
+        scope = g.get('learner_id')
+        for session, session_items in logged.items():
+          app.events.publish('reviews', events.review_counts(session, session_items), scope)
+        if app.events.has_subscribers(scope):
+          app.events.publish('stats', events.dashboard_stats(cursor, app.db.shared_schema()), scope)
+      return jsonify(result)
+    except sync.SyncError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
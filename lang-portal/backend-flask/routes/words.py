@@ -2,14 +2,60 @@ from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
 
+from lib import batch, importer, search, sortkeys
+from lib.pagination import InvalidCursor, decode_cursor, seek_clause, next_page, wants_total
+from lib.serialization import rows_to_dicts
+
+# Column expressions behind each sortable field, usable in WHERE as well as ORDER BY.
+# Each one is backed by an index whose last column is the word id.
+WORD_SORT_EXPRESSIONS = {
+  'french': 'w.french',
+  'english': 'w.english',
+  'correct_count': 'k.correct_count',
+  'wrong_count': 'k.wrong_count',
+  'accuracy': 'k.accuracy',
+  'last_reviewed': 'k.last_reviewed'
+}
+
+WORD_COLUMNS = ('id', 'french', 'english', 'correct_count', 'wrong_count')
+# GET /words and GET /groups/:id/words also return the other sortable columns
+WORD_LIST_COLUMNS = WORD_COLUMNS + ('accuracy', 'last_reviewed')
+
+# Select list of the word listings over words w and word_sort_keys k
+WORD_LIST_SELECT = '''
+  w.id, w.french, w.english,
+  COALESCE(k.correct_count, 0) AS correct_count,
+  COALESCE(k.wrong_count, 0) AS wrong_count,
+  COALESCE(k.accuracy, 0.0) AS accuracy,
+  NULLIF(k.last_reviewed, '') AS last_reviewed
+'''
+
+def format_words(words, columns=WORD_COLUMNS):
+  return rows_to_dicts(words, columns)
+
+# FROM clause of the word listings and the id column to break ties on: the sort
+# keys drive review column sorts (computed on the fly while they don't cover
+# every word, see sortkeys.words_covered()), words drives the text sorts
+def word_list_source(sort_by, covered=True):
+  if sort_by in sortkeys.REVIEW_SORT_COLUMNS:
+    keys = 'word_sort_keys' if covered else sortkeys.LIVE_WORD_SORT_KEYS
+    return f'{keys} k JOIN words w ON w.id = k.word_id', 'k.word_id'
+  return 'words w LEFT JOIN word_sort_keys k ON k.word_id = w.id', 'w.id'
+
 def load(app):
   # Endpoint: GET /words with pagination (50 words per page)
+  # Pass ?after=<cursor> (empty for the first page) to use keyset pagination instead of page/offset,
+  # or ?ids=1,2,3 to fetch those words (with their groups) in one query
   @app.route('/words', methods=['GET'])
   @cross_origin()
   def get_words():
     try:
       cursor = app.db.cursor()
 
+      ids = request.args.get('ids')
+      if ids is not None:
+        return get_words_by_ids(cursor, batch.parse_ids(ids))
+
       # Get the current page number from query parameters (default is 1)
       page = int(request.args.get('page', 1))
       # Ensure page number is positive
@@ -22,20 +68,30 @@ def load(app):
       order = request.args.get('order', 'asc')  # Default to ascending order
 
       # Validate sort_by and order
-      valid_columns = ['french', 'english', 'correct_count', 'wrong_count']
+      valid_columns = ['french', 'english', 'correct_count', 'wrong_count', 'accuracy', 'last_reviewed']
       if sort_by not in valid_columns:
         sort_by = 'french'
       if order not in ['asc', 'desc']:
         order = 'asc'
 
+      # Words added since the sort keys were last caught up are sorted on their
+      # live values meanwhile, see lib/upkeep.py
+      covered = True
+      if sort_by in sortkeys.REVIEW_SORT_COLUMNS and not sortkeys.words_covered(cursor):
+        covered = False
+        app.upkeep.notify(g.get('learner_id'))
+
+      after = request.args.get('after')
+      if after is not None:
+        return get_words_after(cursor, after, sort_by, order, words_per_page, covered)
+
       # Query to fetch words with sorting
+      sort_expr = WORD_SORT_EXPRESSIONS[sort_by]
+      source, id_expr = word_list_source(sort_by, covered)
       cursor.execute(f'''
-        SELECT w.id, w.french, w.english, 
-            COALESCE(r.correct_count, 0) AS correct_count,
-            COALESCE(r.wrong_count, 0) AS wrong_count
-        FROM words w
-        LEFT JOIN word_reviews r ON w.id = r.word_id
-        ORDER BY {sort_by} {order}
+        SELECT {WORD_LIST_SELECT}
+        FROM {source}
+        ORDER BY {sort_expr} {order}, {id_expr} {order}
         LIMIT ? OFFSET ?
       ''', (words_per_page, offset))
 
@@ -46,32 +102,127 @@ def load(app):
       total_words = cursor.fetchone()[0]
       total_pages = (total_words + words_per_page - 1) // words_per_page
 
-      # Format the response
-      words_data = []
-      for word in words:
-        words_data.append({
-          "id": word["id"],
-          "french": word["french"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"]
-        })
-
       return jsonify({
-        "words": words_data,
+        "words": format_words(words, WORD_LIST_COLUMNS),
         "total_pages": total_pages,
         "current_page": page,
         "total_words": total_words
       })
 
+    except InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
+    except batch.BatchError as e:
+      return jsonify({"error": str(e)}), e.status
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Multi-get variant of GET /words: the words in the order asked for, each with
+  # its groups like GET /words/:id, and the ids that don't exist
+  def get_words_by_ids(cursor, word_ids):
+    ids = json.dumps(word_ids)
+    cursor.execute(f'''
+      SELECT {WORD_LIST_SELECT}
+      FROM json_each(?) AS requested
+      JOIN words w ON w.id = requested.value
+      LEFT JOIN word_sort_keys k ON k.word_id = w.id
+      ORDER BY requested.key
+    ''', (ids,))
+    words = format_words(cursor.fetchall(), WORD_LIST_COLUMNS)
+
+    cursor.execute('''
+      SELECT DISTINCT wg.word_id, g.id, g.name
+      FROM word_groups wg
+      JOIN groups g ON g.id = wg.group_id
+      WHERE wg.word_id IN (SELECT value FROM json_each(?))
+      ORDER BY wg.word_id, g.id
+    ''', (ids,))
+    groups = {}
+    for row in cursor.fetchall():
+      groups.setdefault(row['word_id'], []).append({"id": row['id'], "name": row['name']})
+    for word in words:
+      word["groups"] = groups.get(word["id"], [])
+
+    found = {word["id"] for word in words}
+    return jsonify({
+      "words": words,
+      "missing_ids": [word_id for word_id in word_ids if word_id not in found]
+    })
+
+  # Keyset variant of GET /words: seeks past (sort value, id) of the last row served
+  def get_words_after(cursor, after, sort_by, order, words_per_page, covered=True):
+    sort_expr = WORD_SORT_EXPRESSIONS[sort_by]
+    source, id_expr = word_list_source(sort_by, covered)
+    seek = decode_cursor(after, sort_by, order)
+    where = ''
+    params = []
+    if seek is not None:
+      where = 'WHERE ' + seek_clause(sort_expr, id_expr, order)
+      params.extend(seek)
+
+    cursor.execute(f'''
+      SELECT {WORD_LIST_SELECT}, {sort_expr} AS sort_value
+      FROM {source}
+      {where}
+      ORDER BY {sort_expr} {order}, {id_expr} {order}
+      LIMIT ?
+    ''', (*params, words_per_page + 1))
+    words, next_cursor = next_page(cursor.fetchall(), words_per_page, sort_by, order)
+
+    result = {
+      "words": format_words(words, WORD_LIST_COLUMNS),
+      "next_cursor": next_cursor,
+      "per_page": words_per_page
+    }
+    if wants_total(request.args):
+      result["total_words"] = app.counts.get(
+        'words',
+        lambda: cursor.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+      )
+    return jsonify(result)
+
+  # Endpoint: GET /words/search?q=<text> accent-insensitive full-text search, best matches first
+  # Optional: field=french|english to search one column, limit (default 20, max 100),
+  # mode=autocomplete to skip bm25 ranking and return the first matches in id order
+  @app.route('/words/search', methods=['GET'])
+  @cross_origin()
+  @app.cache.cached
+  def search_words():
+    try:
+      query = search.fts_query(request.args.get('q', ''), request.args.get('field'))
+      if query is None:
+        return jsonify({"error": "q is required"}), 400
+      limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+      autocomplete = request.args.get('mode') == 'autocomplete'
+
+      cursor = app.db.cursor()
+      # Ranking scores every match; autocomplete only walks the first `limit` hits
+      order = 'rowid' if autocomplete else 'rank'
+      cursor.execute(f'''
+        SELECT w.id, w.french, w.english,
+               COALESCE(r.correct_count, 0) AS correct_count,
+               COALESCE(r.wrong_count, 0) AS wrong_count
+        FROM (
+          SELECT rowid AS word_id, {order} AS position FROM words_fts
+          WHERE words_fts MATCH ?
+          ORDER BY {order}
+          LIMIT ?
+        ) AS f
+        JOIN words w ON w.id = f.word_id
+        LEFT JOIN word_reviews r ON r.word_id = w.id
+        ORDER BY f.position
+      ''', (query, limit))
+
+      return jsonify({
+        "words": format_words(cursor.fetchall()),
+        "query": request.args.get('q')
+      })
     except Exception as e:
       return jsonify({"error": str(e)}), 500
-    finally:
-      app.db.close()
 
   # Endpoint: GET /words/:id to get a single word with its details
   @app.route('/words/<int:word_id>', methods=['GET'])
   @cross_origin()
+  @app.cache.cached
   def get_word(word_id):
     try:
       cursor = app.db.cursor()
@@ -117,4 +268,36 @@ def load(app):
       })
       
     except Exception as e:
-      return jsonify({"error": str(e)}), 500
\ No newline at end of file
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: POST /words/import with a multipart `file` (JSON array, NDJSON or CSV)
+  # and optional `group_name` and `format` form fields
+  @app.route('/words/import', methods=['POST'])
+  @cross_origin()
+  def import_words():
+    try:
+      # Learner shards only attach the vocabulary read-only
+      if g.get('learner_id') is not None:
+        return jsonify({"error": f"The vocabulary is shared, import without the {app.config['LEARNER_HEADER']} header"}), 403
+
+      upload = request.files.get('file')
+      if upload is None:
+        return jsonify({"error": "file is required"}), 400
+      format = request.form.get('format') or importer.detect_format(upload.filename)
+      if format not in importer.FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(importer.FORMATS)}"}), 400
+
+      result = importer.import_stream(
+        app.db.get(),
+        importer.text_stream(upload.stream),
+        format=format,
+        group_name=request.form.get('group_name')
+      )
+      app.cache.bump()
+      if app.distractors is not None:
+        app.distractors.notify()
+      return jsonify(result), 201
+    except importer.ImportFormatError as e:
+      return jsonify({"error": str(e)}), 400
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
@@ -0,0 +1,139 @@
+-- Schema of a learner shard (see lib/shards.py): the tables of sql/migrations
+-- that hold one learner's study history and the rollups derived from it.
+-- The shared vocabulary (words, groups, word_groups, words_fts,
+-- study_activities) is attached read-only from the shared database as "vocab",
+-- and unqualified names resolve to it because no table here shadows them.
+-- Triggers can't reach attached tables, so the ones on shared tables
+-- (summary names, schedule links) only exist in the shared database.
+-- Keep in step with sql/migrations when a learner table changes.
+
+CREATE TABLE IF NOT EXISTS study_sessions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  group_id INTEGER NOT NULL,  -- The group of words being studied
+  study_activity_id INTEGER NOT NULL,  -- The activity performed
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP  -- Timestamp of the session
+);
+
+CREATE TABLE IF NOT EXISTS word_review_items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  study_session_id INTEGER NOT NULL,  -- Link to study session
+  correct BOOLEAN NOT NULL,  -- Whether the answer was correct (true) or wrong (false)
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the review
+  FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+);
+
+CREATE TABLE IF NOT EXISTS word_reviews (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  correct_count INTEGER DEFAULT 0,
+  wrong_count INTEGER DEFAULT 0,
+  last_reviewed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS word_stats (
+  word_id INTEGER PRIMARY KEY,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS daily_activity (
+  activity_date TEXT NOT NULL,  -- YYYY-MM-DD
+  group_id INTEGER NOT NULL,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (activity_date, group_id)
+);
+
+CREATE TABLE IF NOT EXISTS daily_totals (
+  activity_date TEXT PRIMARY KEY,  -- YYYY-MM-DD
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS study_streak (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  current_streak INTEGER NOT NULL DEFAULT 0,
+  longest_streak INTEGER NOT NULL DEFAULT 0,
+  streak_start TEXT,
+  last_study_date TEXT
+);
+
+INSERT OR IGNORE INTO study_streak (id) VALUES (1);
+
+-- total_vocabulary is read from the shared database, see stats.read_totals()
+CREATE TABLE IF NOT EXISTS stats_totals (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  total_vocabulary INTEGER NOT NULL DEFAULT 0,
+  total_words_studied INTEGER NOT NULL DEFAULT 0,
+  mastered_words INTEGER NOT NULL DEFAULT 0,
+  total_attempts INTEGER NOT NULL DEFAULT 0,
+  total_correct INTEGER NOT NULL DEFAULT 0,
+  total_sessions INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO stats_totals (id) VALUES (1);
+
+CREATE TABLE IF NOT EXISTS study_session_summary (
+  study_session_id INTEGER PRIMARY KEY,
+  group_id INTEGER NOT NULL,
+  study_activity_id INTEGER NOT NULL,
+  group_name TEXT NOT NULL,
+  activity_name TEXT NOT NULL,
+  created_at DATETIME NOT NULL,
+  review_count INTEGER NOT NULL DEFAULT 0,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  first_activity_time DATETIME,
+  last_activity_time DATETIME,
+  end_time DATETIME NOT NULL,  -- last_activity_time, or created_at + 30 minutes without reviews
+  FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+);
+
+CREATE TABLE IF NOT EXISTS word_schedule (
+  word_id INTEGER PRIMARY KEY,
+  repetitions INTEGER NOT NULL DEFAULT 0,  -- Correct answers in a row
+  lapses INTEGER NOT NULL DEFAULT 0,  -- Times the word was forgotten after being learned
+  interval_days REAL NOT NULL DEFAULT 0,
+  ease REAL NOT NULL DEFAULT 2.5,
+  due_at DATETIME,
+  last_reviewed_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS group_word_schedule (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  due_at DATETIME,
+  PRIMARY KEY (group_id, word_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS group_new_words (
+  group_id INTEGER PRIMARY KEY,
+  next_word_id INTEGER NOT NULL
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_word_reviews_word_id ON word_reviews(word_id);
+CREATE INDEX IF NOT EXISTS idx_word_review_items_session ON word_review_items(study_session_id, word_id, correct);
+CREATE INDEX IF NOT EXISTS idx_word_review_items_word ON word_review_items(word_id);
+CREATE INDEX IF NOT EXISTS idx_word_review_items_created_at ON word_review_items(created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_created_at ON study_sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_group_created_at ON study_sessions(group_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_activity_created_at ON study_sessions(study_activity_id, created_at);
+
+CREATE INDEX IF NOT EXISTS idx_session_summary_created_at ON study_session_summary(created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_end_time ON study_session_summary(end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_review_count ON study_session_summary(review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_name ON study_session_summary(activity_name);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_name ON study_session_summary(group_name);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_created_at ON study_session_summary(group_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_end_time ON study_session_summary(group_id, end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_review_count ON study_session_summary(group_id, review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_activity_name ON study_session_summary(group_id, activity_name);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_created_at ON study_session_summary(study_activity_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_end_time ON study_session_summary(study_activity_id, end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_review_count ON study_session_summary(study_activity_id, review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_group_name ON study_session_summary(study_activity_id, group_name);
+
+CREATE INDEX IF NOT EXISTS idx_group_word_schedule_due ON group_word_schedule(group_id, due_at, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_schedule_word ON group_word_schedule(word_id);
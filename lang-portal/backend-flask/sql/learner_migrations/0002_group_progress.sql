@@ -0,0 +1,8 @@
+-- Per-learner reviewed/mastered counts per group, see 0015_group_counters.sql
+-- of the shared migrations. members_version refers to vocab.groups.
+CREATE TABLE IF NOT EXISTS group_progress (
+  group_id INTEGER PRIMARY KEY,
+  members_version INTEGER NOT NULL,
+  reviewed_count INTEGER NOT NULL DEFAULT 0,
+  mastered_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
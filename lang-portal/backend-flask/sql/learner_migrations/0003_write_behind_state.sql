@@ -0,0 +1,8 @@
+-- Journal sequence number flushed into this shard, see
+-- 0017_write_behind_state.sql of the shared migrations.
+CREATE TABLE IF NOT EXISTS write_behind_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  flushed_seq INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO write_behind_state (id, flushed_seq) VALUES (1, 0);
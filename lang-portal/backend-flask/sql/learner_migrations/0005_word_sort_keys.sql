@@ -0,0 +1,55 @@
+-- Sortable review columns of a learner's words, see 0019_word_sort_keys.sql of
+-- the shared migrations. Filled on first use (sortkeys.ensure_words) rather
+-- than here, so a learner who never sorts by a review column never pays for a
+-- row per word.
+--
+-- One row per word: words with an id below word_sort_coverage.next_word_id are
+-- all present (zeros and an empty last_reviewed until first reviewed).
+CREATE TABLE IF NOT EXISTS word_sort_keys (
+  word_id INTEGER PRIMARY KEY,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  wrong_count INTEGER NOT NULL DEFAULT 0,
+  accuracy REAL NOT NULL DEFAULT 0,
+  last_reviewed TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS word_sort_coverage (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  next_word_id INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO word_sort_coverage (id, next_word_id) VALUES (1, 0);
+
+-- The word id (the rowid) is the implicit last column of each index
+CREATE INDEX IF NOT EXISTS idx_word_sort_keys_correct_count ON word_sort_keys(correct_count);
+CREATE INDEX IF NOT EXISTS idx_word_sort_keys_wrong_count ON word_sort_keys(wrong_count);
+CREATE INDEX IF NOT EXISTS idx_word_sort_keys_accuracy ON word_sort_keys(accuracy);
+CREATE INDEX IF NOT EXISTS idx_word_sort_keys_last_reviewed ON word_sort_keys(last_reviewed);
+
+-- The same per group member, with the word's text for the french/english sorts.
+-- A group is (re)built when it is listed at a new groups.members_version.
+CREATE TABLE IF NOT EXISTS group_word_sort_keys (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  french TEXT NOT NULL,
+  english TEXT NOT NULL,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  wrong_count INTEGER NOT NULL DEFAULT 0,
+  accuracy REAL NOT NULL DEFAULT 0,
+  last_reviewed TEXT NOT NULL DEFAULT '',
+  PRIMARY KEY (group_id, word_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS group_sort_versions (
+  group_id INTEGER PRIMARY KEY,
+  members_version INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_french ON group_word_sort_keys(group_id, french, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_english ON group_word_sort_keys(group_id, english, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_correct_count ON group_word_sort_keys(group_id, correct_count, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_wrong_count ON group_word_sort_keys(group_id, wrong_count, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_accuracy ON group_word_sort_keys(group_id, accuracy, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_last_reviewed ON group_word_sort_keys(group_id, last_reviewed, word_id);
+-- Review writes update every group row of a word
+CREATE INDEX IF NOT EXISTS idx_group_word_sort_keys_word ON group_word_sort_keys(word_id);
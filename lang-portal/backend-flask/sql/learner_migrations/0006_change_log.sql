@@ -0,0 +1,57 @@
+-- Change log for GET /sync, see sql/migrations/0023_change_log.sql. A shard
+-- only logs its word review aggregates; words, groups and members are read
+-- from the log of the shared database.
+
+CREATE TABLE IF NOT EXISTS change_log (
+  entity TEXT NOT NULL,  -- review
+  entity_id INTEGER NOT NULL,  -- word id
+  word_id INTEGER NOT NULL DEFAULT 0,
+  seq INTEGER NOT NULL,
+  deleted INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (entity, entity_id, word_id)
+) WITHOUT ROWID;
+
+-- Sync tokens carry the epoch, so clients of a recreated database start over
+CREATE TABLE IF NOT EXISTS sync_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  epoch TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO sync_state (id, epoch) VALUES (1, lower(hex(randomblob(8))));
+
+-- Client ids of the reviews received by POST /sync, so a retried batch is not
+-- logged twice
+CREATE TABLE IF NOT EXISTS sync_receipts (
+  client_id TEXT PRIMARY KEY,
+  received_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO change_log (entity, entity_id, word_id, seq)
+SELECT 'review', word_id, 0, (SELECT COALESCE(MAX(seq), 0) FROM change_log) + ROW_NUMBER() OVER (ORDER BY word_id)
+FROM word_reviews;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_seq ON change_log(seq);
+
+CREATE INDEX IF NOT EXISTS idx_sync_receipts_received_at ON sync_receipts(received_at);
+
+-- See the shared migration for why DELETE then INSERT
+CREATE TRIGGER IF NOT EXISTS change_log_review_insert AFTER INSERT ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = new.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', new.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_review_update AFTER UPDATE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = new.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', new.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_review_delete AFTER DELETE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = old.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', old.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 1);
+END;
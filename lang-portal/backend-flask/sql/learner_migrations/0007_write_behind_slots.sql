@@ -0,0 +1,13 @@
+-- One write_behind_state row per journal slot, see
+-- 0024_write_behind_slots.sql of the shared migrations.
+CREATE TABLE IF NOT EXISTS write_behind_slots (
+  id INTEGER PRIMARY KEY CHECK (id >= 1),
+  flushed_seq INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO write_behind_slots (id, flushed_seq)
+SELECT id, flushed_seq FROM write_behind_state;
+
+DROP TABLE IF EXISTS write_behind_state;
+
+ALTER TABLE write_behind_slots RENAME TO write_behind_state;
@@ -0,0 +1,3 @@
+-- Membership version of a group's schedule rows and watermark, see
+-- 0026_group_new_words_version.sql of the shared migrations.
+ALTER TABLE group_new_words ADD COLUMN members_version INTEGER;
@@ -0,0 +1,100 @@
+-- Baseline schema: the tables previously created by Db.setup_tables
+
+CREATE TABLE IF NOT EXISTS words (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  french TEXT NOT NULL,
+  english TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS word_reviews (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  correct_count INTEGER DEFAULT 0,
+  wrong_count INTEGER DEFAULT 0,
+  last_reviewed TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+CREATE TABLE IF NOT EXISTS word_review_items (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  word_id INTEGER NOT NULL,
+  study_session_id INTEGER NOT NULL,  -- Link to study session
+  correct BOOLEAN NOT NULL,  -- Whether the answer was correct (true) or wrong (false)
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the review
+  FOREIGN KEY (word_id) REFERENCES words(id),
+  FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+);
+
+CREATE TABLE IF NOT EXISTS groups (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,
+  words_count INTEGER DEFAULT 0  -- Counter cache for the number of words in the group
+);
+
+CREATE TABLE IF NOT EXISTS word_groups (
+  word_id INTEGER NOT NULL,
+  group_id INTEGER NOT NULL,
+  FOREIGN KEY (word_id) REFERENCES words(id),
+  FOREIGN KEY (group_id) REFERENCES groups(id)
+);
+
+CREATE TABLE IF NOT EXISTS study_activities (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  name TEXT NOT NULL,  -- Name of the activity (e.g., "Flashcards", "Quiz")
+  url TEXT NOT NULL,  -- The full url of the study activity
+  preview_url TEXT    -- The url to the preview image for the activity
+);
+
+CREATE TABLE IF NOT EXISTS study_sessions (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  group_id INTEGER NOT NULL,  -- The group of words being studied
+  study_activity_id INTEGER NOT NULL,  -- The activity performed
+  created_at DATETIME DEFAULT CURRENT_TIMESTAMP,  -- Timestamp of the session
+  FOREIGN KEY (group_id) REFERENCES groups(id),
+  FOREIGN KEY (study_activity_id) REFERENCES study_activities(id)
+);
+
+-- Rollups maintained by lib/stats.py in the same transaction as every review/session write
+
+-- Per-word review counters (the mastered/studied word figures are derived from these)
+CREATE TABLE IF NOT EXISTS word_stats (
+  word_id INTEGER PRIMARY KEY,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+-- Sessions and reviews per day and group
+CREATE TABLE IF NOT EXISTS daily_activity (
+  activity_date TEXT NOT NULL,  -- YYYY-MM-DD
+  group_id INTEGER NOT NULL,
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (activity_date, group_id),
+  FOREIGN KEY (group_id) REFERENCES groups(id)
+);
+
+-- Global totals, a single row with id = 1
+CREATE TABLE IF NOT EXISTS stats_totals (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  total_vocabulary INTEGER NOT NULL DEFAULT 0,
+  total_words_studied INTEGER NOT NULL DEFAULT 0,
+  mastered_words INTEGER NOT NULL DEFAULT 0,
+  total_attempts INTEGER NOT NULL DEFAULT 0,
+  total_correct INTEGER NOT NULL DEFAULT 0,
+  total_sessions INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO stats_totals (id, total_vocabulary) VALUES (1, (SELECT COUNT(*) FROM words));
+
+-- Vocabulary size follows every insert/delete on words, whichever code path does it
+CREATE TRIGGER IF NOT EXISTS words_vocabulary_insert AFTER INSERT ON words
+BEGIN
+  UPDATE stats_totals SET total_vocabulary = total_vocabulary + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_vocabulary_delete AFTER DELETE ON words
+BEGIN
+  UPDATE stats_totals SET total_vocabulary = total_vocabulary - 1 WHERE id = 1;
+END;
@@ -0,0 +1,37 @@
+-- Indexes for the queries in routes/*.py. Each CREATE INDEX is built in its own
+-- transaction (see lib/migrations.py) so writers are only held up one index at a time.
+-- Every index implicitly ends in the rowid, so (column) also serves seeks on (column, id).
+
+-- Merge duplicate word_reviews rows left by the old check-then-insert write path,
+-- keeping the lowest id, before enforcing one row per word
+UPDATE word_reviews AS wr SET
+  correct_count = agg.correct_count,
+  wrong_count = agg.wrong_count,
+  last_reviewed = agg.last_reviewed
+FROM (
+  SELECT MIN(id) AS id, SUM(correct_count) AS correct_count, SUM(wrong_count) AS wrong_count, MAX(last_reviewed) AS last_reviewed
+  FROM word_reviews
+  GROUP BY word_id
+  HAVING COUNT(*) > 1
+) AS agg
+WHERE wr.id = agg.id;
+
+DELETE FROM word_reviews WHERE id NOT IN (SELECT MIN(id) FROM word_reviews GROUP BY word_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_word_reviews_word_id ON word_reviews(word_id);
+
+-- Covers the per-session counts (COUNT(*), correct) and the session -> words join
+CREATE INDEX IF NOT EXISTS idx_word_review_items_session ON word_review_items(study_session_id, word_id, correct);
+CREATE INDEX IF NOT EXISTS idx_word_review_items_word ON word_review_items(word_id);
+
+CREATE INDEX IF NOT EXISTS idx_word_groups_group_word ON word_groups(group_id, word_id);
+CREATE INDEX IF NOT EXISTS idx_word_groups_word ON word_groups(word_id, group_id);
+
+CREATE INDEX IF NOT EXISTS idx_words_french ON words(french);
+CREATE INDEX IF NOT EXISTS idx_words_english ON words(english);
+
+CREATE INDEX IF NOT EXISTS idx_study_sessions_created_at ON study_sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_group_created_at ON study_sessions(group_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_activity_created_at ON study_sessions(study_activity_id, created_at);
+
+ANALYZE;
@@ -0,0 +1,50 @@
+# Databases created before the rollup tables existed already have review
+# history; recompute the rollups from it. The SQL is the rollup rebuild for
+# the schema at this version (a word is mastered after 5 attempts with 80%
+# correct), not lib/stats.py, whose tables change in later migrations.
+# Every statement replaces what it fills, so running this again is harmless.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM word_stats')
+  conn.execute('''
+    INSERT INTO word_stats (word_id, attempts, correct)
+    SELECT wri.word_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    GROUP BY wri.word_id
+  ''')
+
+  conn.execute('DELETE FROM daily_activity')
+  conn.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, sessions)
+    SELECT date(created_at), group_id, COUNT(*)
+    FROM study_sessions
+    GROUP BY date(created_at), group_id
+  ''')
+  conn.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, reviews, correct)
+    SELECT date(wri.created_at), ss.group_id, COUNT(*), SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END)
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    WHERE true
+    GROUP BY date(wri.created_at), ss.group_id
+    ON CONFLICT (activity_date, group_id) DO UPDATE SET
+      reviews = excluded.reviews,
+      correct = excluded.correct
+  ''')
+
+  conn.execute('''
+    INSERT OR REPLACE INTO stats_totals (
+      id, total_vocabulary, total_words_studied, mastered_words,
+      total_attempts, total_correct, total_sessions
+    )
+    SELECT
+      1,
+      (SELECT COUNT(*) FROM words),
+      (SELECT COUNT(*) FROM word_stats),
+      (SELECT COUNT(*) FROM word_stats WHERE attempts >= 5 AND correct >= 0.8 * attempts),
+      (SELECT COALESCE(SUM(attempts), 0) FROM word_stats),
+      (SELECT COALESCE(SUM(correct), 0) FROM word_stats),
+      (SELECT COUNT(*) FROM study_sessions)
+  ''')
+  conn.commit()
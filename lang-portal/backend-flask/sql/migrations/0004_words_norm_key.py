@@ -0,0 +1,22 @@
+import unicodedata
+
+from lib import migrations
+
+# Normalized french|english key the importer deduplicates on, computed as
+# lib/importer.py did at this version rather than through it: accent, case
+# and whitespace insensitive, e.g. "  Se Réveiller" -> "se reveiller"
+def normalize(text):
+  decomposed = unicodedata.normalize('NFKD', text)
+  stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+  return ' '.join(stripped.casefold().split())
+
+def norm_key(french, english):
+  return normalize(french) + '|' + normalize(english)
+
+def up(conn):
+  conn.create_function('word_norm_key', 2, norm_key, deterministic=True)
+  conn.execute('BEGIN')
+  migrations.add_column(conn, 'words', 'norm_key', 'TEXT')
+  conn.execute('UPDATE words SET norm_key = word_norm_key(french, english) WHERE norm_key IS NULL')
+  conn.commit()
+  conn.execute('CREATE INDEX IF NOT EXISTS idx_words_norm_key ON words(norm_key)')
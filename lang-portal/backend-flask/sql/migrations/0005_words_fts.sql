@@ -0,0 +1,31 @@
+-- Full-text index over words for GET /words/search.
+-- External content table (the text lives only in words), remove_diacritics folds
+-- accents so "eleve" matches "élève", and prefix indexes make "rev*" a direct lookup.
+CREATE VIRTUAL TABLE IF NOT EXISTS words_fts USING fts5(
+  french,
+  english,
+  content='words',
+  content_rowid='id',
+  tokenize='unicode61 remove_diacritics 2',
+  prefix='1 2 3'
+);
+
+-- Keep the index in sync with every write to words, whichever code path does it
+CREATE TRIGGER IF NOT EXISTS words_fts_insert AFTER INSERT ON words
+BEGIN
+  INSERT INTO words_fts (rowid, french, english) VALUES (new.id, new.french, new.english);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_fts_delete AFTER DELETE ON words
+BEGIN
+  INSERT INTO words_fts (words_fts, rowid, french, english) VALUES ('delete', old.id, old.french, old.english);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_fts_update AFTER UPDATE OF french, english ON words
+BEGIN
+  INSERT INTO words_fts (words_fts, rowid, french, english) VALUES ('delete', old.id, old.french, old.english);
+  INSERT INTO words_fts (rowid, french, english) VALUES (new.id, new.french, new.english);
+END;
+
+-- Index the words that already exist
+INSERT INTO words_fts (words_fts) VALUES ('rebuild');
@@ -0,0 +1,2 @@
+-- Incremental exports (GET /export/review_items?since=) range-scan on created_at
+CREATE INDEX IF NOT EXISTS idx_word_review_items_created_at ON word_review_items(created_at);
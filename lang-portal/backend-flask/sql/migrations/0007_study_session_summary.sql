@@ -0,0 +1,49 @@
+-- One row per study session with its review aggregates, maintained by
+-- lib/sessions.py in the same transaction as every session/review write, so the
+-- session listings read a single row per session instead of aggregating
+-- word_review_items. Group and activity names are copied in so every sort key
+-- of the listings can be served from an index on this table alone.
+CREATE TABLE IF NOT EXISTS study_session_summary (
+  study_session_id INTEGER PRIMARY KEY,
+  group_id INTEGER NOT NULL,
+  study_activity_id INTEGER NOT NULL,
+  group_name TEXT NOT NULL,
+  activity_name TEXT NOT NULL,
+  created_at DATETIME NOT NULL,
+  review_count INTEGER NOT NULL DEFAULT 0,
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  first_activity_time DATETIME,
+  last_activity_time DATETIME,
+  end_time DATETIME NOT NULL,  -- last_activity_time, or created_at + 30 minutes without reviews
+  FOREIGN KEY (study_session_id) REFERENCES study_sessions(id)
+);
+
+-- Keep the copied names in sync with renames, whichever code path does them
+CREATE TRIGGER IF NOT EXISTS study_session_summary_group_name AFTER UPDATE OF name ON groups
+BEGIN
+  UPDATE study_session_summary SET group_name = new.name WHERE group_id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_session_summary_activity_name AFTER UPDATE OF name ON study_activities
+BEGIN
+  UPDATE study_session_summary SET activity_name = new.name WHERE study_activity_id = new.id;
+END;
+
+-- Sorting for GET /api/study-sessions, on every key of lib/sessions.SORT_COLUMNS
+CREATE INDEX IF NOT EXISTS idx_session_summary_created_at ON study_session_summary(created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_end_time ON study_session_summary(end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_review_count ON study_session_summary(review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_name ON study_session_summary(activity_name);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_name ON study_session_summary(group_name);
+
+-- GET /groups/:id/study_sessions (the group name is constant there)
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_created_at ON study_session_summary(group_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_end_time ON study_session_summary(group_id, end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_review_count ON study_session_summary(group_id, review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_group_activity_name ON study_session_summary(group_id, activity_name);
+
+-- GET /api/study-activities/:id/sessions (the activity name is constant there)
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_created_at ON study_session_summary(study_activity_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_end_time ON study_session_summary(study_activity_id, end_time);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_review_count ON study_session_summary(study_activity_id, review_count);
+CREATE INDEX IF NOT EXISTS idx_session_summary_activity_group_name ON study_session_summary(study_activity_id, group_name);
@@ -0,0 +1,34 @@
+# Summaries for the sessions recorded before study_session_summary existed,
+# with the SQL for the schema at this version rather than lib/sessions.py
+# (sessions without reviews last 30 minutes). Rows are replaced whole, so
+# running this again is harmless. end_time compares created_at with review
+# times, which are UTC: created_at is UTC too, converted for older sessions by
+# 0025_session_times_utc.py.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM study_session_summary')
+  conn.execute('''
+    INSERT INTO study_session_summary (
+      study_session_id, group_id, study_activity_id, group_name, activity_name, created_at,
+      review_count, correct_count, first_activity_time, last_activity_time, end_time
+    )
+    SELECT
+      ss.id,
+      ss.group_id,
+      ss.study_activity_id,
+      g.name,
+      sa.name,
+      ss.created_at,
+      COUNT(wri.id),
+      COALESCE(SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END), 0),
+      MIN(wri.created_at),
+      MAX(wri.created_at),
+      COALESCE(MAX(wri.created_at), datetime(ss.created_at, '+30 minutes'))
+    FROM study_sessions ss
+    JOIN groups g ON g.id = ss.group_id
+    JOIN study_activities sa ON sa.id = ss.study_activity_id
+    LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
+    GROUP BY ss.id
+  ''')
+  conn.commit()
+  conn.execute('ANALYZE study_session_summary')
@@ -0,0 +1,56 @@
+-- Spaced-repetition state per word, updated by lib/srs.py in the same
+-- transaction as every review write. due_at is NULL for words never reviewed.
+CREATE TABLE IF NOT EXISTS word_schedule (
+  word_id INTEGER PRIMARY KEY,
+  repetitions INTEGER NOT NULL DEFAULT 0,  -- Correct answers in a row
+  lapses INTEGER NOT NULL DEFAULT 0,  -- Times the word was forgotten after being learned
+  interval_days REAL NOT NULL DEFAULT 0,
+  ease REAL NOT NULL DEFAULT 2.5,
+  due_at DATETIME,
+  last_reviewed_at DATETIME,
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+-- due_at copied to every group the word is in, so the due queue of a group is a
+-- range scan of (group_id, due_at) however large the group is. Maintained by the
+-- triggers below for every write to word_groups and word_schedule.
+CREATE TABLE IF NOT EXISTS group_word_schedule (
+  group_id INTEGER NOT NULL,
+  word_id INTEGER NOT NULL,
+  due_at DATETIME,
+  PRIMARY KEY (group_id, word_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_group_word_schedule_due ON group_word_schedule(group_id, due_at, word_id);
+CREATE INDEX IF NOT EXISTS idx_group_word_schedule_word ON group_word_schedule(word_id);
+
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_link AFTER INSERT ON word_groups
+BEGIN
+  INSERT OR IGNORE INTO group_word_schedule (group_id, word_id, due_at)
+  VALUES (new.group_id, new.word_id, (SELECT due_at FROM word_schedule WHERE word_id = new.word_id));
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_unlink AFTER DELETE ON word_groups
+WHEN NOT EXISTS (SELECT 1 FROM word_groups WHERE group_id = old.group_id AND word_id = old.word_id)
+BEGIN
+  DELETE FROM group_word_schedule WHERE group_id = old.group_id AND word_id = old.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_insert AFTER INSERT ON word_schedule
+BEGIN
+  UPDATE group_word_schedule SET due_at = new.due_at WHERE word_id = new.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_update AFTER UPDATE OF due_at ON word_schedule
+BEGIN
+  UPDATE group_word_schedule SET due_at = new.due_at WHERE word_id = new.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_delete AFTER DELETE ON word_schedule
+BEGIN
+  UPDATE group_word_schedule SET due_at = NULL WHERE word_id = old.word_id;
+END;
+
+-- Every existing membership, the schedules themselves are backfilled by 0010
+INSERT OR IGNORE INTO group_word_schedule (group_id, word_id)
+SELECT group_id, word_id FROM word_groups;
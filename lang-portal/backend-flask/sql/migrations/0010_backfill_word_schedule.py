@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+# Replay the review history of databases created before word_schedule existed,
+# with SM-2 as it stood at this version: a correct answer is graded 4 and a
+# wrong one 1, intervals of 1 and 6 days then times the ease (capped at 100
+# years), a forgotten word is due again after 10 minutes. lib/srs.py is not
+# used, as its tables change in later migrations; the word_schedule triggers
+# of 0009 copy every due_at to group_word_schedule. Running this again
+# replays the same history.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM word_schedule')
+  history = conn.execute('''
+    SELECT word_id, correct, created_at
+    FROM word_review_items
+    ORDER BY word_id, created_at, id
+  ''')
+
+  states = {}
+  for word_id, correct, created_at in history:
+    repetitions, lapses, interval_days, ease, _, _ = states.get(word_id, (0, 0, 0.0, 2.5, None, None))
+    reviewed_at = datetime.fromisoformat(str(created_at)).replace(tzinfo=None)
+    grade = 4 if correct else 1
+    ease = max(1.3, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    if correct:
+      lapses_after = lapses
+      repetitions += 1
+      if repetitions == 1:
+        interval_days = 1
+      elif repetitions == 2:
+        interval_days = 6
+      else:
+        interval_days = min(36500, round(interval_days * ease, 2))
+      due_at = reviewed_at + timedelta(days=interval_days)
+    else:
+      lapses_after = lapses + (1 if repetitions > 0 else 0)
+      repetitions = 0
+      interval_days = 0.0
+      due_at = reviewed_at + timedelta(minutes=10)
+    states[word_id] = (
+      repetitions, lapses_after, interval_days, round(ease, 4),
+      due_at.strftime('%Y-%m-%d %H:%M:%S'), reviewed_at.strftime('%Y-%m-%d %H:%M:%S')
+    )
+
+  conn.executemany('''
+    INSERT INTO word_schedule (word_id, repetitions, lapses, interval_days, ease, due_at, last_reviewed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+  ''', [(word_id,) + state for word_id, state in states.items()])
+  conn.commit()
+  conn.execute('ANALYZE group_word_schedule')
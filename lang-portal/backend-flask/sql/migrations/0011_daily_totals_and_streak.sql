@@ -0,0 +1,22 @@
+-- Rollups maintained by lib/stats.py for the streak and heatmap endpoints
+
+-- daily_activity summed over groups, one row per day with any activity
+CREATE TABLE IF NOT EXISTS daily_totals (
+  activity_date TEXT PRIMARY KEY,  -- YYYY-MM-DD
+  sessions INTEGER NOT NULL DEFAULT 0,
+  reviews INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+-- Runs of consecutive days with at least one study session, a single row with id = 1.
+-- current_streak is the run ending on last_study_date; it is only still current
+-- if last_study_date is today or yesterday, which readers check.
+CREATE TABLE IF NOT EXISTS study_streak (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  current_streak INTEGER NOT NULL DEFAULT 0,
+  longest_streak INTEGER NOT NULL DEFAULT 0,
+  streak_start TEXT,
+  last_study_date TEXT
+);
+
+INSERT OR IGNORE INTO study_streak (id) VALUES (1);
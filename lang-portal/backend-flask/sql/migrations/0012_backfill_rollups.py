@@ -0,0 +1,32 @@
+from datetime import date, timedelta
+
+# daily_totals and study_streak for the history already in daily_activity,
+# which 0003 filled and review writes have kept since. Self-contained for the
+# schema at this version rather than lib/stats.py, whose tables change in
+# later migrations. Both are replaced whole, so running this again is harmless.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM daily_totals')
+  conn.execute('''
+    INSERT INTO daily_totals (activity_date, sessions, reviews, correct)
+    SELECT activity_date, SUM(sessions), SUM(reviews), SUM(correct)
+    FROM daily_activity
+    GROUP BY activity_date
+  ''')
+
+  current = longest = 0
+  start = previous = None
+  for (activity_date,) in conn.execute('SELECT activity_date FROM daily_totals WHERE sessions > 0 ORDER BY activity_date'):
+    day = date.fromisoformat(activity_date)
+    if previous is not None and day - previous == timedelta(days=1):
+      current += 1
+    else:
+      current = 1
+      start = day
+    longest = max(longest, current)
+    previous = day
+  conn.execute('''
+    INSERT OR REPLACE INTO study_streak (id, current_streak, longest_streak, streak_start, last_study_date)
+    VALUES (1, ?, ?, ?, ?)
+  ''', (current, longest, start.isoformat() if start else None, previous.isoformat() if previous else None))
+  conn.commit()
@@ -0,0 +1,27 @@
+-- group_word_schedule now only holds scheduled words and is kept in sync by
+-- lib/srs.py rather than by triggers on word_schedule, so the same code runs
+-- on learner shards, where word_groups lives in the attached shared database
+-- and triggers can't reach it. Never-reviewed words are found through
+-- word_groups, starting from a per-group watermark in group_new_words.
+DROP TRIGGER IF EXISTS group_word_schedule_insert;
+DROP TRIGGER IF EXISTS group_word_schedule_update;
+DROP TRIGGER IF EXISTS group_word_schedule_delete;
+
+DELETE FROM group_word_schedule WHERE due_at IS NULL;
+
+-- Every word of the group with an id below next_word_id has a schedule
+CREATE TABLE IF NOT EXISTS group_new_words (
+  group_id INTEGER PRIMARY KEY,
+  next_word_id INTEGER NOT NULL
+);
+
+-- Linking an already scheduled word copies its due_at, linking a word below the
+-- watermark moves the watermark back
+DROP TRIGGER IF EXISTS group_word_schedule_link;
+CREATE TRIGGER IF NOT EXISTS group_word_schedule_link AFTER INSERT ON word_groups
+BEGIN
+  INSERT OR IGNORE INTO group_word_schedule (group_id, word_id, due_at)
+  SELECT new.group_id, word_id, due_at FROM word_schedule WHERE word_id = new.word_id;
+  UPDATE group_new_words SET next_word_id = new.word_id
+  WHERE group_id = new.group_id AND next_word_id > new.word_id;
+END;
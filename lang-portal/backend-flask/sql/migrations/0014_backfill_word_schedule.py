@@ -0,0 +1,14 @@
+# 0013 dropped the word_schedule triggers; copy every schedule's due_at to the
+# groups its word is in once more, as lib/srs.py now does on every review, so
+# group_word_schedule starts out exact. Plain SQL for the schema at this
+# version; rows are replaced, so running this again is harmless.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('''
+    INSERT OR REPLACE INTO group_word_schedule (group_id, word_id, due_at)
+    SELECT wg.group_id, s.word_id, s.due_at
+    FROM word_schedule s
+    JOIN word_groups wg ON wg.word_id = s.word_id
+  ''')
+  conn.commit()
+  conn.execute('ANALYZE group_word_schedule')
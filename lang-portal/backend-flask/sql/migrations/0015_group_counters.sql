@@ -0,0 +1,28 @@
+-- groups.words_count was only recomputed at the end of an import; keep it in
+-- step with every insert into and delete from word_groups instead.
+-- members_version changes with every membership change, so per-learner caches
+-- derived from word_groups (group_progress) can tell when they are stale.
+ALTER TABLE groups ADD COLUMN members_version INTEGER NOT NULL DEFAULT 0;
+
+UPDATE groups SET words_count = (SELECT COUNT(*) FROM word_groups WHERE group_id = groups.id);
+
+CREATE TRIGGER IF NOT EXISTS groups_words_count_insert AFTER INSERT ON word_groups
+BEGIN
+  UPDATE groups SET words_count = words_count + 1, members_version = members_version + 1
+  WHERE id = new.group_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_words_count_delete AFTER DELETE ON word_groups
+BEGIN
+  UPDATE groups SET words_count = words_count - 1, members_version = members_version + 1
+  WHERE id = old.group_id;
+END;
+
+-- Reviewed and mastered words per group, kept by lib/stats.py on review writes.
+-- A row computed at an older members_version is recomputed before it is read.
+CREATE TABLE IF NOT EXISTS group_progress (
+  group_id INTEGER PRIMARY KEY,
+  members_version INTEGER NOT NULL,
+  reviewed_count INTEGER NOT NULL DEFAULT 0,
+  mastered_count INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
@@ -0,0 +1,16 @@
+# Compute group_progress for every group from word_stats (mastered: 5
+# attempts with 80% correct), with the SQL for the schema at this version
+# rather than lib/stats.py. Groups are otherwise computed on their first read;
+# rows are replaced whole, so running this again is harmless.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('''
+    INSERT OR REPLACE INTO group_progress (group_id, members_version, reviewed_count, mastered_count)
+    SELECT g.id, g.members_version, COUNT(ws.word_id),
+      COALESCE(SUM(ws.attempts >= 5 AND ws.correct >= 0.8 * ws.attempts), 0)
+    FROM groups g
+    LEFT JOIN word_groups wg ON wg.group_id = g.id
+    LEFT JOIN word_stats ws ON ws.word_id = wg.word_id
+    GROUP BY g.id
+  ''')
+  conn.commit()
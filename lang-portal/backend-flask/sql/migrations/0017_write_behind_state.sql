@@ -0,0 +1,9 @@
+-- Highest journal sequence number of lib/writebehind.py committed to this
+-- database. Written in the same transaction as the reviews it covers, so a
+-- journal replayed after a crash skips what was already flushed.
+CREATE TABLE IF NOT EXISTS write_behind_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  flushed_seq INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO write_behind_state (id, flushed_seq) VALUES (1, 0);
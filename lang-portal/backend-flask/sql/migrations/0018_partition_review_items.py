@@ -0,0 +1,107 @@
+import re
+import time
+from datetime import datetime, timezone
+
+# Split word_review_items into monthly partition tables (word_review_items_p<id>,
+# listed in review_partitions) behind a view of the same name, with the SQL for
+# the schema at this version rather than lib/partitions.py. Rows are moved one
+# month per transaction and keep their ids, so an interrupted run simply
+# continues.
+MONTH = re.compile(r'^\d{4}-\d{2}$')
+COLUMNS = 'id, word_id, study_session_id, correct, created_at'
+
+def partition_table(partition_id):
+  return f'word_review_items_p{int(partition_id)}'
+
+# Id of the hot partition of month, its table created if missing
+def ensure_partition(cursor, month):
+  cursor.execute("INSERT OR IGNORE INTO review_partitions (month, state) VALUES (?, 'hot')", (month,))
+  created = cursor.rowcount > 0
+  cursor.execute("SELECT id FROM review_partitions WHERE month = ? AND state = 'hot'", (month,))
+  partition_id = cursor.fetchone()[0]
+  if created:
+    table = partition_table(partition_id)
+    cursor.execute(f'''
+      CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        word_id INTEGER NOT NULL,
+        study_session_id INTEGER NOT NULL,
+        correct BOOLEAN NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+      )
+    ''')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_session ON {table}(study_session_id, word_id, correct)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_word ON {table}(word_id)')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)')
+  return partition_id
+
+# The word_review_items view: a UNION ALL of the hot partitions
+def create_view(cursor):
+  cursor.execute("SELECT id FROM review_partitions WHERE state = 'hot' ORDER BY month")
+  tables = [partition_table(row[0]) for row in cursor.fetchall()]
+  cursor.execute('DROP VIEW IF EXISTS main.word_review_items')
+  cursor.execute('CREATE VIEW main.word_review_items AS ' + '\nUNION ALL\n'.join(
+    f'SELECT {COLUMNS} FROM {table}' for table in tables
+  ))
+
+def current_month():
+  return datetime.now(timezone.utc).strftime('%Y-%m')
+
+def up(conn):
+  conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_partitions (
+      id INTEGER PRIMARY KEY AUTOINCREMENT,
+      month TEXT NOT NULL,
+      state TEXT NOT NULL DEFAULT 'hot' CHECK (state IN ('hot', 'detached', 'archived')),
+      row_count INTEGER,
+      archive_path TEXT,
+      created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+      detached_at DATETIME,
+      archived_at DATETIME
+    )
+  ''')
+  conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_review_partitions_hot_month ON review_partitions(month) WHERE state = 'hot'")
+  conn.execute('CREATE TABLE IF NOT EXISTS review_item_sequence (id INTEGER PRIMARY KEY CHECK (id = 1), last_id INTEGER NOT NULL)')
+  if conn.in_transaction:
+    conn.commit()
+
+  kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'word_review_items'").fetchone()
+  if kind is not None and kind[0] == 'view':
+    return
+  if kind is None:
+    conn.execute('BEGIN')
+    conn.execute('INSERT OR IGNORE INTO review_item_sequence (id, last_id) VALUES (1, 0)')
+    ensure_partition(conn.cursor(), current_month())
+    create_view(conn.cursor())
+    conn.commit()
+    return
+
+  months = [row[0] for row in conn.execute('SELECT DISTINCT substr(created_at, 1, 7) FROM word_review_items ORDER BY 1')]
+  for month in months:
+    started = time.perf_counter()
+    conn.execute('BEGIN')
+    cursor = conn.cursor()
+    # Rows with a missing or malformed created_at go to the '0000-00' partition
+    valid = month is not None and MONTH.match(month) is not None
+    table = partition_table(ensure_partition(cursor, month if valid else '0000-00'))
+    condition = 'substr(created_at, 1, 7) = ?' if valid else 'substr(created_at, 1, 7) IS ?'
+    cursor.execute(f'''
+      INSERT OR IGNORE INTO {table} ({COLUMNS})
+      SELECT {COLUMNS} FROM word_review_items WHERE {condition}
+    ''', (month,))
+    conn.commit()
+    print(f'  {month}: {cursor.rowcount} review items ({time.perf_counter() - started:.1f}s)')
+  conn.execute('BEGIN')
+  cursor = conn.cursor()
+  # Continue after the highest id ever handed out, deleted rows included
+  cursor.execute('''
+    INSERT OR REPLACE INTO review_item_sequence (id, last_id)
+    SELECT 1, MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'word_review_items'), 0),
+                  COALESCE((SELECT MAX(id) FROM word_review_items), 0))
+  ''')
+  cursor.execute('DROP TABLE main.word_review_items')
+  cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'word_review_items'")
+  ensure_partition(cursor, current_month())
+  create_view(cursor)
+  conn.commit()
+  conn.execute('ANALYZE')
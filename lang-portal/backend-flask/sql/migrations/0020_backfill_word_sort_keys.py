@@ -0,0 +1,35 @@
+# Fill word_sort_keys and the per-group rows from words and word_reviews, with
+# the SQL for the schema at this version rather than lib/sortkeys.py. Rows are
+# replaced whole, so running this again is harmless.
+SORT_VALUES = '''
+  COALESCE(r.correct_count, 0),
+  COALESCE(r.wrong_count, 0),
+  CASE WHEN COALESCE(r.correct_count, 0) + COALESCE(r.wrong_count, 0) > 0
+    THEN CAST(r.correct_count AS REAL) / (r.correct_count + r.wrong_count)
+    ELSE 0 END,
+  COALESCE(r.last_reviewed, '')
+'''
+
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('DELETE FROM word_sort_keys')
+  conn.execute('DELETE FROM group_word_sort_keys')
+  conn.execute('DELETE FROM group_sort_versions')
+  conn.execute(f'''
+    INSERT INTO word_sort_keys (word_id, correct_count, wrong_count, accuracy, last_reviewed)
+    SELECT w.id, {SORT_VALUES}
+    FROM words w
+    LEFT JOIN word_reviews r ON r.word_id = w.id
+  ''')
+  conn.execute('UPDATE word_sort_coverage SET next_word_id = COALESCE((SELECT MAX(id) FROM words) + 1, 0) WHERE id = 1')
+  conn.execute(f'''
+    INSERT OR IGNORE INTO group_word_sort_keys
+      (group_id, word_id, french, english, correct_count, wrong_count, accuracy, last_reviewed)
+    SELECT wg.group_id, w.id, w.french, w.english, {SORT_VALUES}
+    FROM word_groups wg
+    JOIN words w ON w.id = wg.word_id
+    LEFT JOIN word_reviews r ON r.word_id = w.id
+  ''')
+  conn.execute('INSERT INTO group_sort_versions (group_id, members_version) SELECT id, members_version FROM groups')
+  conn.commit()
+  conn.execute('ANALYZE word_sort_keys')
@@ -0,0 +1,18 @@
+-- Wrong answers for the multiple-choice quizzes of GET /groups/:id/quiz: for
+-- each word the words most easily confused with it, by edit distance and
+-- shared prefix of the normalized french. Kept by lib/quiz.py, which indexes
+-- the words with an id from distractor_coverage.next_word_id on each import.
+CREATE TABLE IF NOT EXISTS word_distractors (
+  word_id INTEGER NOT NULL,
+  distractor_id INTEGER NOT NULL,
+  -- Similarity in 0..1, higher is more confusable
+  score REAL NOT NULL,
+  PRIMARY KEY (word_id, distractor_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS distractor_coverage (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  next_word_id INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO distractor_coverage (id, next_word_id) VALUES (1, 0);
@@ -0,0 +1,277 @@
+import bisect
+import json
+import unicodedata
+
+# Index the existing vocabulary into word_distractors, with the code of
+# lib/quiz.py at this version rather than the module itself; later imports
+# extend it. Large vocabularies take minutes to index, so they are left to
+# `invoke rebuild-distractors` rather than holding up the app start. update()
+# only picks up words not indexed yet, so running this again is harmless.
+BACKFILL_MAX_WORDS = 5000
+
+# Distractors kept per word in word_distractors
+DISTRACTORS_PER_WORD = 8
+
+# Shortest shared prefix that makes two words confusable
+MIN_PREFIX = 3
+
+# Words sharing a prefix scored per word, the closest in sorted order
+MAX_PREFIX_CANDIDATES = 32
+
+# Accent, case and whitespace insensitive form of a word, as lib/importer.py
+def normalize(text):
+  decomposed = unicodedata.normalize('NFKD', text)
+  stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+  return ' '.join(stripped.casefold().split())
+
+# Bit masks of the positions of each character of pattern, for edit_distance()
+def char_masks(pattern):
+  masks = {}
+  for index, char in enumerate(pattern):
+    masks[char] = masks.get(char, 0) | (1 << index)
+  return masks
+
+# Levenshtein distance between pattern (given as its char_masks()) and text,
+# with Myers' bit-parallel algorithm: one pass over text, whatever the length
+# of pattern, about ten times faster than the dynamic programming table in Python
+def edit_distance(masks, length, text):
+  if not length:
+    return len(text)
+  all_bits = (1 << length) - 1
+  last_bit = 1 << (length - 1)
+  vp, vn, distance = all_bits, 0, length
+  for char in text:
+    eq = masks.get(char, 0)
+    xv = eq | vn
+    xh = (((eq & vp) + vp) ^ vp) | eq
+    hp = vn | ~(xh | vp)
+    hn = vp & xh
+    if hp & last_bit:
+      distance += 1
+    elif hn & last_bit:
+      distance -= 1
+    hp = (hp << 1) | 1
+    hn <<= 1
+    vp = (hn | ~(xv | hp)) & all_bits
+    vn = hp & xv
+  return distance
+
+# Spelling distance within which two words are confusable, by the length of
+# the shorter one
+def max_distance(length):
+  return 1 if length < 8 else 2
+
+# (piece number, start, end) of a key of length split into count pieces
+def pieces(length, count):
+  size, extra = divmod(length, count)
+  start = 0
+  for number in range(count):
+    end = start + size + (1 if number < extra else 0)
+    yield number, start, end
+    start = end
+
+# Keys by the max_distance() + 1 pieces they are split into. d edits can
+# change at most d pieces, so a key within max_distance() of another has a
+# piece left whole in it, shifted by at most d characters. A search looks up
+# the substrings of the key at those places and only measures the distance to
+# the keys found there: a few dozen lookups, where a BK-tree would compare the
+# key with a good part of a large vocabulary.
+class SpellingIndex:
+  def __init__(self):
+    self.pieces = {}
+
+  def add(self, key):
+    for number, start, end in pieces(len(key), max_distance(len(key)) + 1):
+      self.pieces.setdefault((len(key), number, key[start:end]), []).append(key)
+
+  # [(distance, other)] of the keys within max_distance() of key, of the
+  # shorter of the two, key itself included
+  def search(self, key):
+    radius = max_distance(len(key))
+    masks = char_masks(key)
+    seen = set()
+    found = []
+    for length in range(max(0, len(key) - radius), len(key) + radius + 1):
+      for number, start, end in pieces(length, max_distance(length) + 1):
+        for shift in range(-radius, radius + 1):
+          if start + shift < 0 or end + shift > len(key):
+            continue
+          for other in self.pieces.get((length, number, key[start + shift:end + shift]), ()):
+            if other in seen:
+              continue
+            seen.add(other)
+            distance = edit_distance(masks, len(key), other)
+            if distance <= max_distance(min(len(key), length)):
+              found.append((distance, other))
+    return found
+
+def shared_prefix(a, b):
+  length = min(len(a), len(b))
+  index = 0
+  while index < length and a[index] == b[index]:
+    index += 1
+  return index
+
+# Confusable words of the vocabulary by their normalized french: a
+# SpellingIndex for close spellings and the sorted keys for shared prefixes. Holds the words
+# with an id below next_word_id, size of them.
+class ConfusableIndex:
+  def __init__(self, words=()):
+    self.spellings = SpellingIndex()
+    self.sorted_keys = []
+    self.ids = {}
+    self.size = 0
+    self.next_word_id = 0
+    self.add_many(words)
+
+  # Add (word_id, french) pairs, returns their [(word_id, key)]
+  def add_many(self, words):
+    added = []
+    new_keys = []
+    for word_id, french in words:
+      key = normalize(french)
+      if key not in self.ids:
+        self.ids[key] = []
+        self.spellings.add(key)
+        new_keys.append(key)
+      self.ids[key].append(word_id)
+      self.next_word_id = max(self.next_word_id, word_id + 1)
+      added.append((word_id, key))
+    self.size += len(added)
+    # Timsort merges the two sorted runs in one pass, where an insort per
+    # key would move the whole list every time
+    new_keys.sort()
+    self.sorted_keys.extend(new_keys)
+    self.sorted_keys.sort()
+    return added
+
+  # [(shared prefix length, key)] of the MAX_PREFIX_CANDIDATES keys sharing
+  # the longest prefixes with key, of at least MIN_PREFIX characters. Those
+  # are the keys next to it in sorted order, so they are found walking away
+  # from it in both directions.
+  def prefix_neighbours(self, key):
+    keys = self.sorted_keys
+    lower = bisect.bisect_left(keys, key) - 1
+    upper = bisect.bisect_right(keys, key)
+    found = []
+    while len(found) < MAX_PREFIX_CANDIDATES:
+      below = shared_prefix(key, keys[lower]) if lower >= 0 else 0
+      above = shared_prefix(key, keys[upper]) if upper < len(keys) else 0
+      if max(below, above) < MIN_PREFIX:
+        break
+      if below >= above:
+        found.append((below, keys[lower]))
+        lower -= 1
+      else:
+        found.append((above, keys[upper]))
+        upper += 1
+    return found
+
+  # {key: similarity in 0..1} of the keys confusable with key, key excluded:
+  # 1 - distance / length for close spellings, prefix / length for at least
+  # MIN_PREFIX shared leading characters, whichever is higher. Close spellings
+  # are symmetric, so that indexing new words can also update the existing
+  # ones; shared prefixes are only symmetric among the closest candidates.
+  def neighbours(self, key):
+    scores = {}
+    for distance, other in self.spellings.search(key):
+      if other != key:
+        scores[other] = 1 - distance / max(len(key), len(other))
+    for prefix, other in self.prefix_neighbours(key):
+      scores[other] = max(scores.get(other, 0), prefix / max(len(key), len(other)))
+    return scores
+
+  # [(score, word_id)] of the words confusable with key, best first
+  def distractors(self, key):
+    return sorted(
+      ((round(score, 4), word_id)
+       for other, score in self.neighbours(key).items()
+       for word_id in self.ids[other]),
+      key=lambda row: (-row[0], row[1])
+    )
+
+# The words already indexed, those with an id below next_word_id
+def load_index(cursor, next_word_id):
+  cursor.execute('SELECT id, french FROM words WHERE id < ?', (next_word_id,))
+  index = ConfusableIndex(cursor.fetchall())
+  index.next_word_id = next_word_id
+  return index
+
+# Keep only the best DISTRACTORS_PER_WORD rows of each of word_ids
+def trim(cursor, word_ids):
+  cursor.execute('''
+    DELETE FROM word_distractors
+    WHERE (word_id, distractor_id) IN (
+      SELECT word_id, distractor_id FROM (
+        SELECT word_id, distractor_id,
+          ROW_NUMBER() OVER (PARTITION BY word_id ORDER BY score DESC, distractor_id) AS rank
+        FROM word_distractors
+        WHERE word_id IN (SELECT value FROM json_each(?))
+      )
+      WHERE rank > ?
+    )
+  ''', (json.dumps(list(word_ids)), DISTRACTORS_PER_WORD))
+
+# Rows of word_distractors for new_words, [(word_id, key)] just added to index:
+# their own best distractors, and each of them as a candidate distractor of the
+# words below next_word_id it is confusable with. Most of those offers score
+# below the DISTRACTORS_PER_WORD the word already has; they are left out here
+# rather than written and trimmed. Returns (rows, {word_id: offered rows}).
+def distractor_rows(cursor, index, new_words, next_word_id):
+  rows = []
+  offered = {}
+  for word_id, key in new_words:
+    for rank, (score, distractor_id) in enumerate(index.distractors(key)):
+      if rank < DISTRACTORS_PER_WORD:
+        rows.append((word_id, distractor_id, score))
+      # The similarity is symmetric, so the new word may also rank among
+      # the best of a word indexed before
+      if distractor_id < next_word_id:
+        offered.setdefault(distractor_id, []).append((distractor_id, word_id, score))
+
+  if offered:
+    cursor.execute('''
+      SELECT word_id, MIN(score) FROM word_distractors
+      WHERE word_id IN (SELECT value FROM json_each(?))
+      GROUP BY word_id
+      HAVING COUNT(*) >= ?
+    ''', (json.dumps(list(offered)), DISTRACTORS_PER_WORD))
+    # A tie goes to the lower distractor id, never the new word's
+    floors = dict(cursor.fetchall())
+    offered = {word_id: [row for row in word_rows if row[2] > floors.get(word_id, -1)]
+               for word_id, word_rows in offered.items()}
+    offered = {word_id: word_rows for word_id, word_rows in offered.items() if word_rows}
+  return rows, offered
+
+# Write distractor_rows() and mark the words below next_word_id as indexed
+def write_rows(cursor, rows, offered, next_word_id):
+  cursor.executemany(
+    'INSERT OR REPLACE INTO word_distractors (word_id, distractor_id, score) VALUES (?, ?, ?)',
+    rows + [row for word_rows in offered.values() for row in word_rows]
+  )
+  if offered:
+    trim(cursor, offered)
+  cursor.execute('UPDATE distractor_coverage SET next_word_id = ? WHERE id = 1', (next_word_id,))
+
+# Index the words created since the last run. Returns the number of words
+# indexed. Does not commit.
+def update(cursor):
+  cursor.execute('SELECT next_word_id FROM distractor_coverage WHERE id = 1')
+  next_word_id = cursor.fetchone()[0]
+  index = load_index(cursor, next_word_id)
+  cursor.execute('SELECT id, french FROM words WHERE id >= ? ORDER BY id', (next_word_id,))
+  new_words = index.add_many(cursor.fetchall())
+  if not new_words:
+    return 0
+  rows, offered = distractor_rows(cursor, index, new_words, next_word_id)
+  write_rows(cursor, rows, offered, index.next_word_id)
+  return len(new_words)
+
+def up(conn):
+  words = conn.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+  if words > BACKFILL_MAX_WORDS:
+    print(f'{words} words: run `invoke rebuild-distractors` to index them for GET /groups/:id/quiz')
+    return
+  conn.execute('BEGIN')
+  update(conn.cursor())
+  conn.commit()
@@ -0,0 +1,130 @@
+-- Change log for GET /sync: one row per word, group, group member and word
+-- review aggregate, given the next seq every time it changes, so a client
+-- catches up by reading the rows after the last seq it saw instead of
+-- refetching everything. The triggers below write it whatever the write path
+-- (routes, imports, write-behind flushes, tasks). Deleted rows keep their
+-- entry with deleted = 1.
+CREATE TABLE IF NOT EXISTS change_log (
+  entity TEXT NOT NULL,  -- word, group, member or review
+  entity_id INTEGER NOT NULL,  -- word id, group id, group id of a member, word id of a review
+  word_id INTEGER NOT NULL DEFAULT 0,  -- word id of a member, 0 otherwise
+  seq INTEGER NOT NULL,
+  deleted INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (entity, entity_id, word_id)
+) WITHOUT ROWID;
+
+-- Sync tokens carry the epoch, so clients of a recreated database start over
+CREATE TABLE IF NOT EXISTS sync_state (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  epoch TEXT NOT NULL
+);
+
+INSERT OR IGNORE INTO sync_state (id, epoch) VALUES (1, lower(hex(randomblob(8))));
+
+-- Client ids of the reviews received by POST /sync, so a retried batch is not
+-- logged twice
+CREATE TABLE IF NOT EXISTS sync_receipts (
+  client_id TEXT PRIMARY KEY,
+  received_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+-- Everything that exists so far, so a first sync is a read of the whole log
+INSERT OR IGNORE INTO change_log (entity, entity_id, word_id, seq)
+SELECT 'group', id, 0, (SELECT COALESCE(MAX(seq), 0) FROM change_log) + ROW_NUMBER() OVER (ORDER BY id)
+FROM groups;
+
+INSERT OR IGNORE INTO change_log (entity, entity_id, word_id, seq)
+SELECT 'word', id, 0, (SELECT COALESCE(MAX(seq), 0) FROM change_log) + ROW_NUMBER() OVER (ORDER BY id)
+FROM words;
+
+INSERT OR IGNORE INTO change_log (entity, entity_id, word_id, seq)
+SELECT 'member', group_id, word_id, (SELECT COALESCE(MAX(seq), 0) FROM change_log) + ROW_NUMBER() OVER (ORDER BY group_id, word_id)
+FROM word_groups;
+
+INSERT OR IGNORE INTO change_log (entity, entity_id, word_id, seq)
+SELECT 'review', word_id, 0, (SELECT COALESCE(MAX(seq), 0) FROM change_log) + ROW_NUMBER() OVER (ORDER BY word_id)
+FROM word_reviews;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_change_log_seq ON change_log(seq);
+
+CREATE INDEX IF NOT EXISTS idx_sync_receipts_received_at ON sync_receipts(received_at);
+
+-- Each trigger moves the entity's row to the end of the log. DELETE then
+-- INSERT rather than INSERT OR REPLACE, which an outer OR IGNORE would override.
+CREATE TRIGGER IF NOT EXISTS change_log_word_insert AFTER INSERT ON words
+BEGIN
+  DELETE FROM change_log WHERE entity = 'word' AND entity_id = new.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('word', new.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_word_update AFTER UPDATE OF french, english ON words
+BEGIN
+  DELETE FROM change_log WHERE entity = 'word' AND entity_id = new.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('word', new.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_word_delete AFTER DELETE ON words
+BEGIN
+  DELETE FROM change_log WHERE entity = 'word' AND entity_id = old.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('word', old.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 1);
+END;
+
+-- words_count changes are sent with the members, see lib/sync.py
+CREATE TRIGGER IF NOT EXISTS change_log_group_insert AFTER INSERT ON groups
+BEGIN
+  DELETE FROM change_log WHERE entity = 'group' AND entity_id = new.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('group', new.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_group_update AFTER UPDATE OF name ON groups
+BEGIN
+  DELETE FROM change_log WHERE entity = 'group' AND entity_id = new.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('group', new.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_group_delete AFTER DELETE ON groups
+BEGIN
+  DELETE FROM change_log WHERE entity = 'group' AND entity_id = old.id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('group', old.id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_member_insert AFTER INSERT ON word_groups
+BEGIN
+  DELETE FROM change_log WHERE entity = 'member' AND entity_id = new.group_id AND word_id = new.word_id;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('member', new.group_id, new.word_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_member_delete AFTER DELETE ON word_groups
+BEGIN
+  DELETE FROM change_log WHERE entity = 'member' AND entity_id = old.group_id AND word_id = old.word_id;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('member', old.group_id, old.word_id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_review_insert AFTER INSERT ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = new.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', new.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_review_update AFTER UPDATE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = new.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', new.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS change_log_review_delete AFTER DELETE ON word_reviews
+BEGIN
+  DELETE FROM change_log WHERE entity = 'review' AND entity_id = old.word_id AND word_id = 0;
+  INSERT INTO change_log (entity, entity_id, word_id, seq, deleted)
+  VALUES ('review', old.word_id, 0, (SELECT COALESCE(MAX(seq), 0) + 1 FROM change_log), 1);
+END;
@@ -0,0 +1,15 @@
+-- One write_behind_state row per journal slot of lib/writebehind.py: every
+-- worker process flushes a journal of its own, and their sequence numbers are
+-- independent. The row of 0017_write_behind_state.sql becomes slot 1, the
+-- journal a single process has always used.
+CREATE TABLE IF NOT EXISTS write_behind_slots (
+  id INTEGER PRIMARY KEY CHECK (id >= 1),
+  flushed_seq INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO write_behind_slots (id, flushed_seq)
+SELECT id, flushed_seq FROM write_behind_state;
+
+DROP TABLE IF EXISTS write_behind_state;
+
+ALTER TABLE write_behind_slots RENAME TO write_behind_state;
@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+# study_sessions.created_at and word_reviews.last_reviewed are UTC from this
+# version on, like review times and CURRENT_TIMESTAMP. Before, the session and
+# review routes wrote them in the server's local time through sqlite3's
+# datetime adapter, the only writer that stored microseconds: those rows are
+# converted with SQLite's 'utc' modifier, which uses the same local zone, and
+# lose the fraction, so running this again is harmless. Session summaries and
+# word sort keys follow; the session counts of daily_activity, daily_totals and
+# study_streak are recounted by UTC date. Self-contained for the schema at this
+# version rather than lib/stats.py.
+def up(conn):
+  conn.execute('BEGIN')
+  conn.execute('''
+    UPDATE study_session_summary SET
+      created_at = datetime(created_at, 'utc'),
+      end_time = CASE
+        WHEN last_activity_time IS NULL THEN datetime(created_at, 'utc', '+30 minutes')
+        ELSE end_time
+      END
+    WHERE created_at LIKE '%.%'
+  ''')
+  converted = conn.execute('''
+    UPDATE study_sessions SET created_at = datetime(created_at, 'utc') WHERE created_at LIKE '%.%'
+  ''').rowcount
+  for table in ('word_reviews', 'word_sort_keys', 'group_word_sort_keys'):
+    conn.execute(f"UPDATE {table} SET last_reviewed = datetime(last_reviewed, 'utc') WHERE last_reviewed LIKE '%.%'")
+  if converted:
+    recount_sessions(conn)
+  conn.commit()
+
+def recount_sessions(conn):
+  conn.execute('UPDATE daily_activity SET sessions = 0')
+  conn.execute('''
+    INSERT INTO daily_activity (activity_date, group_id, sessions)
+    SELECT date(created_at), group_id, COUNT(*)
+    FROM study_sessions
+    WHERE true
+    GROUP BY date(created_at), group_id
+    ON CONFLICT (activity_date, group_id) DO UPDATE SET sessions = excluded.sessions
+  ''')
+  conn.execute('DELETE FROM daily_activity WHERE sessions = 0 AND reviews = 0')
+
+  conn.execute('DELETE FROM daily_totals')
+  conn.execute('''
+    INSERT INTO daily_totals (activity_date, sessions, reviews, correct)
+    SELECT activity_date, SUM(sessions), SUM(reviews), SUM(correct)
+    FROM daily_activity
+    GROUP BY activity_date
+  ''')
+
+  current = longest = 0
+  start = previous = None
+  for (activity_date,) in conn.execute('SELECT activity_date FROM daily_totals WHERE sessions > 0 ORDER BY activity_date'):
+    day = date.fromisoformat(activity_date)
+    if previous is not None and day - previous == timedelta(days=1):
+      current += 1
+    else:
+      current = 1
+      start = day
+    longest = max(longest, current)
+    previous = day
+  conn.execute('''
+    INSERT OR REPLACE INTO study_streak (id, current_streak, longest_streak, streak_start, last_study_date)
+    VALUES (1, ?, ?, ?, ?)
+  ''', (current, longest, start.isoformat() if start else None, previous.isoformat() if previous else None))
@@ -0,0 +1,8 @@
+-- groups.members_version a group's group_word_schedule rows and watermark were
+-- last brought in line with word_groups at, see srs.sync_group(). Learner
+-- shards can't see triggers on the shared word_groups, so the same check
+-- replaces group_word_schedule_link everywhere; it also drops the rows of
+-- removed members, which the trigger never did. NULL syncs on the next read.
+ALTER TABLE group_new_words ADD COLUMN members_version INTEGER;
+
+DROP TRIGGER IF EXISTS group_word_schedule_link;
@@ -1,5 +0,0 @@
-CREATE TABLE IF NOT EXISTS words (
-  id INTEGER PRIMARY KEY AUTOINCREMENT,
-  french TEXT NOT NULL,
-  english TEXT NOT NULL
-);
\ No newline at end of file
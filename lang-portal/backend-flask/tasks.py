@@ -6,4 +6,122 @@ def init_db(c):
   from flask import Flask
   app = Flask(__name__)
   db.init(app)
-  print("Database initialized successfully.")
\ No newline at end of file
+  print("Database initialized successfully.")
+
+@task(help={
+  'path': 'JSON array, NDJSON or CSV file with french and english fields',
+  'group': 'group to add the words to (created if missing)',
+  'format': 'json, ndjson or csv (default: from the file extension)'
+})
+def import_words(c, path, group=None, format=None, batch_size=5000):
+  import time
+  from flask import Flask
+  from lib import importer, quiz
+  app = Flask(__name__)
+  with app.app_context():
+    result = importer.import_file(db.get(), path, format=format, group_name=group, batch_size=int(batch_size))
+    print(
+      f"Imported {result['words_inserted']} new words from {result['rows_read']} rows "
+      f"({result['duplicates']} duplicates, {result['rows_skipped']} skipped) "
+      f"in {result['seconds']}s, {result['rows_per_sec']} rows/sec."
+    )
+    # The words are already committed; a running app would also index them
+    start = time.perf_counter()
+    indexed, _ = quiz.index_pending(db.get())
+    db.close()
+  print(f"Quiz distractors of {indexed} words indexed in {time.perf_counter() - start:.1f}s.")
+
+@task
+def migrate(c):
+  import migrate as migrate_script
+  if not migrate_script.run_migrations(db.database):
+    raise SystemExit(1)
+
+@task
+def check_indexes(c):
+  import migrate as migrate_script
+  if not migrate_script.check_indexes(db.database):
+    raise SystemExit(1)
+
+@task(help={'force': 'rebuild even though archived review items will no longer be counted'})
+def rebuild_stats(c, force=False):
+  from flask import Flask
+  from lib import sessions, srs, stats
+  app = Flask(__name__)
+  with app.app_context():
+    # The rebuilds only see the hot partitions of word_review_items
+    archived = db.cursor().execute(
+      "SELECT COUNT(*) FROM review_partitions WHERE state = 'archived'"
+    ).fetchone()[0]
+    if archived and not force:
+      print(f"{archived} review item partitions are archived and would be dropped from the stats, use --force to rebuild anyway.")
+      raise SystemExit(1)
+    summaries = sessions.rebuild(db.cursor())
+    schedules = srs.rebuild(db.cursor())
+    drift = stats.rebuild(db.cursor())
+    db.commit()
+  if drift:
+    for column, (before, after) in drift.items():
+      print(f"{column}: {before} -> {after}")
+  print(
+    f"Dashboard stats, {summaries} session summaries and {schedules} review schedules "
+    "rebuilt from review history."
+  )
+
+@task
+def index_distractors(c):
+  import time
+  from flask import Flask
+  from lib import quiz
+  app = Flask(__name__)
+  start = time.perf_counter()
+  with app.app_context():
+    indexed, _ = quiz.index_pending(db.get())
+    db.close()
+  print(f"Quiz distractors of {indexed} new words indexed in {time.perf_counter() - start:.1f}s.")
+
+@task
+def rebuild_distractors(c):
+  import time
+  from flask import Flask
+  from lib import quiz
+  app = Flask(__name__)
+  start = time.perf_counter()
+  with app.app_context():
+    indexed = quiz.rebuild(db.get())
+    db.close()
+  print(f"Quiz distractors of {indexed} words rebuilt in {time.perf_counter() - start:.1f}s.")
+
+@task(help={
+  'directory': 'where to write the gzipped partitions (default: archive/ next to the database)',
+  'keep_months': 'months kept in words.db, the current one included',
+  'shards': 'also archive every learner shard (.db) in this directory'
+})
+def archive_reviews(c, directory=None, keep_months=12, shards=None):
+  import glob
+  import os
+  import sqlite3
+  from lib import partitions
+  directory = directory or os.path.join(os.path.dirname(os.path.abspath(db.database)), 'archive')
+  databases = [db.database] + (sorted(glob.glob(os.path.join(shards, '*.db'))) if shards else [])
+  for path in databases:
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA busy_timeout = 5000')
+    try:
+      prefix = os.path.splitext(os.path.basename(path))[0]
+      for partition in partitions.archive(conn, directory, keep_months=int(keep_months), prefix=prefix):
+        print(f"{path}: {partition['month']} ({partition['state']}, {partition['rows']} review items) -> {partition['path']}")
+    finally:
+      conn.close()
+
+@task(help={'path': 'archive file written by archive-reviews', 'database': 'database to restore into (default: words.db)'})
+def restore_reviews(c, path, database=None):
+  import sqlite3
+  from lib import partitions
+  conn = sqlite3.connect(database or db.database)
+  conn.execute('PRAGMA busy_timeout = 5000')
+  try:
+    restored = partitions.restore(conn, path)
+  finally:
+    conn.close()
+  print(f"Restored {restored} review items from {path}.")